@@ -0,0 +1,137 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+# ✅ Semantic Cache for LLM Answers
+class AnswerCache:
+    """Bounded LRU + TTL cache of LLM answers, scoped by the retrieved context.
+
+    Entries are grouped by a hash of the context (the sorted comment IDs) and, for
+    follow-up questions, of the conversation so far. A lookup tries the exact
+    normalized query first, then the most similar cached query for the same
+    context, accepted when its cosine similarity reaches `threshold`.
+    """
+
+    def __init__(self, max_entries=2048, ttl=3600, threshold=0.93):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self._entries = OrderedDict()    # (context_key, query_key) -> (answer, embedding, created)
+        self._by_context = {}            # context_key -> {query_key: None}, for the nearest-neighbour scan
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def context_key(context, subreddit=None, topics=(), user_id=None, history=()):
+        """Hash of the sorted comment IDs behind a retrieval result.
+
+        Error messages carry no comment IDs, so they are keyed by subreddit and topics too.
+        With history the answer depends on the user's earlier turns, so those and the
+        user ID are part of the key and follow-ups are never shared between users.
+        """
+        if isinstance(context, dict) and context.get("comment_ids"):
+            raw = "\x00".join(sorted(context["comment_ids"]))
+        else:
+            raw = "\x00".join([str(context), str(subreddit), *sorted(map(str, topics))])
+        if history:
+            turns = "\x00".join(f"{turn['role']}\x01{turn['content']}" for turn in history)
+            raw += f"\x02{user_id}\x02{turns}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def query_key(query):
+        return " ".join(query.lower().split())
+
+    def get(self, context_key, query, query_embedding=None):
+        if self.max_entries <= 0:
+            return None
+        now = time.time()
+        with self._lock:
+            key = (context_key, self.query_key(query))
+            entry = self._live(key, now)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+
+            if query_embedding is not None:
+                key = self._nearest(context_key, np.asarray(query_embedding, dtype=np.float32), now)
+                if key is not None:
+                    self._entries.move_to_end(key)
+                    self.semantic_hits += 1
+                    return self._entries[key][0]
+
+            self.misses += 1
+            return None
+
+    def put(self, context_key, query, query_embedding, answer):
+        if self.max_entries <= 0:
+            return
+        query_key = self.query_key(query)
+        embedding = None if query_embedding is None else np.asarray(query_embedding, dtype=np.float32)
+        with self._lock:
+            key = (context_key, query_key)
+            self._entries[key] = (answer, embedding, time.time())
+            self._entries.move_to_end(key)
+            self._by_context.setdefault(context_key, {})[query_key] = None
+            while len(self._entries) > self.max_entries:
+                old_key, _ = self._entries.popitem(last=False)
+                self._forget(old_key)
+                self.evictions += 1
+
+    def _live(self, key, now):
+        entry = self._entries.get(key)
+        if entry is not None and now - entry[2] > self.ttl:
+            del self._entries[key]
+            self._forget(key)
+            self.expirations += 1
+            return None
+        return entry
+
+    def _nearest(self, context_key, query_embedding, now):
+        keys, embeddings = [], []
+        for query_key in list(self._by_context.get(context_key, ())):
+            key = (context_key, query_key)
+            entry = self._live(key, now)
+            if entry is not None and entry[1] is not None:
+                keys.append(key)
+                embeddings.append(entry[1])
+        if not keys:
+            return None
+        # Cached and query embeddings are normalized, so one product gives cosine similarities.
+        similarities = np.stack(embeddings) @ query_embedding
+        best = int(np.argmax(similarities))
+        return keys[best] if similarities[best] >= self.threshold else None
+
+    def _forget(self, key):
+        context_key, query_key = key
+        queries = self._by_context.get(context_key)
+        if queries is not None:
+            queries.pop(query_key, None)
+            if not queries:
+                del self._by_context[context_key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_context.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
@@ -1,19 +1,48 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context, g
 from flask_cors import CORS
 import kg_chat
 import vrs
+import metrics
+from viz_pool import VizPoolError
 import json
 import traceback
 from crontab import CronTab
 import os
+import threading
+import time
 import numpy as np
 
 app = Flask(__name__)
 CORS(app)  # Enable cross-origin requests
 
+# Models and the knowledge graph load lazily; warm them up in the background so the
+# port binds right away (set WARMUP=0 to load everything on first request instead)
+WARMUP = os.environ.get("WARMUP", "1") != "0"
+
+def warm_up(start_viz_pool=True):
+    started = time.time()
+    for name, step in (("kg_chat", kg_chat.warm_up), ("vrs", lambda: vrs.warm_up(start_pool=start_viz_pool))):
+        try:
+            step()
+        except Exception as e:
+            print(f"❌ Warm-up of {name} failed, it will load on first use: {str(e)}")
+            traceback.print_exc()
+    print(f"✅ Warm-up finished in {time.time() - started:.2f}s.")
+
+def start_warm_up():
+    thread = threading.Thread(target=warm_up, name="warm-up", daemon=True)
+    thread.start()
+    return thread
+
+# Visualization pool workers started with spawn import this module as __mp_main__; they load their own models.
+if WARMUP and __name__ != "__mp_main__":
+    start_warm_up()
+
 # Constants
 CRON_COMMAND = "Backend\subreddit_topics.json"  # Update with your actual cron script path
 SUBREDDIT_JSON_PATH = os.path.join(os.path.dirname(__file__), "subreddit_topics.json")
+MAX_VISUALIZE_BATCH = 256
+MAX_VISUALIZE_BATCH_SIZE = 256
 
 # Load subreddit data
 def load_subreddit_data():
@@ -46,6 +75,26 @@ def convert_numpy_types(obj):
     else:
         return obj
 
+# Request latency, status codes and in-flight requests per route (see /metrics)
+@app.before_request
+def start_request_metrics():
+    g.metrics_endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+    g.metrics_started = time.perf_counter()
+    metrics.requests_in_flight.labels(g.metrics_endpoint).inc()
+
+@app.after_request
+def finish_request_metrics(response):
+    endpoint, started = g.metrics_endpoint, g.metrics_started
+    metrics.requests_total.labels(endpoint, str(response.status_code)).inc()
+
+    # Called once the body has been sent, so SSE latency covers the whole stream
+    def finish():
+        metrics.request_seconds.labels(endpoint).observe(time.perf_counter() - started)
+        metrics.requests_in_flight.labels(endpoint).dec()
+
+    response.call_on_close(finish)
+    return response
+
 @app.route('/api/chat', methods=['POST'])
 def chat_endpoint():
     data = request.json
@@ -66,6 +115,36 @@ def chat_endpoint():
         traceback.print_exc()
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/chat/stream', methods=['POST'])
+def chat_stream_endpoint():
+    data = request.json or {}
+    user_query = data.get('user_query')
+    userID = data.get('userID')
+    subreddit = data.get('subreddit')
+    topics = data.get('topics')
+    
+    if not all([user_query, userID, subreddit, topics]):
+        return jsonify({"error": "Missing required parameters"}), 400
+    
+    # Server-Sent Events: one "token" event per text delta, then "done" with the full answer
+    def generate():
+        parts = []
+        try:
+            for delta in kg_chat.stream_chat_with_kg(user_query, userID, subreddit, topics):
+                parts.append(delta)
+                yield sse_event("token", {"token": delta})
+            yield sse_event("done", {"response": "".join(parts)})
+        except Exception as e:
+            print(f"Error in chat stream endpoint: {str(e)}")
+            traceback.print_exc()
+            yield sse_event("error", {"error": str(e)})
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def sse_event(event, payload):
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
 @app.route('/api/visualize', methods=['POST'])
 @app.route('/api/visualize', methods=['POST'])
 def visualize_endpoint():
@@ -80,16 +159,81 @@ def visualize_endpoint():
     if not all([user_query, response]):
         return jsonify({"error": "Missing user_query or response"}), 400
     
+    mode = data.get('mode')
+    if mode is not None and mode not in vrs.FEATURE_MODES:
+        return jsonify({"error": f"mode must be one of {', '.join(vrs.FEATURE_MODES)}"}), 400
+    
     try:
         # Get visualization recommendations
-        recommended_charts = vrs.getViz(user_query, response)
+        recommended_charts = vrs.getViz(user_query, response, mode=mode)
         print(recommended_charts)
         return jsonify(convert_numpy_types(recommended_charts))
+    except VizPoolError as e:
+        # Queue full (503) or scoring timed out (504): shed the request instead of piling up.
+        return jsonify({"error": str(e)}), e.status, {"Retry-After": "1"}
     except Exception as e:
         print(f"Error in visualize endpoint: {str(e)}")
         traceback.print_exc()
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/visualize/batch', methods=['POST'])
+def visualize_batch_endpoint():
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "Expected a JSON object with pairs"}), 400
+    items = data.get('pairs')
+    mode = data.get('mode')
+    
+    # spaCy's n_process is a server setting (VIZ_BATCH_PROCESSES), not taken from the request
+    try:
+        batch_size = int(data.get('batch_size', 64))
+    except (TypeError, ValueError):
+        return jsonify({"error": "batch_size must be an integer"}), 400
+    batch_size = min(max(1, batch_size), MAX_VISUALIZE_BATCH_SIZE)
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "Missing pairs"}), 400
+    if len(items) > MAX_VISUALIZE_BATCH:
+        return jsonify({"error": f"At most {MAX_VISUALIZE_BATCH} pairs per batch"}), 400
+    if mode is not None and mode not in vrs.FEATURE_MODES:
+        return jsonify({"error": f"mode must be one of {', '.join(vrs.FEATURE_MODES)}"}), 400
+    
+    pairs = []
+    for item in items:
+        user_query = item.get('user_query') if isinstance(item, dict) else None
+        response = item.get('response') if isinstance(item, dict) else None
+        
+        # Handle response if it's a dictionary
+        if isinstance(response, dict) and 'response' in response:
+            response = response['response']
+        
+        if not all([user_query, response]):
+            return jsonify({"error": "Every pair needs user_query and response"}), 400
+        pairs.append((user_query, response))
+    
+    try:
+        results = vrs.getVizBatch(pairs, batch_size=batch_size, mode=mode)
+        return jsonify({"results": convert_numpy_types(results)})
+    except VizPoolError as e:
+        return jsonify({"error": str(e)}), e.status, {"Retry-After": "1"}
+    except Exception as e:
+        print(f"Error in visualize batch endpoint: {str(e)}")
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/ingest', methods=['POST'])
+def ingest_endpoint():
+    # New posts, comments and topic links; applied to the live KG and logged durably
+    data = request.get_json(silent=True)
+    try:
+        result = kg_chat.ingest(data)
+        return jsonify(result)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        print(f"Error in ingest endpoint: {str(e)}")
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
+
 @app.route('/api/subreddits', methods=['GET'])
 def subreddits_endpoint():
     # Load subreddits and topics from JSON file
@@ -145,5 +289,18 @@ def schedule_endpoint():
 def health_check():
     return jsonify({"status": "API is running"})
 
+@app.route('/ready', methods=['GET'])
+def readiness_check():
+    # 503 until every model and the KG are loaded, so traffic only goes to warm workers
+    resources = {**kg_chat.loaded_resources(), **vrs.loaded_resources()}
+    ready = all(resources.values())
+    return jsonify({"status": "ready" if ready else "warming up", "resources": resources}), 200 if ready else 503
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    # Prometheus text format: per-stage latency histograms, request counters, cache hits and KG size
+    body, content_type = metrics.render()
+    return Response(body, content_type=content_type)
+
 if __name__ == '__main__':
     app.run(debug=True, port=5000)
\ No newline at end of file
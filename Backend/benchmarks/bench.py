@@ -0,0 +1,361 @@
+"""Benchmarks for the KG loaders, comment retrieval, the chat pipeline and vrs.getViz.
+
+    python benchmarks/generate_kg.py --out /tmp/kg-1m --triples 1000000
+    python benchmarks/bench.py --kg /tmp/kg-1m --out results-$(git rev-parse --short HEAD).json
+    python benchmarks/bench.py --compare results-abc123.json results-def456.json
+
+Everything runs offline: the LLM is replaced by a stub (--llm-latency-ms simulates the
+network), HuggingFace is forced offline, and the embedding, viz and answer caches are
+off unless --warm-caches is given, so each sample pays the full cost. Every file the app
+writes (snapshots, delta log, caches, conversations) goes to a temporary directory.
+
+Benchmarks (pick with --only):
+    load_kg_json      kg_chat.load_kg_json over KG.json
+    load_kg_ttl       kg_chat.load_kg_ttl over KG.ttl (rdflib parse + CSR adjacency)
+    index_build       KGIndex.build over the loaded KG
+    retrieve          kg_chat.retrieve_relevant_comments for random subreddit/topic queries
+    chat              kg_chat.chat_with_kg end to end with the stub LLM
+    viz_load          loading spaCy, MiniLM and the chart embeddings
+    getviz_full       vrs.getViz over benchmarks/corpus.json (spaCy features)
+    getviz_fast       the same in fast mode (no spaCy)
+    getviz_batch      vrs.getVizBatch over the whole corpus per call
+
+The output JSON has a "meta" block (commit, machine, KG size, options) and one entry per
+benchmark with n, total_s, ops_per_s, mean_ms, p50_ms, p90_ms, p99_ms and max_ms.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BACKEND_DIR)
+
+BENCHMARKS = ("load_kg_json", "load_kg_ttl", "index_build", "retrieve", "chat",
+              "viz_load", "getviz_full", "getviz_fast", "getviz_batch")
+
+
+# ✅ Stub LLM (same interface as llm_client.LLMClient, no network)
+class StubLLMClient:
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = 0
+        self.prompt_chars = 0
+
+    def chat(self, messages, model=None, **kwargs):
+        self.calls += 1
+        self.prompt_chars += sum(len(m["content"]) for m in messages)
+        if self.latency:
+            time.sleep(self.latency)
+        return f"Stub answer to: {messages[-1]['content'][-80:]}"
+
+    def stream_chat(self, messages, model=None, **kwargs):
+        yield from self.chat(messages, model).split(" ")
+
+
+# ✅ Timing Helpers
+def summarize(latencies, **extra):
+    """Latency percentiles (ms) and throughput for a list of per-operation seconds."""
+    samples = np.asarray(latencies, dtype=np.float64)
+    total = float(samples.sum())
+    result = {
+        "n": len(samples),
+        "total_s": round(total, 6),
+        "ops_per_s": round(len(samples) / total, 3) if total > 0 else None,
+        "mean_ms": round(float(samples.mean()) * 1000, 4),
+        "p50_ms": round(float(np.percentile(samples, 50)) * 1000, 4),
+        "p90_ms": round(float(np.percentile(samples, 90)) * 1000, 4),
+        "p99_ms": round(float(np.percentile(samples, 99)) * 1000, 4),
+        "max_ms": round(float(samples.max()) * 1000, 4),
+    }
+    result.update(extra)
+    return result
+
+
+def measure(fn, calls):
+    """Runs fn(arg) for every arg with stdout silenced; returns (seconds per call, last result)."""
+    latencies = []
+    result = None
+    with contextlib.redirect_stdout(io.StringIO()):
+        for arg in calls:
+            started = time.perf_counter()
+            result = fn(arg)
+            latencies.append(time.perf_counter() - started)
+    return latencies, result
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=BACKEND_DIR, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=BACKEND_DIR,
+                               capture_output=True, text=True, check=True).stdout.strip()
+        return {"commit": commit, "dirty": bool(dirty)}
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+
+
+# ✅ Benchmark Runner
+class Runner:
+    def __init__(self, args):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        with open(os.path.join(args.kg, "manifest.json"), "r", encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        with open(args.corpus, "r", encoding="utf-8") as f:
+            self.corpus = [(pair["user_query"], pair["response"]) for pair in json.load(f)]
+        self.json_path = os.path.join(args.kg, self.manifest["files"]["json"])
+        self.ttl_path = os.path.join(args.kg, self.manifest["files"]["ttl"])
+        self.kg_json = None
+        self.adjacency_list = None
+        self.index = None
+        self.results = {}
+
+    def run(self, names):
+        for name in names:
+            print(f"🔄 {name}...", flush=True)
+            try:
+                self.results[name] = getattr(self, f"bench_{name}")()
+                summary = self.results[name]
+                print(f"✅ {name}: n={summary['n']} p50={summary['p50_ms']:.3f} ms "
+                      f"p99={summary['p99_ms']:.3f} ms ops/s={summary['ops_per_s']}")
+            except Exception as e:
+                self.results[name] = {"error": f"{type(e).__name__}: {e}"}
+                print(f"❌ {name} failed: {e}")
+        return self.results
+
+    # KG loading
+    def bench_load_kg_json(self):
+        import kg_chat
+        latencies, self.kg_json = measure(lambda _: kg_chat.load_kg_json(self.json_path), range(self.args.load_repeat))
+        if self.kg_json is None:
+            raise RuntimeError("load_kg_json returned None")
+        return summarize(latencies, entities=len(self.kg_json), bytes=os.path.getsize(self.json_path))
+
+    def bench_load_kg_ttl(self):
+        import kg_chat
+        latencies, (_, self.adjacency_list) = measure(lambda _: kg_chat.load_kg_ttl(self.ttl_path),
+                                                      range(self.args.load_repeat))
+        if self.adjacency_list is None:
+            raise RuntimeError("load_kg_ttl returned None")
+        return summarize(latencies, triples=len(self.adjacency_list), bytes=os.path.getsize(self.ttl_path),
+                         adjacency_bytes=self.adjacency_list.nbytes())
+
+    def bench_index_build(self):
+        from kg_index import KGIndex
+        self._ensure_loaded()
+        latencies, self.index = measure(lambda _: KGIndex.build(self.kg_json, self.adjacency_list),
+                                        range(self.args.load_repeat))
+        return summarize(latencies, comments=len(self.index.comment_titles))
+
+    # Retrieval and chat
+    def queries(self, n):
+        """Seeded (subreddit, topics) draws with 1-4 topics, like the frontend sends."""
+        subreddits = self.manifest["subreddits"]
+        names = sorted(subreddits)
+        draws = []
+        for _ in range(n):
+            subreddit = self.rng.choice(names)
+            topics = subreddits[subreddit]
+            draws.append((subreddit, self.rng.sample(topics, self.rng.randint(1, min(4, len(topics))))))
+        return draws
+
+    def bench_retrieve(self):
+        import kg_chat
+        self._ensure_index()
+        found = []
+
+        def retrieve(query):
+            subreddit, topics = query
+            context = kg_chat.retrieve_relevant_comments(self.index, subreddit, topics,
+                                                         adjacency_list=self.adjacency_list)
+            found.append(len(context["context"]) if isinstance(context, dict) else 0)
+
+        latencies, _ = measure(retrieve, self.queries(self.args.queries))
+        return summarize(latencies, mean_comments=round(float(np.mean(found)), 2))
+
+    def bench_chat(self):
+        import kg_chat
+        from kg_store import KGSnapshot, KGStore
+        self._ensure_index()
+        snapshot = KGSnapshot(self.kg_json, self.adjacency_list, self.index)
+        # Serve the already loaded KG instead of loading it a fourth time.
+        kg_chat._kg_store = KGStore((self.json_path, self.ttl_path), lambda *paths: snapshot, 3600)
+        stub = StubLLMClient(self.args.llm_latency_ms / 1000)
+        kg_chat.client = stub
+        queries = [(self.corpus[i % len(self.corpus)][0], query) for i, query in enumerate(self.queries(self.args.queries))]
+
+        def chat(item):
+            user_query, (subreddit, topics) = item
+            kg_chat.chat_with_kg(user_query, "bench", subreddit, topics)
+
+        latencies, _ = measure(chat, queries)
+        return summarize(latencies, llm_calls=stub.calls,
+                         mean_prompt_chars=round(stub.prompt_chars / max(stub.calls, 1), 1),
+                         llm_latency_ms=self.args.llm_latency_ms)
+
+    # Visualization
+    def bench_viz_load(self):
+        import vrs
+        latencies, _ = measure(lambda _: vrs.warm_up(), [None])
+        return summarize(latencies)
+
+    def _getviz(self, mode):
+        import vrs
+        vrs.warm_up()
+        pairs = self.corpus * self.args.viz_rounds
+        latencies, _ = measure(lambda pair: vrs.getViz(pair[0], pair[1], use_cache=self.args.warm_caches,
+                                                       mode=mode), pairs)
+        return summarize(latencies, corpus=len(self.corpus), mode=mode)
+
+    def bench_getviz_full(self):
+        return self._getviz("full")
+
+    def bench_getviz_fast(self):
+        return self._getviz("fast")
+
+    def bench_getviz_batch(self):
+        import vrs
+        vrs.warm_up()
+        latencies, _ = measure(lambda _: vrs.getVizBatch(self.corpus, use_cache=self.args.warm_caches),
+                               range(self.args.viz_rounds))
+        per_item = [latency / len(self.corpus) for latency in latencies]
+        return summarize(latencies, batch=len(self.corpus),
+                         items_per_s=round(len(self.corpus) * len(latencies) / sum(latencies), 3),
+                         p50_per_item_ms=round(float(np.percentile(per_item, 50)) * 1000, 4))
+
+    def _ensure_loaded(self):
+        import kg_chat
+        with contextlib.redirect_stdout(io.StringIO()):
+            if self.kg_json is None:
+                self.kg_json = kg_chat.load_kg_json(self.json_path)
+            if self.adjacency_list is None:
+                _, self.adjacency_list = kg_chat.load_kg_ttl(self.ttl_path)
+
+    def _ensure_index(self):
+        from kg_index import KGIndex
+        self._ensure_loaded()
+        if self.index is None:
+            with contextlib.redirect_stdout(io.StringIO()):
+                self.index = KGIndex.build(self.kg_json, self.adjacency_list)
+
+    def meta(self):
+        return {
+            **git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "kg": {"path": os.path.abspath(self.args.kg), "counts": self.manifest["counts"],
+                   "params": self.manifest["params"]},
+            "options": {k: v for k, v in vars(self.args).items() if k not in ("kg", "out", "compare")},
+        }
+
+
+def configure_environment(args, scratch):
+    """Must run before kg_chat / vrs are imported: they read their settings at import time."""
+    os.environ.setdefault("HF_HUB_OFFLINE", "1")
+    os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+    os.environ["KG_JSON_PATH"] = os.path.join(args.kg, "KG.json")
+    os.environ["KG_TTL_PATH"] = os.path.join(args.kg, "KG.ttl")
+    os.environ["KG_SNAPSHOT_PATH"] = os.path.join(scratch, "KG.snap")
+    os.environ["KG_SHARD_DIR"] = os.path.join(scratch, "KG.shards")
+    os.environ["COMMENT_EMBEDDINGS_PATH"] = os.path.join(scratch, "KG.comment_emb")
+    os.environ["CONVERSATION_DB_PATH"] = os.path.join(scratch, "conversations.db")
+    os.environ["KG_DELTA_LOG_PATH"] = os.path.join(scratch, "KG.delta.jsonl")
+    os.environ["WARMUP"] = "0"
+    if args.warm_caches:
+        os.environ["EMBEDDING_CACHE_DIR"] = os.path.join(scratch, "embedding_cache")
+        os.environ["VIZ_CACHE_PATH"] = os.path.join(scratch, "viz_cache.db")
+    else:
+        os.environ["ANSWER_CACHE_SIZE"] = "0"
+        os.environ["EMBEDDING_CACHE_SIZE"] = "0"
+        os.environ.pop("EMBEDDING_CACHE_DIR", None)
+        os.environ.pop("VIZ_CACHE_PATH", None)
+
+
+# ✅ Comparing Two Result Files
+COMPARED = ("p50_ms", "p99_ms", "ops_per_s")
+
+
+def compare(base_path, new_path, fail_above=None):
+    """Prints per-benchmark changes; returns 1 if any p50 got slower by more than fail_above percent."""
+    with open(base_path, "r", encoding="utf-8") as f:
+        base = json.load(f)
+    with open(new_path, "r", encoding="utf-8") as f:
+        new = json.load(f)
+    print(f"base {base['meta'].get('commit')}  ->  new {new['meta'].get('commit')}")
+    print(f"{'benchmark':<16} {'metric':<10} {'base':>12} {'new':>12} {'change':>9}")
+    regressions = []
+    for name in sorted(set(base["benchmarks"]) | set(new["benchmarks"])):
+        old_result, new_result = base["benchmarks"].get(name, {}), new["benchmarks"].get(name, {})
+        for metric in COMPARED:
+            before, after = old_result.get(metric), new_result.get(metric)
+            if before is None or after is None:
+                continue
+            change = (after - before) / before * 100 if before else 0.0
+            print(f"{name:<16} {metric:<10} {before:>12.3f} {after:>12.3f} {change:>+8.1f}%")
+            if metric == "p50_ms" and fail_above is not None and change > fail_above:
+                regressions.append(name)
+    if regressions:
+        print(f"❌ p50 regressed by more than {fail_above}%: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+def parser():
+    p = argparse.ArgumentParser(description="Offline benchmarks for kg_chat and vrs over a synthetic KG.")
+    p.add_argument("--kg", help="directory written by benchmarks/generate_kg.py")
+    p.add_argument("--out", help="write the results JSON here (default: stdout only)")
+    p.add_argument("--only", help=f"comma-separated subset of: {', '.join(BENCHMARKS)}")
+    p.add_argument("--corpus", default=os.path.join(BENCH_DIR, "corpus.json"))
+    p.add_argument("--load-repeat", type=int, default=3, help="runs of each KG load / index build")
+    p.add_argument("--queries", type=int, default=500, help="retrieval and chat queries")
+    p.add_argument("--viz-rounds", type=int, default=5, help="passes over the corpus for getViz")
+    p.add_argument("--llm-latency-ms", type=float, default=0.0, help="simulated LLM latency")
+    p.add_argument("--warm-caches", action="store_true", help="leave the embedding, viz and answer caches on")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--compare", nargs=2, metavar=("BASE", "NEW"), help="compare two result files and exit")
+    p.add_argument("--fail-above", type=float, help="with --compare, exit 1 if a p50 regressed by more than this %%")
+    return p
+
+
+def main():
+    args = parser().parse_args()
+    if args.compare:
+        return compare(*args.compare, fail_above=args.fail_above)
+    if not args.kg:
+        parser().error("--kg is required (generate one with benchmarks/generate_kg.py)")
+
+    names = BENCHMARKS if not args.only else [name.strip() for name in args.only.split(",")]
+    unknown = set(names) - set(BENCHMARKS)
+    if unknown:
+        parser().error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+
+    with tempfile.TemporaryDirectory(prefix="fyp-bench-") as scratch:
+        configure_environment(args, scratch)
+        runner = Runner(args)
+        results = {"meta": runner.meta(), "benchmarks": runner.run(names)}
+
+    output = json.dumps(results, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+        print(f"✅ Results written to {args.out}")
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
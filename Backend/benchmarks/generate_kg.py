@@ -0,0 +1,157 @@
+"""Synthetic Reddit knowledge graph for benchmarks: KG.ttl + KG.json in the SIOC / Dublin Core
+shape kg_chat expects, at any scale.
+
+    python benchmarks/generate_kg.py --out /tmp/kg-100k --triples 100000
+    python benchmarks/generate_kg.py --out /tmp/kg-10m --triples 10000000 --subreddits 200
+
+Each post is a sioc:Post in one subreddit (sioc:has_container) with 1..--max-topics-per-post
+topics from that subreddit's --topics-per-subreddit; each comment is a sioc:Comment that
+sioc:reply_of its post. Comments per post follow a geometric distribution with mean
+--comments-per-post, so a few threads are much longer than the rest, like real Reddit.
+With --triples the number of posts is chosen to land near that many triples.
+
+Output is streamed, so memory stays flat at any size. manifest.json records the parameters,
+the counts and the subreddit -> topics map the benchmarks draw queries from.
+"""
+import argparse
+import json
+import math
+import os
+import random
+import time
+
+SIOC = "http://rdfs.org/sioc/ns#"
+DC = "http://purl.org/dc/elements/1.1/"
+
+# Words for comment and post titles; numbers, years and percentages are mixed in so the
+# titles look like the data-heavy answers the visualizer sees.
+VOCAB = (
+    "price market growth users share trend year month rate vote thread post comment community "
+    "moderator crypto bitcoin wallet exchange fee travel flight hotel budget city country visa "
+    "game player team season score league update release bug feature review rating quality "
+    "people think really good bad better worse increase decrease compared average total most "
+    "least more less since before after during between across network region sales revenue"
+).split()
+
+
+def title(rng, words):
+    parts = rng.choices(VOCAB, k=words)
+    roll = rng.random()
+    if roll < 0.2:
+        parts.insert(rng.randrange(len(parts) + 1), f"{rng.randint(1, 99)}%")
+    elif roll < 0.35:
+        parts.insert(rng.randrange(len(parts) + 1), str(rng.randint(2010, 2025)))
+    return " ".join(parts).capitalize()
+
+
+def ttl_literal(text):
+    return '"' + text.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def comments_per_post(rng, mean):
+    """Geometric draw with the given mean (0 comments allowed)."""
+    if mean <= 0:
+        return 0
+    p = 1.0 / (mean + 1.0)
+    return int(math.log(1.0 - rng.random()) / math.log(1.0 - p))
+
+
+def plan(args):
+    """Posts per subreddit, derived from --triples when given."""
+    if not args.triples:
+        return args.posts_per_subreddit
+    # Post: type, container, title, creator + its topics; comment: type, reply_of, title, creator.
+    avg_topics = (1 + args.max_topics_per_post) / 2
+    per_post = 4 + avg_topics + 4 * args.comments_per_post
+    return max(1, round(args.triples / per_post / args.subreddits))
+
+
+def generate(args):
+    rng = random.Random(args.seed)
+    os.makedirs(args.out, exist_ok=True)
+    posts_per_subreddit = plan(args)
+    started = time.time()
+
+    subreddits = {f"Sub{s}": [f"topic{s}_{t}" for t in range(args.topics_per_subreddit)]
+                  for s in range(args.subreddits)}
+    counts = {"subreddits": len(subreddits), "posts": 0, "comments": 0, "triples": 0}
+
+    ttl_path = os.path.join(args.out, "KG.ttl")
+    json_path = os.path.join(args.out, "KG.json")
+    with open(ttl_path, "w", encoding="utf-8") as ttl, open(json_path, "w", encoding="utf-8") as js:
+        ttl.write(f"@prefix sioc: <{SIOC}> .\n@prefix dc: <{DC}> .\n\n")
+        js.write("[")
+        first = True
+
+        def entity(data):
+            nonlocal first
+            js.write(("\n" if first else ",\n") + json.dumps(data, ensure_ascii=False))
+            first = False
+
+        post_id = 0
+        for subreddit, topics in subreddits.items():
+            subreddit_uri = f"http://reddit.com/subreddit/{subreddit}"
+            for _ in range(posts_per_subreddit):
+                post_uri = f"http://reddit.com/post/{post_id}"
+                post_topics = rng.sample(topics, rng.randint(1, min(args.max_topics_per_post, len(topics))))
+                topic_uris = [f"http://reddit.com/topic/{t}" for t in post_topics]
+                post_title = title(rng, rng.randint(4, 12))
+                author = f"http://reddit.com/user/u{rng.randrange(args.users)}"
+                ttl.write(f"<{post_uri}> a sioc:Post ;\n"
+                          f"    sioc:has_container <{subreddit_uri}> ;\n"
+                          + "".join(f"    sioc:topic <{t}> ;\n" for t in topic_uris)
+                          + f"    dc:title {ttl_literal(post_title)} ;\n"
+                          f"    sioc:has_creator <{author}> .\n")
+                entity({"@id": post_uri, "@type": "sioc:Post", "sioc:Container": subreddit_uri,
+                        "sioc:topic": topic_uris, "dc:title": post_title})
+                counts["triples"] += 4 + len(topic_uris)
+
+                for c in range(comments_per_post(rng, args.comments_per_post)):
+                    comment_uri = f"http://reddit.com/comment/{post_id}_{c}"
+                    comment_title = title(rng, rng.randint(3, args.max_comment_words))
+                    author = f"http://reddit.com/user/u{rng.randrange(args.users)}"
+                    ttl.write(f"<{comment_uri}> a sioc:Comment ;\n"
+                              f"    sioc:reply_of <{post_uri}> ;\n"
+                              f"    dc:title {ttl_literal(comment_title)} ;\n"
+                              f"    sioc:has_creator <{author}> .\n")
+                    entity({"@id": comment_uri, "@type": "sioc:Comment", "sioc:reply_of": post_uri,
+                            "dc:title": comment_title})
+                    counts["triples"] += 4
+                    counts["comments"] += 1
+
+                counts["posts"] += 1
+                post_id += 1
+        js.write("\n]\n")
+
+    manifest = {
+        "params": {k: v for k, v in vars(args).items() if k != "out"},
+        "posts_per_subreddit": posts_per_subreddit,
+        "counts": counts,
+        "subreddits": subreddits,
+        "files": {"json": "KG.json", "ttl": "KG.ttl",
+                  "json_bytes": os.path.getsize(json_path), "ttl_bytes": os.path.getsize(ttl_path)},
+    }
+    with open(os.path.join(args.out, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    print(f"✅ Generated {counts['triples']} triples ({counts['posts']} posts, {counts['comments']} comments) "
+          f"in {time.time() - started:.1f}s -> {args.out}")
+    return manifest
+
+
+def parser():
+    p = argparse.ArgumentParser(description="Generate a synthetic SIOC/Dublin Core Reddit KG (KG.ttl + KG.json).")
+    p.add_argument("--out", required=True, help="output directory")
+    p.add_argument("--triples", type=int, help="approximate total triples (10k .. 10M); overrides --posts-per-subreddit")
+    p.add_argument("--subreddits", type=int, default=20)
+    p.add_argument("--topics-per-subreddit", type=int, default=8)
+    p.add_argument("--posts-per-subreddit", type=int, default=100)
+    p.add_argument("--max-topics-per-post", type=int, default=3)
+    p.add_argument("--comments-per-post", type=float, default=12, help="mean comments per post")
+    p.add_argument("--max-comment-words", type=int, default=40)
+    p.add_argument("--users", type=int, default=5000)
+    p.add_argument("--seed", type=int, default=0)
+    return p
+
+
+if __name__ == "__main__":
+    generate(parser().parse_args())
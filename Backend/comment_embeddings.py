@@ -0,0 +1,160 @@
+import json
+import os
+import time
+import zlib
+
+import numpy as np
+
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+
+
+# ✅ Precomputed Comment Embedding Matrix
+class CommentEmbeddings:
+    """Normalized dc:title embeddings, one row per comment ID, for query-time ranking."""
+
+    def __init__(self, comment_ids, matrix, meta=None):
+        self.comment_ids = list(comment_ids)
+        self.rows = {comment: i for i, comment in enumerate(self.comment_ids)}
+        self.matrix = matrix
+        self.meta = meta or {}
+
+    def __len__(self):
+        return len(self.comment_ids)
+
+    def vector(self, comment):
+        """The comment's normalized embedding as float32, or None if it has none."""
+        row = self.rows.get(comment)
+        return None if row is None else np.asarray(self.matrix[row], dtype=np.float32)
+
+    def rank(self, query_embedding, candidates):
+        """Orders candidate comment IDs by cosine similarity to the query, best first.
+
+        Candidates without an embedding keep their original order after the scored ones.
+        """
+        scored = [c for c in candidates if c in self.rows]
+        if not scored:
+            return list(candidates)
+        unscored = [c for c in candidates if c not in self.rows]
+
+        rows = np.fromiter((self.rows[c] for c in scored), dtype=np.int64, count=len(scored))
+        # Rows and query are both normalized, so one dot product gives cosine similarity.
+        scores = self.matrix[rows].astype(np.float32) @ np.asarray(query_embedding, dtype=np.float32)
+        order = np.argsort(-scores, kind="stable")
+        return [scored[i] for i in order] + unscored
+
+    def save(self, path):
+        """Writes <path>.npy (matrix) and <path>.json (comment IDs + metadata).
+
+        Temp files are per process, so workers rebuilding at the same time never rename each
+        other's half-written files. The JSON records a checksum of the matrix it was written
+        with, so load() can tell when two such saves left a mismatched pair behind.
+        """
+        matrix = np.ascontiguousarray(self.matrix)
+        suffix = f"{os.getpid()}.tmp"
+        with open(f"{path}.npy.{suffix}", "wb") as f:
+            np.save(f, matrix)
+        with open(f"{path}.json.{suffix}", "w", encoding="utf-8") as f:
+            json.dump({"meta": self.meta, "checksum": _checksum(matrix), "comment_ids": self.comment_ids}, f)
+        os.replace(f"{path}.npy.{suffix}", f"{path}.npy")
+        os.replace(f"{path}.json.{suffix}", f"{path}.json")
+
+    @classmethod
+    def load(cls, path):
+        """Loads a saved matrix memory-mapped, so workers share its pages."""
+        with open(f"{path}.json", "r", encoding="utf-8") as f:
+            data = json.load(f)
+        matrix = np.load(f"{path}.npy", mmap_mode="r")
+        if len(matrix) != len(data["comment_ids"]) or data.get("checksum") != _checksum(matrix):
+            raise ValueError(f"{path}.npy and {path}.json were written by different builds")
+        return cls(data["comment_ids"], matrix, data.get("meta"))
+
+
+def _checksum(matrix):
+    return zlib.crc32(np.ascontiguousarray(matrix).reshape(-1).view(np.uint8))
+
+
+def build_comment_embeddings(kg_index, encode, batch_size=256, dtype=np.float16, meta=None, previous=None):
+    """Encodes every indexed comment title with encode(texts) -> normalized vectors.
+
+    Comments that already have a row in `previous` (an older matrix from the same model)
+    copy it instead of being encoded again.
+    """
+    started = time.time()
+    comment_ids, titles = [], []
+    for comment, title in kg_index.iter_titles():
+        comment_ids.append(comment)
+        titles.append(title)
+
+    known = previous.rows if previous is not None and len(previous) else {}
+    fresh = [i for i, comment in enumerate(comment_ids) if comment not in known]
+    chunks = [np.asarray(encode([titles[j] for j in fresh[i:i + batch_size]]), dtype=dtype)
+              for i in range(0, len(fresh), batch_size)]
+    if not comment_ids:
+        matrix = np.zeros((0, 0), dtype=dtype)
+    else:
+        dim = chunks[0].shape[1] if chunks else previous.matrix.shape[1]
+        matrix = np.empty((len(comment_ids), dim), dtype=dtype)
+        if chunks:
+            matrix[fresh] = np.concatenate(chunks)
+        reused = [i for i, comment in enumerate(comment_ids) if comment in known]
+        if reused:
+            matrix[reused] = previous.matrix[[known[comment_ids[i]] for i in reused]]
+    print(f"✅ Embedded {len(fresh)} comments ({len(comment_ids) - len(fresh)} reused) in {time.time() - started:.2f}s.")
+    return CommentEmbeddings(comment_ids, matrix, meta)
+
+
+def reusable_comment_embeddings(path):
+    """The matrix saved at path if it was built with the current model (for any KG), else None."""
+    try:
+        embeddings = CommentEmbeddings.load(path)
+    except (OSError, ValueError, KeyError):
+        return None
+    return embeddings if embeddings.meta.get("model") == EMBEDDING_MODEL else None
+
+
+def carry_over_comment_embeddings(previous_path, out_path, kg_index, fingerprint, encode):
+    """Builds and saves the matrix for a recompiled KG to out_path, copying rows from previous_path.
+
+    Returns False, without writing anything, when previous_path holds no matrix from this model.
+    """
+    previous = reusable_comment_embeddings(previous_path)
+    if previous is None:
+        return False
+    meta = {"model": EMBEDDING_MODEL, "source": fingerprint}
+    build_comment_embeddings(kg_index, encode, meta=meta, previous=previous).save(out_path)
+    return True
+
+
+def load_or_build_comment_embeddings(path, kg_index, fingerprint, encode):
+    """Reuses the persisted matrix when it was built for this KG and model, else rebuilds it.
+
+    A rebuild only encodes comments the persisted matrix doesn't have.
+    """
+    meta = {"model": EMBEDDING_MODEL, "source": fingerprint}
+    previous = reusable_comment_embeddings(path)
+    if previous is not None and previous.meta == meta:
+        print(f"✅ Loaded {len(previous)} comment embeddings.")
+        return previous
+
+    embeddings = build_comment_embeddings(kg_index, encode, meta=meta, previous=previous)
+    try:
+        embeddings.save(path)
+    except OSError as e:
+        print(f"❌ Could not persist comment embeddings: {str(e)}")
+    return embeddings
+
+
+def encode_texts(texts, use_cache=True):
+    """Encodes texts with the shared SentenceTransformer loaded in vrs.
+
+    Bulk builds pass use_cache=False so comment titles don't crowd queries out of the embedding cache.
+    """
+    from vrs import get_model
+    return get_model().encode(texts, normalize_embeddings=True, batch_size=64, use_cache=use_cache)
+
+
+if __name__ == "__main__":
+    import kg_chat
+
+    # Building the snapshot persists the matrix next to the KG (see COMMENT_EMBEDDINGS_PATH).
+    kg_chat.build_kg_snapshot(kg_chat.KG_JSON_PATH, kg_chat.KG_TTL_PATH, kg_chat.KG_SNAPSHOT_PATH)
@@ -0,0 +1,122 @@
+import math
+import os
+import re
+
+import numpy as np
+
+# ✅ Prompt Budgets (in estimated tokens)
+# Context windows of the Groq models we use; unknown models get the smallest one.
+MODEL_CONTEXT_WINDOWS = {
+    "llama3-8b-8192": 8192,
+    "llama3-70b-8192": 8192,
+    "gemma2-9b-it": 8192,
+    "mixtral-8x7b-32768": 32768,
+    "llama-3.1-8b-instant": 131072,
+    "llama-3.3-70b-versatile": 131072,
+}
+DEFAULT_CONTEXT_WINDOW = 8192
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("CONTEXT_TOKEN_BUDGET", "1500"))
+CONTEXT_COMMENT_MAX_TOKENS = int(os.environ.get("CONTEXT_COMMENT_MAX_TOKENS", "160"))
+HISTORY_TOKEN_BUDGET = int(os.environ.get("HISTORY_TOKEN_BUDGET", "1024"))
+ANSWER_TOKEN_RESERVE = int(os.environ.get("ANSWER_TOKEN_RESERVE", "1024"))
+PROMPT_OVERHEAD_TOKENS = 256          # instructions, the question and per-message framing
+# Two comments are near-identical when their word trigrams overlap this much
+# (or, when comment embeddings are available, their cosine similarity reaches CONTEXT_DEDUP_COSINE).
+CONTEXT_DEDUP_JACCARD = float(os.environ.get("CONTEXT_DEDUP_JACCARD", "0.8"))
+CONTEXT_DEDUP_COSINE = float(os.environ.get("CONTEXT_DEDUP_COSINE", "0.95"))
+MIN_COMMENT_TOKENS = 16               # stop once less than this is left of the budget
+
+_piece_pattern = re.compile(r"\w+|[^\w\s]")
+
+
+def estimate_tokens(text):
+    """Cheap upper-leaning estimate of LLM tokens: ~4 characters per word piece, 1 per symbol."""
+    return sum(max(1, math.ceil(len(piece) / 4)) for piece in _piece_pattern.findall(text))
+
+
+def truncate_to_tokens(text, max_tokens):
+    """Cuts text at a word boundary so that it fits in max_tokens (marking the cut with an ellipsis)."""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    used = 1  # the ellipsis
+    end = 0
+    for match in _piece_pattern.finditer(text):
+        used += max(1, math.ceil(len(match.group()) / 4))
+        if used > max_tokens:
+            break
+        end = match.end()
+    return text[:end].rstrip() + "…"
+
+
+def context_budget(model):
+    """Tokens available for retrieved comments once history, the answer and the framing are reserved."""
+    window = MODEL_CONTEXT_WINDOWS.get(model, DEFAULT_CONTEXT_WINDOW)
+    return max(0, min(CONTEXT_TOKEN_BUDGET,
+                      window - ANSWER_TOKEN_RESERVE - HISTORY_TOKEN_BUDGET - PROMPT_OVERHEAD_TOKENS))
+
+
+def _shingles(text):
+    words = re.findall(r"\w+", text.lower())
+    if len(words) < 3:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + 3]) for i in range(len(words) - 2)}
+
+
+# ✅ Pack Ranked Comments into the Context Budget
+def pack_context(ranked, budget, comment_embeddings=None, max_comment_tokens=CONTEXT_COMMENT_MAX_TOKENS):
+    """Selects comments for the prompt from (comment_id, text) pairs ordered best first.
+
+    Near-identical comments are dropped, long ones are truncated to max_comment_tokens,
+    and comments are taken in relevance order until the token budget is spent.
+    Returns {"context": [texts], "comment_ids": [ids], "tokens": estimated tokens}.
+    """
+    texts, ids, kept_shingles, kept_vectors = [], [], [], []
+    used = 0
+
+    for comment_id, text in ranked:
+        if budget - used < MIN_COMMENT_TOKENS:
+            break
+        text = " ".join(text.split()) if isinstance(text, str) else ""
+        if not text:
+            continue
+
+        shingles = _shingles(text)
+        if any(len(shingles & kept) >= CONTEXT_DEDUP_JACCARD * len(shingles | kept) for kept in kept_shingles):
+            continue
+        vector = comment_embeddings.vector(comment_id) if comment_embeddings is not None else None
+        if vector is not None:
+            if kept_vectors and float(np.max(np.stack(kept_vectors) @ vector)) >= CONTEXT_DEDUP_COSINE:
+                continue
+
+        text = truncate_to_tokens(text, min(max_comment_tokens, budget - used))
+        cost = estimate_tokens(text)
+        if used + cost > budget:
+            continue
+
+        texts.append(text)
+        ids.append(comment_id)
+        kept_shingles.append(shingles)
+        if vector is not None:
+            kept_vectors.append(vector)
+        used += cost
+
+    return {"context": texts, "comment_ids": ids, "tokens": used}
+
+
+def format_context(context):
+    """Renders packed comments as a numbered list (retrieval errors are passed through as text)."""
+    if isinstance(context, dict):
+        return "\n".join(f"[{i}] {text}" for i, text in enumerate(context["context"], start=1))
+    return str(context)
+
+
+def fit_history(history, budget=HISTORY_TOKEN_BUDGET):
+    """Keeps the most recent turns whose combined size fits in the budget, oldest first."""
+    kept = []
+    used = 0
+    for turn in reversed(history):
+        used += estimate_tokens(turn["content"]) + 4
+        if used > budget:
+            break
+        kept.append(turn)
+    return kept[::-1]
@@ -0,0 +1,126 @@
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import Counter
+
+from sqlite_wal import thread_connection
+
+
+# ✅ Append-Only Conversation Store (SQLite WAL + write-behind thread)
+class ConversationStore:
+    """Per-user chat turns in one SQLite table, appended in the background.
+
+    append() only queues the turn, so requests never wait on disk. A writer thread
+    commits queued turns in batches. recent() reads the last N turns of a user
+    through the (user_id, id) index and also sees turns that are still queued; it
+    reads on its own thread's connection and never waits for a flush (WAL lets reads
+    run alongside the writer's transaction).
+    """
+
+    def __init__(self, path, flush_interval=0.2, max_batch=500):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self._pending = []                   # queued (user_id, role, content, created), oldest first
+        self._pending_lock = threading.Lock()
+        self._flush_lock = threading.Lock()  # held while a batch moves from _pending to the table
+        self._wakeup = queue.Queue()
+        self._local = threading.local()
+        self._writer = None
+        self._pid = None
+        self._stopped = False
+        db = self._db()
+        db.execute("""CREATE TABLE IF NOT EXISTS conversation_turns (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT NOT NULL,
+            role TEXT NOT NULL,
+            content TEXT NOT NULL,
+            created REAL NOT NULL)""")
+        db.execute("CREATE INDEX IF NOT EXISTS conversation_turns_user ON conversation_turns (user_id, id)")
+
+    def append(self, user_id, role, content):
+        self.append_many(user_id, [(role, content)])
+
+    def append_many(self, user_id, turns):
+        created = time.time()
+        with self._pending_lock:
+            self._pending.extend((str(user_id), role, content, created) for role, content in turns)
+        self._ensure_writer()
+        self._wakeup.put(None)
+
+    def recent(self, user_id, limit=10):
+        """Returns the user's last `limit` turns as [{"role", "content"}], oldest first."""
+        user_id = str(user_id)
+        if not limit:
+            return []
+        # Queue first: a turn leaves it only after its batch is committed, so every turn is
+        # in the queue, the table or both. The ones in both are dropped from the queue's side;
+        # reading len(queued) extra rows makes sure those are all within the rows read.
+        with self._pending_lock:
+            queued = [(role, content, created) for uid, role, content, created in self._pending if uid == user_id]
+        rows = self._db().execute(
+            "SELECT role, content, created FROM conversation_turns WHERE user_id = ? ORDER BY id DESC LIMIT ?",
+            (user_id, limit + len(queued))).fetchall()
+        committed, unsaved = Counter(rows), []
+        for turn in queued:
+            if committed[turn]:
+                committed[turn] -= 1
+            else:
+                unsaved.append(turn)
+        turns = rows[::-1] + unsaved
+        return [{"role": role, "content": content} for role, content, _ in turns[-limit:]]
+
+    def flush(self):
+        """Writes every queued turn now (used on shutdown and by callers that need durability)."""
+        while self._flush_batch():
+            pass
+
+    def close(self):
+        self._stopped = True
+        self._wakeup.put(None)
+        if self._writer is not None and self._pid == os.getpid():
+            self._writer.join(timeout=5)
+        self.flush()
+
+    def _ensure_writer(self):
+        # Started lazily and again after a fork, since threads don't survive into the child.
+        if self._writer is None or self._pid != os.getpid() or not self._writer.is_alive():
+            with self._pending_lock:
+                if self._writer is None or self._pid != os.getpid() or not self._writer.is_alive():
+                    self._pid = os.getpid()
+                    self._writer = threading.Thread(target=self._write_behind, name="conversation-writer",
+                                                    daemon=True)
+                    self._writer.start()
+
+    def _write_behind(self):
+        while not self._stopped:
+            self._wakeup.get()
+            # Let a few more turns pile up so they share one transaction.
+            time.sleep(self.flush_interval)
+            while not self._wakeup.empty():
+                self._wakeup.get_nowait()
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                print(f"❌ Conversation store write failed, will retry: {str(e)}")
+                time.sleep(1)
+                self._wakeup.put(None)
+
+    def _flush_batch(self):
+        with self._flush_lock:
+            with self._pending_lock:
+                batch = self._pending[:self.max_batch]
+            if not batch:
+                return False
+            db = self._db()
+            with db:
+                db.executemany(
+                    "INSERT INTO conversation_turns (user_id, role, content, created) VALUES (?, ?, ?, ?)", batch)
+            with self._pending_lock:
+                del self._pending[:len(batch)]
+            return True
+
+    def _db(self):
+        return thread_connection(self._local, self.path)
@@ -0,0 +1,283 @@
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+import metrics
+
+try:
+    import fcntl
+except ImportError:  # Windows: the disk tier still works, but without cross-process locking
+    fcntl = None
+
+
+# ✅ Disk Tier: memory-mapped vectors + append-only key index
+class _DiskTier:
+    """<name>.f32 holds float32 rows, <name>.keys holds "<hex key> <row>" lines.
+
+    Rows are appended under an exclusive file lock, vectors first and then keys,
+    so any key a reader sees points at a complete vector. Rows written by other
+    workers are picked up on the next miss, under a shared lock.
+
+    A write that would take the files past max_rows renames them to <name>.old.*
+    (replacing the previous old generation) and starts new ones, so the tier keeps
+    at most the last two generations of rows on disk and in its key maps.
+    """
+
+    def __init__(self, directory, name, dim, max_rows=100000):
+        os.makedirs(directory, exist_ok=True)
+        self.vectors_path = os.path.join(directory, f"{name}.f32")
+        self.keys_path = os.path.join(directory, f"{name}.keys")
+        self.old_vectors_path = os.path.join(directory, f"{name}.old.f32")
+        self.old_keys_path = os.path.join(directory, f"{name}.old.keys")
+        self.lock_path = os.path.join(directory, f"{name}.lock")
+        self.dim = dim
+        self.max_rows = max_rows
+        self.rows = {}
+        self.old_rows = {}
+        self._keys_offset = 0
+        self._vectors = None
+        self._old_vectors = None
+        self._generation = None
+        self._lock = threading.Lock()
+        for path in (self.vectors_path, self.keys_path, self.lock_path):
+            open(path, "ab").close()
+        with self._lock:
+            self._refresh()
+
+    def _refresh(self):
+        with open(self.lock_path, "ab") as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_SH)
+            try:
+                self._refresh_locked()
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _refresh_locked(self):
+        try:
+            generation = _file_id(self.keys_path)
+            if generation != self._generation:
+                # Another worker rotated the files: start over on the new ones.
+                self.rows, self._keys_offset, self._vectors = {}, 0, None
+                self.old_rows, self._old_vectors = self._read(self.old_keys_path, self.old_vectors_path)
+                self._generation = generation
+            self._vectors = self._map(self.vectors_path, self._vectors)
+            with open(self.keys_path, "rb") as f:
+                f.seek(self._keys_offset)
+                data = f.read()
+        except FileNotFoundError:
+            return  # mid-rotation on a platform without file locks
+        # Only consume whole lines; a concurrent writer may be mid-line.
+        data = data[:data.rfind(b"\n") + 1]
+        self._keys_offset += len(data)
+        self.rows.update(_parse_keys(data, 0 if self._vectors is None else len(self._vectors)))
+
+    def _map(self, path, current=None):
+        complete_rows = os.path.getsize(path) // (self.dim * 4)
+        if complete_rows and (current is None or len(current) < complete_rows):
+            return np.memmap(path, dtype=np.float32, mode="r", shape=(complete_rows, self.dim))
+        return current
+
+    def _read(self, keys_path, vectors_path):
+        try:
+            vectors = self._map(vectors_path)
+            with open(keys_path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return {}, None
+        return _parse_keys(data, 0 if vectors is None else len(vectors)), vectors
+
+    def get(self, key):
+        with self._lock:
+            vector = self._find(key)
+            if vector is None:
+                self._refresh()
+                vector = self._find(key)
+            return vector
+
+    def _find(self, key):
+        row = self.rows.get(key)
+        if row is not None:
+            return np.array(self._vectors[row])
+        row = self.old_rows.get(key)
+        return None if row is None else np.array(self._old_vectors[row])
+
+    def put_many(self, keys, vectors):
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32).reshape(len(keys), self.dim)
+        if self.max_rows and len(keys) > self.max_rows:
+            # Only the last max_rows fit in a generation; the rest would be rotated out anyway.
+            keys, vectors = list(keys)[-self.max_rows:], vectors[-self.max_rows:]
+        row_bytes = self.dim * 4
+        # The lock file is never renamed, so it serializes writers across rotations.
+        with self._lock, open(self.lock_path, "ab") as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                if self.max_rows and os.path.getsize(self.vectors_path) // row_bytes + len(keys) > self.max_rows:
+                    self._rotate()
+                with open(self.keys_path, "ab") as keys_file, open(self.vectors_path, "r+b") as vectors_file:
+                    # Drop a partial row left by a crashed writer, then append after the last full row.
+                    size = vectors_file.seek(0, os.SEEK_END)
+                    first_row = size // row_bytes
+                    vectors_file.truncate(first_row * row_bytes)
+                    vectors_file.seek(first_row * row_bytes)
+                    vectors_file.write(vectors.tobytes())
+                    vectors_file.flush()
+                    keys_file.write("".join(f"{key} {first_row + i}\n" for i, key in enumerate(keys)).encode("ascii"))
+                    keys_file.flush()
+                self._refresh_locked()
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _rotate(self):
+        os.replace(self.keys_path, self.old_keys_path)
+        os.replace(self.vectors_path, self.old_vectors_path)
+        for path in (self.vectors_path, self.keys_path):
+            open(path, "ab").close()
+        print(f"🔄 Rotated embedding cache {self.keys_path} after {self.max_rows} rows.")
+
+
+def _file_id(path):
+    stat = os.stat(path)
+    return stat.st_dev, stat.st_ino
+
+
+def _parse_keys(data, complete_rows):
+    rows = {}
+    for line in data.splitlines():
+        key, _, row = line.decode("ascii").partition(" ")
+        if row.isdigit() and int(row) < complete_rows:
+            rows[key] = int(row)
+    return rows
+
+
+# ✅ Cached SentenceTransformer Encoder
+class CachedEncoder:
+    """Drop-in wrapper for SentenceTransformer.encode with an LRU and an optional disk tier.
+
+    Keys are a hash of model name, normalization flag and the whitespace-collapsed
+    text (also lowercased for uncased models), so repeated and near-repeated texts
+    skip inference entirely.
+    """
+
+    def __init__(self, model, model_name, cache_dir=None, max_entries=10000, lowercase=False,
+                 max_disk_entries=100000):
+        self.model = model
+        self.model_name = model_name
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self.lowercase = lowercase
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk = {}
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def __getattr__(self, name):
+        # Anything else (get_sentence_embedding_dimension, ...) goes to the wrapped model.
+        if name == "model":
+            raise AttributeError(name)
+        return getattr(self.model, name)
+
+    def key(self, text, normalize_embeddings):
+        text = " ".join(text.split())
+        if self.lowercase:
+            text = text.lower()
+        raw = f"{self.model_name}\x00{int(bool(normalize_embeddings))}\x00{text}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def encode(self, sentences, normalize_embeddings=False, batch_size=32, use_cache=True, **kwargs):
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        if not use_cache or kwargs or not texts:
+            return self.model.encode(sentences, normalize_embeddings=normalize_embeddings,
+                                     batch_size=batch_size, **kwargs)
+
+        keys = [self.key(text, normalize_embeddings) for text in texts]
+        vectors = [self._lookup(key, normalize_embeddings) for key in keys]
+        misses = sum(vector is None for vector in vectors)
+        metrics.count_cache("embedding", "hit", len(vectors) - misses)
+        metrics.count_cache("embedding", "miss", misses)
+
+        # Encode each distinct missing text once, in one model call
+        missing = {}
+        for i, vector in enumerate(vectors):
+            if vector is None:
+                missing.setdefault(keys[i], texts[i])
+        if missing:
+            encoded = np.asarray(self.model.encode(list(missing.values()), normalize_embeddings=normalize_embeddings,
+                                                   batch_size=batch_size), dtype=np.float32)
+            fresh = dict(zip(missing, encoded))
+            self._store(fresh, normalize_embeddings)
+            vectors = [fresh[key] if vector is None else vector for key, vector in zip(keys, vectors)]
+
+        result = np.stack(vectors)
+        return result[0] if single else result
+
+    def _lookup(self, key, normalize_embeddings):
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return vector
+
+        disk = self._disk_tier(normalize_embeddings)
+        vector = disk.get(key) if disk else None
+        with self._lock:
+            if vector is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+        self._remember({key: vector})
+        return vector
+
+    def _store(self, fresh, normalize_embeddings):
+        self._remember(fresh)
+        disk = self._disk_tier(normalize_embeddings, dim=len(next(iter(fresh.values()))))
+        if disk:
+            try:
+                disk.put_many(list(fresh), np.stack(list(fresh.values())))
+            except OSError as e:
+                print(f"❌ Embedding cache write failed: {str(e)}")
+
+    def _remember(self, vectors):
+        with self._lock:
+            for key, vector in vectors.items():
+                self._entries[key] = vector
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _disk_tier(self, normalize_embeddings, dim=None):
+        if not self.cache_dir:
+            return None
+        name = f"{re.sub(r'[^A-Za-z0-9_.-]', '_', self.model_name)}-{'norm' if normalize_embeddings else 'raw'}"
+        with self._lock:
+            disk = self._disk.get(name)
+            if disk is None:
+                dim = dim or self.model.get_sentence_embedding_dimension()
+                try:
+                    disk = self._disk[name] = _DiskTier(self.cache_dir, name, dim, self.max_disk_entries)
+                except OSError as e:
+                    print(f"❌ Embedding cache unavailable: {str(e)}")
+                    self.cache_dir = None
+            return disk
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+            }
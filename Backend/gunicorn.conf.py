@@ -0,0 +1,85 @@
+"""Gunicorn settings for production: gunicorn -c gunicorn.conf.py wsgi:app
+
+Everything is configurable through the environment:
+
+    WEB_BIND            address to listen on (default 0.0.0.0:5000)
+    WEB_WORKERS         worker processes (default: CPU count, at most 4)
+    WEB_THREADS         threads per worker (default 4)
+    WEB_TIMEOUT         seconds before a silent worker is restarted (default 120)
+    WEB_MAX_REQUESTS    recycle a worker after this many requests (default 0 = never)
+    WEB_PRELOAD         1 (default) loads models + KG once in the master before forking
+    WEB_PIDFILE         where to write the master PID (default gunicorn.pid)
+    TORCH_THREADS       intra-op threads per worker for MiniLM (default 1)
+    VIZ_EXECUTOR        "process" scores visualizations in a process pool per worker
+                        instead of in request threads (default "inline"; see viz_pool.py)
+    VIZ_POOL_WORKERS    pool processes per worker (default: CPU count / WEB_WORKERS)
+    PROMETHEUS_MULTIPROC_DIR
+                        directory where workers write their metrics, so /metrics
+                        reports all workers (default <tmp>/fyp-prometheus; emptied at start)
+
+Measuring it:
+
+    gunicorn -c gunicorn.conf.py wsgi:app &
+    python measure_workers.py --pid $(cat gunicorn.pid) --requests 500 --concurrency 16
+
+measure_workers.py prints RSS, PSS and shared memory per worker, then load-tests
+an endpoint and prints requests/sec and latency percentiles. RSS counts shared
+pages in every worker, so compare PSS (each shared page split between the
+processes using it) between WEB_PRELOAD=1 and WEB_PRELOAD=0 to see what preloading saves.
+"""
+import glob
+import multiprocessing
+import os
+import tempfile
+
+# One inference thread per worker by default: workers x threads already cover the cores.
+# Set before torch is imported by the preload.
+os.environ.setdefault("OMP_NUM_THREADS", os.environ.get("TORCH_THREADS", "1"))
+os.environ.setdefault("MKL_NUM_THREADS", os.environ.get("TORCH_THREADS", "1"))
+# HuggingFace tokenizers must not start their thread pool before the fork.
+os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+
+# Each worker keeps its own metrics; prometheus_client adds them up from this directory.
+# Must be set before metrics.py is imported, and must not hold files from a previous run.
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "fyp-prometheus"))
+os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+for stale in glob.glob(os.path.join(os.environ["PROMETHEUS_MULTIPROC_DIR"], "*.db")):
+    os.remove(stale)
+
+bind = os.environ.get("WEB_BIND", "0.0.0.0:5000")
+workers = int(os.environ.get("WEB_WORKERS", min(multiprocessing.cpu_count(), 4)))
+threads = int(os.environ.get("WEB_THREADS", "4"))
+worker_class = "gthread"
+timeout = int(os.environ.get("WEB_TIMEOUT", "120"))
+graceful_timeout = 30
+keepalive = 5
+max_requests = int(os.environ.get("WEB_MAX_REQUESTS", "0"))
+max_requests_jitter = max_requests // 10
+# Every web worker gets its own visualization pool; together they should cover the cores once.
+os.environ.setdefault("VIZ_POOL_WORKERS", str(max(1, multiprocessing.cpu_count() // workers)))
+preload_app = os.environ.get("WEB_PRELOAD", "1") != "0"
+pidfile = os.environ.get("WEB_PIDFILE", "gunicorn.pid")
+accesslog = "-"
+
+if not preload_app:
+    # Without preloading every worker loads its own models, in the background.
+    os.environ.setdefault("WARMUP", "1")
+
+
+def when_ready(server):
+    # Runs in the master after wsgi.py is imported and before any worker is forked.
+    if preload_app:
+        import wsgi
+        wsgi.preload()
+        server.log.info("Models and KG preloaded in the master (pid %s)", os.getpid())
+
+
+def post_fork(server, worker):
+    if preload_app:
+        import wsgi
+        wsgi.after_fork()
+
+
+def child_exit(server, worker):
+    import metrics
+    metrics.mark_process_dead(worker.pid)
@@ -0,0 +1,150 @@
+from array import array
+
+import numpy as np
+
+
+# ✅ Interned Term Dictionary
+class StringTable:
+    """Terms stored once in a UTF-8 blob, sorted by bytes so term -> ID is a binary search.
+
+    Costs the string bytes plus 8 bytes per term, instead of a Python str and dict
+    entry per term. The arrays can live in memory or be views over an mmap.
+    """
+
+    def __init__(self, offsets, blob):
+        self.offsets = offsets
+        self.blob = blob
+
+    @classmethod
+    def from_sorted(cls, encoded_terms):
+        offsets = np.zeros(len(encoded_terms) + 1, dtype=np.uint64)
+        np.cumsum([len(term) for term in encoded_terms], out=offsets[1:])
+        blob = np.frombuffer(b"".join(encoded_terms), dtype=np.uint8)
+        return cls(offsets, blob)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, term_id):
+        return self._bytes(term_id).decode("utf-8")
+
+    def _bytes(self, term_id):
+        return self.blob[int(self.offsets[term_id]):int(self.offsets[term_id + 1])].tobytes()
+
+    def lookup(self, text):
+        """Returns the integer ID of a term, or -1 if it isn't in the table."""
+        key = text.encode("utf-8")
+        lo, hi = 0, len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._bytes(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(self) and self._bytes(lo) == key:
+            return lo
+        return -1
+
+
+# ✅ CSR Adjacency over Interned Term IDs
+class CSRAdjacency:
+    """Outgoing and incoming edges as offsets + neighbor/predicate int32 arrays.
+
+    get(term) keeps the old adjacency_list contract: every (s, p, o) triple where
+    the term is the subject or the object, as strings.
+    """
+
+    def __init__(self, strings, out_offsets, out_neighbors, out_predicates,
+                 in_offsets, in_neighbors, in_predicates):
+        self.strings = strings
+        self.out_offsets = out_offsets
+        self.out_neighbors = out_neighbors
+        self.out_predicates = out_predicates
+        self.in_offsets = in_offsets
+        self.in_neighbors = in_neighbors
+        self.in_predicates = in_predicates
+
+    @classmethod
+    def from_triples(cls, triples, extra_terms=()):
+        """Interns (s, p, o) string triples and builds both CSR directions."""
+        ids = {}
+        subjects, predicates, objects = array("i"), array("i"), array("i")
+        for s, p, o in triples:
+            subjects.append(ids.setdefault(s, len(ids)))
+            predicates.append(ids.setdefault(p, len(ids)))
+            objects.append(ids.setdefault(o, len(ids)))
+        for term in extra_terms:
+            ids.setdefault(term, len(ids))
+
+        # Renumber so IDs follow the sorted string table.
+        encoded = [term.encode("utf-8") for term in ids]
+        del ids
+        order = sorted(range(len(encoded)), key=encoded.__getitem__)
+        remap = np.empty(len(encoded), dtype=np.int32)
+        remap[order] = np.arange(len(encoded), dtype=np.int32)
+        strings = StringTable.from_sorted([encoded[i] for i in order])
+        del encoded, order
+
+        return cls.from_id_triples(
+            strings,
+            remap[np.frombuffer(subjects, dtype=np.int32)],
+            remap[np.frombuffer(predicates, dtype=np.int32)],
+            remap[np.frombuffer(objects, dtype=np.int32)],
+        )
+
+    @classmethod
+    def from_id_triples(cls, strings, subjects, predicates, objects):
+        n_terms = len(strings)
+        out_offsets, out_order = _csr_order(subjects, n_terms)
+        in_offsets, in_order = _csr_order(objects, n_terms)
+        return cls(
+            strings,
+            out_offsets, objects[out_order], predicates[out_order],
+            in_offsets, subjects[in_order], predicates[in_order],
+        )
+
+    def __len__(self):
+        return len(self.out_neighbors)
+
+    def __contains__(self, term):
+        return self.strings.lookup(term) >= 0
+
+    def lookup(self, term):
+        return self.strings.lookup(term)
+
+    def out_edges(self, term_id):
+        """(neighbor IDs, predicate IDs) for triples with term_id as subject."""
+        start, end = self.out_offsets[term_id], self.out_offsets[term_id + 1]
+        return self.out_neighbors[start:end], self.out_predicates[start:end]
+
+    def in_edges(self, term_id):
+        """(neighbor IDs, predicate IDs) for triples with term_id as object."""
+        start, end = self.in_offsets[term_id], self.in_offsets[term_id + 1]
+        return self.in_neighbors[start:end], self.in_predicates[start:end]
+
+    def get(self, term, default=None):
+        term_id = self.strings.lookup(term)
+        if term_id < 0:
+            return default
+
+        strings = self.strings
+        triples = []
+        neighbors, predicates = self.out_edges(term_id)
+        for o, p in zip(neighbors, predicates):
+            triples.append((term, strings[p], strings[o]))
+        neighbors, predicates = self.in_edges(term_id)
+        for s, p in zip(neighbors, predicates):
+            triples.append((strings[s], strings[p], term))
+        return triples or default
+
+    def nbytes(self):
+        arrays = (self.strings.offsets, self.strings.blob, self.out_offsets, self.out_neighbors,
+                  self.out_predicates, self.in_offsets, self.in_neighbors, self.in_predicates)
+        return sum(a.nbytes for a in arrays)
+
+
+def _csr_order(keys, n_terms):
+    """Returns CSR offsets for the key column and the stable order that groups it."""
+    offsets = np.zeros(n_terms + 1, dtype=np.int64)
+    np.cumsum(np.bincount(keys, minlength=n_terms), out=offsets[1:])
+    return offsets, np.argsort(keys, kind="stable")
@@ -1,22 +1,67 @@
 import json
+import os
 import rdflib
-import csv
+import atexit
 import re
+import shutil
 import time
-from collections import deque, defaultdict
+import threading
+from collections import defaultdict
 from rdflib import Graph, Namespace, Literal, URIRef
 from nltk.tokenize import word_tokenize
 from nltk.corpus import stopwords
 from nltk.stem import WordNetLemmatizer
-from groq import Groq
 from concurrent.futures import ThreadPoolExecutor
-
-# ✅ Initialize Groq Client
-client = Groq(api_key="YourLLM")
-
-# ✅ CSV File for Conversation History
-csv_file_path = "conversation_history.csv"
-conversation_history = []
+from kg_store import KGStore, KGSnapshot
+from kg_index import KGIndex, entities_by_id
+from kg_adjacency import CSRAdjacency
+from kg_snapshot import MappedKG, is_fresh, parse_sources, source_fingerprint, write_snapshot
+from kg_shards import MANIFEST, KGShardStore, read_manifest, remove_stale_shards, write_shards
+from kg_ingest import KGIngestor
+from comment_embeddings import carry_over_comment_embeddings, load_or_build_comment_embeddings, encode_texts
+from llm_client import LLMClient
+from answer_cache import AnswerCache
+from conversation_store import ConversationStore
+from context_builder import (context_budget, pack_context, format_context, fit_history, estimate_tokens,
+                             CONTEXT_COMMENT_MAX_TOKENS)
+from kg_traversal import khop, objects_of
+import metrics
+
+# ✅ Initialize Groq Client (pooled, with deadlines, retries and a concurrency cap; set LLM_BASE_URL to point elsewhere)
+client = LLMClient()
+GROQ_MODEL = os.environ.get("GROQ_MODEL", "llama3-8b-8192")
+
+# ✅ Answer Cache (same retrieved comments + same or near-identical question -> reuse the answer)
+answer_cache = AnswerCache(
+    max_entries=int(os.environ.get("ANSWER_CACHE_SIZE", "2048")),
+    ttl=float(os.environ.get("ANSWER_CACHE_TTL", "3600")),
+    threshold=float(os.environ.get("ANSWER_CACHE_THRESHOLD", "0.93")),
+)
+
+# ✅ Knowledge Graph Files
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+KG_JSON_PATH = os.environ.get("KG_JSON_PATH", os.path.join(BASE_DIR, "KG.json"))
+KG_TTL_PATH = os.environ.get("KG_TTL_PATH", os.path.join(BASE_DIR, "KG.ttl"))
+KG_SNAPSHOT_PATH = os.environ.get("KG_SNAPSHOT_PATH", os.path.join(BASE_DIR, "KG.snap"))
+COMMENT_EMBEDDINGS_PATH = os.environ.get("COMMENT_EMBEDDINGS_PATH", os.path.join(BASE_DIR, "KG.comment_emb"))
+KG_POLL_INTERVAL = float(os.environ.get("KG_POLL_INTERVAL", "5"))
+
+# ✅ Per-Subreddit Shards (used instead of the whole KG once compiled with kg_shards.py)
+KG_SHARD_DIR = os.environ.get("KG_SHARD_DIR", os.path.join(BASE_DIR, "KG.shards"))
+KG_SHARD_CACHE_MB = float(os.environ.get("KG_SHARD_CACHE_MB", "512"))
+
+# ✅ Incremental Ingestion (new posts/comments go to a delta log + in-memory overlay, merged into the files later)
+KG_DELTA_LOG_PATH = os.environ.get("KG_DELTA_LOG_PATH", os.path.join(BASE_DIR, "KG.delta.jsonl"))
+KG_DELTA_COMPACT_BYTES = int(os.environ.get("KG_DELTA_COMPACT_BYTES", str(64 * 1024 * 1024)))
+ingestor = KGIngestor(KG_DELTA_LOG_PATH, KG_JSON_PATH, KG_TTL_PATH, KG_DELTA_COMPACT_BYTES,
+                      encode=lambda texts: encode_texts(texts, use_cache=False),
+                      recompile=lambda json_path, ttl_path: recompile_kg(json_path, ttl_path))
+
+# ✅ Conversation History (per-user turns in SQLite, written in the background)
+CONVERSATION_DB_PATH = os.environ.get("CONVERSATION_DB_PATH", os.path.join(BASE_DIR, "conversations.db"))
+CONVERSATION_HISTORY_TURNS = int(os.environ.get("CONVERSATION_HISTORY_TURNS", "6"))
+conversation_store = ConversationStore(CONVERSATION_DB_PATH)
+atexit.register(conversation_store.flush)
 
 # ✅ Define RDF Namespaces
 SIOC = Namespace("http://rdfs.org/sioc/ns#")
@@ -24,9 +69,16 @@ DCMI = Namespace("http://purl.org/dc/elements/1.1/")
 FOAF = Namespace("http://xmlns.com/foaf/0.1/")
 REDDIT = Namespace("http://reddit.com/ns#")
 
-# ✅ NLP Preprocessing
+# ✅ NLP Preprocessing (stopwords/WordNet are read on first use, not at import)
 lemmatizer = WordNetLemmatizer()
-stop_words = set(stopwords.words("english"))
+_stop_words = None
+
+
+def get_stop_words():
+    global _stop_words
+    if _stop_words is None:
+        _stop_words = set(stopwords.words("english"))
+    return _stop_words
 
 
 def preprocess_text(text):
@@ -36,6 +88,7 @@ def preprocess_text(text):
 
     text = re.sub(r'[^\w\s]', '', text)
     tokens = word_tokenize(text.lower())
+    stop_words = get_stop_words()
     return [lemmatizer.lemmatize(word) for word in tokens if word not in stop_words and len(word) > 2]
 
 
@@ -46,7 +99,7 @@ def load_kg_json(file_path):
         with open(file_path, "r", encoding="utf-8") as f:
             data = json.load(f)
         print(f"✅ Loaded KG.json with {len(data)} entities.")
-        return {entity["@id"]: entity for entity in data}
+        return entities_by_id(data)
     except Exception as e:
         print(f"❌ Error loading KG.json: {str(e)}")
         return None
@@ -54,119 +107,512 @@ def load_kg_json(file_path):
 
 # ✅ Load KG.ttl & Build Adjacency List
 def load_kg_ttl(file_path):
-    """Loads KG.ttl and builds an adjacency list for fast graph traversal."""
+    """Loads KG.ttl and builds an interned CSR adjacency list for fast graph traversal."""
     try:
         g = Graph()
         g.parse(file_path, format="turtle")
-        adjacency_list = defaultdict(list)
+        adjacency_list = CSRAdjacency.from_triples((str(s), str(p), str(o)) for s, p, o in g)
 
-        for s, p, o in g:
-            adjacency_list[str(s)].append((s, p, o))
-            adjacency_list[str(o)].append((s, p, o))
-
-        print(f"✅ Loaded KG.ttl with {len(g)} triples.")
+        print(f"✅ Loaded KG.ttl with {len(g)} triples ({adjacency_list.nbytes() / 1e6:.1f} MB adjacency).")
         return g, adjacency_list
     except Exception as e:
         print(f"❌ Error loading KG.ttl: {str(e)}")
         return None, None
 
 
-# ✅ **Optimized BFS Retrieval with Subreddit & Topic Filtering**
-def retrieve_relevant_comments(kg_json, adjacency_list, subreddit, topic):
-    """Retrieves only comments relevant to the given subreddit and topic."""
-    if not kg_json:
+# ✅ Build a Snapshot for the Shared KG Store
+def build_kg_snapshot(json_path, ttl_path, snapshot_path=None, embed_comments=True):
+    """Loads the KG into a KGSnapshot, or returns None if loading fails.
+
+    A compiled snapshot (see kg_snapshot.py) is memory-mapped when it matches the
+    current source files; otherwise KG.json and KG.ttl are parsed.
+    """
+    with metrics.timed("kg", "kg_load"):
+        snapshot = _build_kg_snapshot(json_path, ttl_path, snapshot_path, embed_comments)
+        if snapshot is not None:
+            # Ingested data not yet merged into the files is replayed on top.
+            ingestor.attach(snapshot)
+    metrics.kg_loads.labels("failed" if snapshot is None else "loaded").inc()
+    if snapshot is not None:
+        metrics.kg_size.labels("triples").set(len(snapshot.adjacency_list))
+        metrics.kg_size.labels("embedded_comments").set(len(snapshot.comment_embeddings or ()))
+    return snapshot
+
+
+def _build_kg_snapshot(json_path, ttl_path, snapshot_path, embed_comments):
+    # Held so a compaction can't swap the files between the freshness check and the loads.
+    with ingestor.files_lock():
+        if snapshot_path and is_fresh(snapshot_path, json_path, ttl_path):
+            try:
+                mapped = MappedKG(snapshot_path)
+                print(f"✅ Mapped KG snapshot with {len(mapped)} triples.")
+                snapshot = KGSnapshot(None, mapped, mapped)
+                if embed_comments:
+                    _load_comment_embeddings(snapshot, COMMENT_EMBEDDINGS_PATH, mapped.header["source"])
+                return snapshot
+            except Exception as e:
+                print(f"❌ Error mapping KG snapshot: {str(e)}")
+
+    fingerprint = source_fingerprint((json_path, ttl_path))
+    kg_json = load_kg_json(json_path)
+    _, adjacency_list = load_kg_ttl(ttl_path)
+    if kg_json is None or adjacency_list is None:
+        return None
+    # Only the adjacency list is kept; the rdflib Graph is dropped here.
+    snapshot = KGSnapshot(kg_json, adjacency_list, KGIndex.build(kg_json, adjacency_list))
+    if embed_comments:
+        _load_comment_embeddings(snapshot, COMMENT_EMBEDDINGS_PATH, fingerprint)
+    return snapshot
+
+
+def _load_comment_embeddings(snapshot, path, fingerprint):
+    try:
+        snapshot.comment_embeddings = load_or_build_comment_embeddings(
+            path, snapshot.index, fingerprint, lambda texts: encode_texts(texts, use_cache=False))
+    except Exception as e:
+        print(f"❌ Comment embeddings unavailable, using unranked context: {str(e)}")
+
+
+def build_shard_snapshot(path, subreddit_uri=None, embed_comments=True):
+    """Maps one subreddit shard into a KGSnapshot; returns (snapshot, bytes it holds).
+
+    path=None gives an empty snapshot, for subreddits that only exist in ingested data.
+    A shard's comment embeddings are built on its first load and persisted next to it.
+    Only the subreddit's own ingested data is layered over it.
+    """
+    with metrics.timed("kg", "shard_load"):
+        if path is None:
+            snapshot, nbytes = KGSnapshot({}, CSRAdjacency.from_triples([]), KGIndex()), 0
+        else:
+            with ingestor.files_lock():
+                try:
+                    mapped = MappedKG(path)
+                except Exception as e:
+                    print(f"❌ Error mapping KG shard {path}: {str(e)}")
+                    metrics.kg_loads.labels("failed").inc()
+                    return None, 0
+                snapshot, nbytes = KGSnapshot(None, mapped, mapped), os.path.getsize(path)
+                if embed_comments:
+                    _load_comment_embeddings(snapshot, f"{path}.comment_emb", mapped.header["source"])
+                    if snapshot.comment_embeddings is not None:
+                        nbytes += snapshot.comment_embeddings.matrix.nbytes
+        ingestor.attach(snapshot, subreddit_uri)
+    metrics.kg_loads.labels("loaded").inc()
+    return snapshot, nbytes
+
+
+_kg_store = None
+_kg_store_lock = threading.Lock()
+
+
+def get_kg_store():
+    """Returns the process-wide KG store, creating it on first use."""
+    global _kg_store
+    if _kg_store is None:
+        with _kg_store_lock:
+            if _kg_store is None:
+                # The watcher runs from the start; the KG itself loads on first use or in warm_up().
+                _kg_store = KGStore((KG_JSON_PATH, KG_TTL_PATH, KG_SNAPSHOT_PATH),
+                                    build_kg_snapshot, KG_POLL_INTERVAL).start(load=False)
+    return _kg_store
+
+
+_shard_store = None
+
+
+def get_shard_store():
+    """Returns the process-wide shard cache, creating it on first use."""
+    global _shard_store
+    if _shard_store is None:
+        with _kg_store_lock:
+            if _shard_store is None:
+                _shard_store = KGShardStore(KG_SHARD_DIR, (KG_JSON_PATH, KG_TTL_PATH), build_shard_snapshot,
+                                            int(KG_SHARD_CACHE_MB * 1024 * 1024), KG_POLL_INTERVAL,
+                                            files_lock=ingestor.files_lock,
+                                            on_stale=lambda: ingestor.recompile_in_background(shards_stale),
+                                            extra_bytes=lambda snapshot: snapshot.overlay.nbytes)
+    return _shard_store
+
+
+def shards_stale():
+    """True when the compiled shards are older than KG.json / KG.ttl."""
+    manifest = read_manifest(KG_SHARD_DIR, KG_JSON_PATH, KG_TTL_PATH)
+    return manifest is not None and manifest["stale"]
+
+
+# ✅ Recompile after Delta Log Compaction (or when the shards are stale)
+def recompile_kg(json_path, ttl_path):
+    """Compiles json_path / ttl_path next to the live compiled files; returns a function that swaps them in.
+
+    The sources are merged copies of KG.json / KG.ttl when compacting, or the live files
+    when the shards turn out stale. Only what this deployment serves from is rebuilt:
+    KG.snap if it exists, the shards if they are compiled, and comment embeddings where
+    they were built before. Embedding rows are carried over by comment ID, so only the
+    new comments are encoded.
+    """
+    started = time.time()
+    suffix = f"{os.getpid()}.compact"
+    source = source_fingerprint((json_path, ttl_path))
+    kg_json, triples = parse_sources(json_path, ttl_path)
+    encode = lambda texts: encode_texts(texts, use_cache=False)
+    swaps, shard_copy, manifest = [], None, None
+
+    def carry_over(previous, snapshot_path, out_path):
+        if carry_over_comment_embeddings(previous, out_path, MappedKG(snapshot_path), source, encode):
+            return [(f"{out_path}.npy", f"{previous}.npy"), (f"{out_path}.json", f"{previous}.json")]
+        return []
+
+    try:
+        if os.path.exists(KG_SNAPSHOT_PATH):
+            snapshot_copy = f"{KG_SNAPSHOT_PATH}.{suffix}"
+            write_snapshot(kg_json, triples, snapshot_copy, source)
+            swaps.append((snapshot_copy, KG_SNAPSHOT_PATH))
+            swaps.extend(carry_over(COMMENT_EMBEDDINGS_PATH, snapshot_copy, f"{COMMENT_EMBEDDINGS_PATH}.{suffix}"))
+
+        if os.path.exists(os.path.join(KG_SHARD_DIR, MANIFEST)):
+            shard_copy = f"{KG_SHARD_DIR}.{suffix}"
+            manifest = write_shards(kg_json, triples, shard_copy, source)
+            for info in manifest["shards"].values():
+                path = os.path.join(shard_copy, info["file"])
+                # Renamed into place together with the shard below.
+                carry_over(os.path.join(KG_SHARD_DIR, info["file"]) + ".comment_emb", path, f"{path}.comment_emb")
+    except BaseException:
+        for copy, _ in swaps:
+            if os.path.exists(copy):
+                os.remove(copy)
+        if shard_copy is not None:
+            shutil.rmtree(shard_copy, ignore_errors=True)
+        raise
+    print(f"✅ Recompiled the KG in {time.time() - started:.2f}s.")
+
+    def swap():
+        for copy, target in swaps:
+            os.replace(copy, target)
+        if shard_copy is not None:
+            # The manifest goes last; shards are looked up through it.
+            for name in sorted(os.listdir(shard_copy), key=lambda name: name == MANIFEST):
+                os.replace(os.path.join(shard_copy, name), os.path.join(KG_SHARD_DIR, name))
+            remove_stale_shards(KG_SHARD_DIR, manifest)
+            os.rmdir(shard_copy)
+    return swap
+
+
+def kg_snapshot_for(subreddit):
+    """The snapshot serving one subreddit: its shard when shards are compiled (even stale ones), else the whole KG."""
+    shards = get_shard_store()
+    if shards.available():
+        return shards.snapshot(f"http://reddit.com/subreddit/{subreddit}")
+    return get_kg_store().snapshot()
+
+
+def warm_up():
+    """Loads the KG and the NLTK stopwords up front so the first chat request doesn't pay for it.
+
+    With shards, nothing is loaded until a subreddit is asked for.
+    """
+    if not get_shard_store().available():
+        get_kg_store().snapshot()
+    get_stop_words()
+
+
+def loaded_resources():
+    return {
+        "knowledge_graph": (_kg_store is not None and _kg_store.is_loaded())
+                           or (_shard_store is not None and _shard_store.manifest is not None),
+        "nltk": _stop_words is not None,
+    }
+
+
+# ✅ Multi-Topic Retrieval Settings
+RRF_K = 60
+# Candidates considered for the prompt; how many are sent depends on the token budget (see context_builder.py).
+MAX_CONTEXT_CANDIDATES = int(os.environ.get("MAX_CONTEXT_CANDIDATES", "50"))
+_retrieval_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="kg-retrieval")
+
+# ✅ Multi-Hop Context (replies further down the posts' threads; see kg_traversal.py)
+# Only used when the posts' own comments don't fill the token budget. 0 hops turns it off.
+# Threads never leave their subreddit, so the default gives the same context with and without
+# shards. has_creator / links_to can be added, but they only reach other subreddits'
+# content without shards, which leave those users and links out (see kg_shards.py).
+RETRIEVAL_HOPS = int(os.environ.get("RETRIEVAL_HOPS", "3"))
+RETRIEVAL_HOP_PREDICATES = [
+    p if "://" in p else "http://rdfs.org/sioc/ns#" + p
+    for p in os.environ.get("RETRIEVAL_HOP_PREDICATES", "reply_of,has_reply").split(",") if p
+]
+RETRIEVAL_FRONTIER_CAP = int(os.environ.get("RETRIEVAL_FRONTIER_CAP", "64"))
+RETRIEVAL_NODE_BUDGET = int(os.environ.get("RETRIEVAL_NODE_BUDGET", "2000"))
+RETRIEVAL_EDGE_CAP = int(os.environ.get("RETRIEVAL_EDGE_CAP", "256"))
+
+
+def fuse_rankings(rankings, k=RRF_K):
+    """Reciprocal-rank fusion: merges ranked ID lists into one de-duplicated ranking."""
+    scores = defaultdict(float)
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            scores[item] += 1.0 / (k + rank)
+    # sorted() is stable, so ties keep the order of the first topic that returned them.
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+def _retrieve_topic(kg_index, subreddit_uri, topic, query_embedding=None, comment_embeddings=None):
+    """Returns (matching posts, ranked comment IDs) for a single topic."""
+    topic_uri = f"http://reddit.com/topic/{topic}"
+    relevant_posts = kg_index.posts_for(subreddit_uri, topic_uri)
+
+    matched_comments = {}
+    for post_uri in relevant_posts:
+        for comment_uri in kg_index.comments_for(post_uri):
+            matched_comments[comment_uri] = None
+
+    ranked = list(matched_comments)
+    if query_embedding is not None and comment_embeddings is not None:
+        ranked = comment_embeddings.rank(query_embedding, ranked)
+    return relevant_posts, ranked
+
+
+def expand_neighbourhood(adjacency_list, kg_index, seeds, known, token_budget, query_embedding=None,
+                         comment_embeddings=None, hops=None):
+    """Returns (node, text) pairs found within a few hops of the seed posts, best first.
+
+    Nodes in `known` and nodes without a title (users, subreddits) are skipped but still
+    walked through. The walk stops as soon as the collected text fills `token_budget`.
+    """
+    hops = RETRIEVAL_HOPS if hops is None else hops
+    found = {}
+    collected = 0
+    traversal = khop(adjacency_list, seeds, hops=hops, predicates=RETRIEVAL_HOP_PREDICATES,
+                     frontier_cap=RETRIEVAL_FRONTIER_CAP, node_budget=RETRIEVAL_NODE_BUDGET,
+                     edge_cap=RETRIEVAL_EDGE_CAP)
+    for node, _ in traversal:
+        if node in known:
+            continue
+        text = kg_index.title(node) or " ".join(objects_of(adjacency_list, node, str(DCMI.title)))
+        if not text:
+            continue
+        found[node] = text
+        collected += min(estimate_tokens(text), CONTEXT_COMMENT_MAX_TOKENS)
+        if collected >= token_budget:
+            traversal.close()
+            break
+
+    ranked = list(found)
+    if query_embedding is not None and comment_embeddings is not None:
+        ranked = comment_embeddings.rank(query_embedding, ranked)
+    return [(node, found[node]) for node in ranked]
+
+
+# ✅ **Bounded Multi-Hop Retrieval with Subreddit & Topic Filtering**
+def retrieve_relevant_comments(kg_index, subreddit, topics, query_embedding=None, comment_embeddings=None,
+                               budget=None, adjacency_list=None):
+    """Retrieves comments relevant to the given subreddit and one or more topics.
+
+    With a query embedding and the precomputed comment embeddings, each topic's
+    comments are ranked by similarity to the query before fusion. The best ones are
+    packed into `budget` tokens (by default the budget for GROQ_MODEL). If they don't
+    fill it and an adjacency_list is given, text from the posts' wider neighbourhood
+    (replies further down their threads) follows them.
+    """
+    if not kg_index:
         return "❌ KG.json not loaded."
 
     subreddit_uri = f"http://reddit.com/subreddit/{subreddit}"
-    topic_uri = f"http://reddit.com/topic/{topic}"
+    topics = [topics] if isinstance(topics, str) else list(dict.fromkeys(topics))
 
-    matched_comments = set()
+    # **Step 1 & 2: Posts and Their Comments, One Lookup per Topic (in parallel)**
+    def retrieve(topic):
+        return _retrieve_topic(kg_index, subreddit_uri, topic, query_embedding, comment_embeddings)
 
-    # **Step 1: Find Posts Related to Subreddit & Topic**
-    relevant_posts = set()
-    for entity_id, entity in kg_json.items():
-        if "sioc:Container" in entity and entity["sioc:Container"] == subreddit_uri:
-            # Check if topic is mentioned
-            if "sioc:topic" in entity and topic_uri in entity["sioc:topic"]:
-                relevant_posts.add(entity_id)
+    with metrics.timed("chat", "retrieval"):
+        if len(topics) == 1:
+            results = [retrieve(topics[0])]
+        else:
+            results = list(_retrieval_pool.map(retrieve, topics))
 
-    if not relevant_posts:
+    if not any(posts for posts, _ in results):
         return "❌ No posts found for the given subreddit & topic."
 
-    # **Step 2: Retrieve Only Comments from Relevant Posts**
-    for post_uri in relevant_posts:
-        for comment_uri, p, o in adjacency_list.get(post_uri, []):
-            if "sioc:Comment" in str(o):
-                matched_comments.add(comment_uri)
-
-    if not matched_comments:
+    rankings = [comments for _, comments in results if comments]
+    if not rankings:
         return "❌ No relevant comments found."
 
-    # **Step 3: Retrieve Context of Matched Comments**
-    context_results = []
-    for comment in matched_comments:
-        comment_text = kg_json.get(comment, {}).get("dc:title", "")
-        if comment_text:
-            context_results.append(comment_text)
+    # **Step 3: Fuse Per-Topic Rankings**
+    budget = context_budget(GROQ_MODEL) if budget is None else budget
+    candidates = fuse_rankings(rankings)[:MAX_CONTEXT_CANDIDATES]
+    ranked = [(comment, kg_index.title(comment)) for comment in candidates]
+
+    # **Step 4: Widen to the Posts' Neighbourhood if Their Comments Don't Fill the Budget**
+    one_hop_tokens = sum(min(estimate_tokens(text), CONTEXT_COMMENT_MAX_TOKENS) for _, text in ranked)
+    if adjacency_list is not None and RETRIEVAL_HOPS > 0 and one_hop_tokens < budget:
+        seeds = list(dict.fromkeys(post for posts, _ in results for post in posts))
+        with metrics.timed("chat", "traversal"):
+            ranked += expand_neighbourhood(adjacency_list, kg_index, seeds, set(candidates) | set(seeds),
+                                           budget - one_hop_tokens, query_embedding, comment_embeddings)
+
+    # **Step 5: Pack the Best Text into the Token Budget**
+    with metrics.timed("chat", "context_build"):
+        packed = pack_context(ranked, budget, comment_embeddings)
 
-    return {"context": context_results[:10]} if context_results else "❌ Data not found."
+    if not packed["context"]:
+        return "❌ Data not found."
+    return packed
 
 
 # ✅ Groq Chat API
-def chat_with_groq(context, user_query, userID):
+def build_messages(context, user_query, history=()):
+    """Returns the message list sent to Groq for one question, after the user's earlier turns.
+
+    Only the current question carries the retrieved context; earlier turns are trimmed
+    to the history token budget, oldest first.
+    """
+    prompt = f"""Context:
+{format_context(context)}
+
+Question:
+{user_query}
+
+Provide a detailed answer based on the context."""
+
+    return fit_history(list(history)) + [{"role": "user", "content": prompt}]
+
+
+def record_turn(userID, user_query, response):
+    """Queues the question and answer for the user's history (written off the request path)."""
+    conversation_store.append_many(userID, [("user", user_query), ("assistant", response)])
+
+
+def recent_history(userID):
+    """The user's last turns, oldest first, as sent to Groq ahead of the new question."""
+    return conversation_store.recent(userID, CONVERSATION_HISTORY_TURNS)
+
+
+def chat_with_groq(context, user_query, userID, history=None):
     """Interacts with Groq model using retrieved KG context."""
-    global conversation_history
+    if history is None:
+        history = recent_history(userID)
+    conversation = build_messages(context, user_query, history)
 
-    file_path = "conversation_history.csv"
-    csv_file_path = f"{userID}_{file_path}"
-    conversation_history = []
+    with metrics.timed("chat", "llm"):
+        response = client.chat(conversation, model=GROQ_MODEL)
+    record_turn(userID, user_query, response)
 
-    conversation_history.append({"role": "user", "content": user_query})
+    return response
 
-    prompt = f"""
-    Context:
-    {context}
 
-    Question:
-    {user_query}
+# ✅ Streaming Variant (tokens are yielded as Groq produces them)
+def stream_chat_with_groq(context, user_query, userID, history=None):
+    """Yields response text deltas; the conversation is saved once the stream completes."""
+    if history is None:
+        history = recent_history(userID)
+    conversation = build_messages(context, user_query, history)
+
+    parts = []
+    started = time.perf_counter()
+    for delta in client.stream_chat(conversation, model=GROQ_MODEL):
+        if not parts:
+            metrics.observe("chat_stream", "llm_first_token", time.perf_counter() - started)
+        parts.append(delta)
+        yield delta
+    metrics.observe("chat_stream", "llm", time.perf_counter() - started)
+
+    # Only reached when the stream finished (not when the client disconnected mid-way).
+    record_turn(userID, user_query, "".join(parts))
+
+
+# ✅ Retrieve the KG Context for a Question
+def retrieve_context(user_query, subreddit, topics, query_embedding=None):
+    # Take one snapshot for the whole request so a background reload can't change it mid-way.
+    snapshot = kg_snapshot_for(subreddit)
+    if snapshot is not None:
+        # Picks up batches ingested through other workers since the last request.
+        ingestor.sync(snapshot)
+    kg_index = snapshot.index if snapshot else None
+    comment_embeddings = snapshot.comment_embeddings if snapshot else None
+    if comment_embeddings is not None and query_embedding is None:
+        with metrics.timed("chat", "embedding"):
+            query_embedding = encode_texts([user_query])[0]
 
-    Provide a detailed answer based on the context.
+    print("\n🔍 Retrieving Relevant Comments...")
+    adjacency_list = snapshot.adjacency_list if snapshot else None
+    return retrieve_relevant_comments(kg_index, subreddit, topics, query_embedding, comment_embeddings,
+                                      adjacency_list=adjacency_list)
+
+
+def ingest(batch):
+    """Adds new posts, comments and topic links to the live KG without a rebuild.
+
+    The batch is durable once this returns; see kg_ingest.normalize_batch for the format.
+    With shards, cached ones pick the batch up from the log on their next request.
     """
+    snapshot = None if get_shard_store().available() else get_kg_store().snapshot()
+    with metrics.timed("ingest", "apply"):
+        accepted = ingestor.ingest(snapshot, batch)
+    stats = ingestor.stats(snapshot)
+    if stats["overlay"]:
+        metrics.kg_size.labels("ingested_comments").set(stats["overlay"]["comments"])
+    return {"accepted": accepted, **stats}
 
-    chat_completion = client.chat.completions.create(
-        messages=conversation_history,
-        model="llama3-8b-8192"
-    )
 
-    response = chat_completion.choices[0].message.content
-    conversation_history.append({"role": "assistant", "content": response})
+def embed_query(user_query):
+    """Normalized query embedding for ranking and the answer cache, or None if the model is unavailable."""
+    try:
+        with metrics.timed("chat", "embedding"):
+            return encode_texts([user_query])[0]
+    except Exception as e:
+        print(f"❌ Query embedding unavailable: {str(e)}")
+        return None
 
-    with open(csv_file_path, mode='w', newline='', encoding='utf-8') as file:
-        writer = csv.writer(file)
-        writer.writerow(["Role", "Content"])
-        for entry in conversation_history:
-            writer.writerow([entry["role"], entry["content"]])
 
+def cached_answer(context_key, user_query, query_embedding, userID):
+    """Returns a cached answer for this context and question (recording the turn), or None."""
+    response = answer_cache.get(context_key, user_query, query_embedding)
+    metrics.count_cache("answer", "miss" if response is None else "hit")
+    if response is not None:
+        print("\n⚡ Answer cache hit, skipping Groq.")
+        record_turn(userID, user_query, response)
     return response
 
+
 # ✅ Run Main Program
 def chat_with_kg(user_query, userID, subreddit, topics):
-    kg_json_path = "../Backend/KG.json"
-    kg_ttl_path = "./KG.ttl"
-
-    print("\n🔍 Loading Knowledge Graphs...")
-    kg_json = load_kg_json(kg_json_path)
-    kg_ttl, adjacency_list = load_kg_ttl(kg_ttl_path)
-
     if not (1 <= len(topics) <= 4):
         return "❌ Please select between 1 and 4 topics."
 
-    print("\n🔍 Retrieving Relevant Comments...")
-    context = retrieve_relevant_comments(kg_json, adjacency_list, subreddit, topics)
+    query_embedding = embed_query(user_query)
+    context = retrieve_context(user_query, subreddit, topics, query_embedding)
+    history = recent_history(userID)
+    context_key = answer_cache.context_key(context, subreddit, topics, userID, history)
 
-    print("\n🤖 Querying Groq...")
-    response = chat_with_groq(context, user_query, userID)
+    response = cached_answer(context_key, user_query, query_embedding, userID)
+    if response is None:
+        print("\n🤖 Querying Groq...")
+        response = chat_with_groq(context, user_query, userID, history)
+        answer_cache.put(context_key, user_query, query_embedding, response)
 
     print("\n💡 Groq Response:", response)
 
-    return response
\ No newline at end of file
+    return response
+
+
+def stream_chat_with_kg(user_query, userID, subreddit, topics):
+    """Like chat_with_kg, but yields the answer in pieces as it is generated."""
+    if not (1 <= len(topics) <= 4):
+        yield "❌ Please select between 1 and 4 topics."
+        return
+
+    query_embedding = embed_query(user_query)
+    context = retrieve_context(user_query, subreddit, topics, query_embedding)
+    history = recent_history(userID)
+    context_key = answer_cache.context_key(context, subreddit, topics, userID, history)
+
+    response = cached_answer(context_key, user_query, query_embedding, userID)
+    if response is not None:
+        yield response
+        return
+
+    print("\n🤖 Streaming from Groq...")
+    parts = []
+    for delta in stream_chat_with_groq(context, user_query, userID, history):
+        parts.append(delta)
+        yield delta
+    # Only complete answers are cached.
+    answer_cache.put(context_key, user_query, query_embedding, "".join(parts))
\ No newline at end of file
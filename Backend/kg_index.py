@@ -0,0 +1,93 @@
+from collections import defaultdict
+
+SIOC_REPLY_OF = "http://rdfs.org/sioc/ns#reply_of"
+
+
+def entities_by_id(entities):
+    """Maps KG.json entities by @id. A repeated entity (e.g. topics added by ingestion)
+    extends the first one: sioc:topic lists are merged, other fields keep their first value.
+    """
+    by_id = {}
+    for entity in entities:
+        existing = by_id.get(entity["@id"])
+        if existing is None:
+            by_id[entity["@id"]] = entity
+            continue
+        for key, value in entity.items():
+            if key == "sioc:topic":
+                old = existing.get(key) or []
+                old = [old] if isinstance(old, str) else old
+                new = [value] if isinstance(value, str) else value
+                existing[key] = list(dict.fromkeys([*old, *new]))
+            else:
+                existing.setdefault(key, value)
+    return by_id
+
+
+# ✅ Inverted Indexes Used by Comment Retrieval
+class KGIndex:
+    """Lookup tables built once per KG load so retrieval cost follows the result size.
+
+    - posts_by_container_topic: (subreddit_uri, topic_uri) -> [post_uri]
+    - comments_by_post: post_uri -> [comment_uri]
+    - comment_titles: comment_uri -> dc:title
+    """
+
+    def __init__(self):
+        self.posts_by_container_topic = defaultdict(list)
+        self.comments_by_post = defaultdict(list)
+        self.comment_titles = {}
+
+    @classmethod
+    def build(cls, kg_json, adjacency_list):
+        """Builds all indexes from the KG.json entity map and the KG.ttl adjacency list."""
+        index = cls()
+
+        for entity_id, entity in kg_json.items():
+            container = entity.get("sioc:Container")
+            topics = entity.get("sioc:topic")
+            if not isinstance(container, str) or not topics:
+                continue
+            if isinstance(topics, str):
+                topics = [topics]
+            for topic_uri in dict.fromkeys(t for t in topics if isinstance(t, str)):
+                index.posts_by_container_topic[(container, topic_uri)].append(entity_id)
+
+        posts = {post for post_ids in index.posts_by_container_topic.values() for post in post_ids}
+        for post_uri in posts:
+            comments = index.comments_by_post[post_uri]
+            seen = set()
+            for comment_uri, p, o in adjacency_list.get(post_uri, []):
+                # A comment links to its post with sioc:reply_of; older exports marked the link
+                # with a "sioc:Comment" object instead.
+                if "sioc:Comment" in str(o) or (str(p) == SIOC_REPLY_OF and str(o) == post_uri):
+                    comment_uri = str(comment_uri)
+                    if comment_uri not in seen:
+                        seen.add(comment_uri)
+                        comments.append(comment_uri)
+            # Triples come in whatever order the TTL parser yields them; sorting keeps the
+            # candidates (and what survives the caps) the same for KG.snap, shards and KG.ttl.
+            comments.sort()
+
+        for comments in index.comments_by_post.values():
+            for comment_uri in comments:
+                title = kg_json.get(comment_uri, {}).get("dc:title", "")
+                if title:
+                    index.comment_titles[comment_uri] = title
+
+        print(f"✅ Indexed {len(index.posts_by_container_topic)} subreddit/topic pairs, "
+              f"{len(index.comments_by_post)} posts, {len(index.comment_titles)} comments.")
+        return index
+
+    def posts_for(self, subreddit_uri, topic_uri):
+        return self.posts_by_container_topic.get((subreddit_uri, topic_uri), [])
+
+    def comments_for(self, post_uri):
+        return self.comments_by_post.get(post_uri, [])
+
+    def title(self, comment_uri):
+        return self.comment_titles.get(comment_uri, "")
+
+    def iter_titles(self):
+        """Yields (comment_uri, title) for every indexed comment."""
+        return iter(self.comment_titles.items())
@@ -0,0 +1,617 @@
+import contextlib
+import json
+import os
+import re
+import shutil
+import threading
+import time
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: appends still work, but without cross-process locking
+    fcntl = None
+
+SIOC = "http://rdfs.org/sioc/ns#"
+DC = "http://purl.org/dc/elements/1.1/"
+RDF_TYPE = "http://www.w3.org/1999/02/22-rdf-syntax-ns#type"
+MAX_INGEST_ITEMS = 5000
+# Characters that can't appear inside <...> in KG.ttl.
+_INVALID_IRI_CHARS = re.compile(r'[\x00-\x20<>"{}|^`\\]')
+
+
+def _uri(kind, value):
+    """Accepts full URIs or bare names/IDs, like the rest of the API (subreddit="CryptoCurrency").
+
+    Raises ValueError for IDs that would break KG.ttl (whitespace, <>"{}|^` or backslashes).
+    """
+    value = str(value).strip()
+    if _INVALID_IRI_CHARS.search(value):
+        raise ValueError(f"Invalid {kind} ID {value!r}: no whitespace, <>\"{{}}|^` or backslashes")
+    return value if value.startswith(("http://", "https://")) else f"http://reddit.com/{kind}/{value}"
+
+
+def _required(item, field, what):
+    value = item.get(field) if isinstance(item, dict) else None
+    if value is None or (isinstance(value, str) and not value.strip()):
+        raise ValueError(f"Every {what} needs a {field!r}")
+    return value
+
+
+def _topic_list(item, what, allow_empty):
+    topics = item.get("topics", [])
+    if isinstance(topics, str):
+        topics = [topics]
+    if not isinstance(topics, list) or (not topics and not allow_empty):
+        raise ValueError(f"Every {what} needs a non-empty 'topics' list")
+    return [_uri("topic", topic) for topic in dict.fromkeys(topics)]
+
+
+def normalize_batch(batch):
+    """Validates an ingest request and returns it with every ID expanded to a URI.
+
+    {"posts": [{"id", "subreddit", "topics": [...], "title"?}],
+     "comments": [{"id", "post", "text"}],
+     "topic_links": [{"post", "subreddit", "topics": [...]}]}
+    Raises ValueError for malformed or oversized batches.
+    """
+    if not isinstance(batch, dict):
+        raise ValueError("Expected a JSON object with posts, comments and/or topic_links")
+    sections = {name: batch.get(name) or [] for name in ("posts", "comments", "topic_links")}
+    for name, items in sections.items():
+        if not isinstance(items, list):
+            raise ValueError(f"{name} must be a list")
+    total = sum(len(items) for items in sections.values())
+    if total == 0:
+        raise ValueError("Nothing to ingest")
+    if total > MAX_INGEST_ITEMS:
+        raise ValueError(f"At most {MAX_INGEST_ITEMS} items per batch")
+
+    posts = [{
+        "id": _uri("post", _required(item, "id", "post")),
+        "subreddit": _uri("subreddit", _required(item, "subreddit", "post")),
+        "topics": _topic_list(item, "post", allow_empty=True),
+        "title": str(item.get("title") or ""),
+    } for item in sections["posts"]]
+    comments = [{
+        "id": _uri("comment", _required(item, "id", "comment")),
+        "post": _uri("post", _required(item, "post", "comment")),
+        "text": str(_required(item, "text", "comment")),
+    } for item in sections["comments"]]
+    topic_links = [{
+        "post": _uri("post", _required(item, "post", "topic link")),
+        "subreddit": _uri("subreddit", _required(item, "subreddit", "topic link")),
+        "topics": _topic_list(item, "topic link", allow_empty=False),
+    } for item in sections["topic_links"]]
+    return {"posts": posts, "comments": comments, "topic_links": topic_links}
+
+
+# ✅ Durable Delta Log (one JSON batch per line)
+class DeltaLog:
+    """Append-only JSONL file of ingested batches.
+
+    append() returns only after the line is fsynced. A reader keeps a (inode, offset)
+    position and reads just the bytes appended since, so catching up costs as much as
+    the new batches. Compaction replaces the file, which readers notice by its inode.
+    Appends and the end of a compaction are serialized across workers with a lock file;
+    only one worker compacts at a time.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def append(self, batch):
+        line = json.dumps({"ts": time.time(), **batch}, ensure_ascii=False) + "\n"
+        with self._exclusive():
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def position(self):
+        """(inode, size) of the log right now, or None if there is no log yet."""
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return st.st_ino, st.st_size
+
+    def read(self, position=None):
+        """Returns (batches appended after position, new position). Only complete lines are read."""
+        try:
+            with open(self.path, "rb") as f:
+                inode = os.fstat(f.fileno()).st_ino
+                offset = position[1] if position and position[0] == inode else 0
+                f.seek(offset)
+                data = f.read()
+        except FileNotFoundError:
+            return [], position
+        end = data.rfind(b"\n") + 1
+        batches = [json.loads(line) for line in data[:end].splitlines() if line.strip()]
+        return batches, (inode, offset + end)
+
+    def size(self):
+        position = self.position()
+        return position[1] if position else 0
+
+    def compact(self, write, publish_lock=None):
+        """Calls write(batches) with every logged batch, then drops those batches from the log.
+
+        write() runs without the append lock, so ingestion carries on meanwhile. It returns
+        a function (or None) that publishes what it wrote; that and dropping the batches
+        happen inside publish_lock. Batches appended in the meantime stay in the log.
+        Returns the number of batches compacted, or 0 when another worker is compacting.
+        """
+        with self.compaction_lock() as lock:
+            if not lock.acquired:
+                return 0
+            batches, position = self.read()
+            if not batches:
+                return 0
+            publish = write(batches)
+            with publish_lock or contextlib.nullcontext():
+                if publish is not None:
+                    publish()
+                with self._exclusive():
+                    self._drop_until(position)
+            return len(batches)
+
+    def compaction_lock(self):
+        """Non-blocking cross-process lock for rewriting the KG files; check .acquired."""
+        return _FileLock(f"{self.path}.compact.lock", threading.Lock(), blocking=False)
+
+    def _drop_until(self, position):
+        """Replaces the log with the lines after position (call with the lock held)."""
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(self.path, "rb") as f:
+            if os.fstat(f.fileno()).st_ino == position[0]:
+                f.seek(position[1])
+            rest = f.read()
+        with open(tmp, "wb") as f:
+            f.write(rest)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+    def _exclusive(self):
+        return _FileLock(f"{self.path}.lock", self._lock)
+
+
+class _FileLock:
+    def __init__(self, path, thread_lock, shared=False, blocking=True):
+        self.path = path
+        self.thread_lock = thread_lock
+        self.shared = shared
+        self.blocking = blocking
+        self.acquired = False
+        self.f = None
+
+    def __enter__(self):
+        if not self.thread_lock.acquire(blocking=self.blocking):
+            return self
+        if fcntl is not None:
+            self.f = open(self.path, "a")
+            flags = (fcntl.LOCK_SH if self.shared else fcntl.LOCK_EX) | (0 if self.blocking else fcntl.LOCK_NB)
+            try:
+                fcntl.flock(self.f, flags)
+            except BlockingIOError:
+                self.f.close()
+                self.f = None
+                self.thread_lock.release()
+                return self
+        self.acquired = True
+        return self
+
+    def __exit__(self, *exc):
+        if not self.acquired:
+            return
+        if self.f is not None:
+            fcntl.flock(self.f, fcntl.LOCK_UN)
+            self.f.close()
+            self.f = None
+        self.acquired = False
+        self.thread_lock.release()
+
+
+# ✅ In-Memory Overlay Segment (same lookups as KGIndex, for ingested data only)
+class KGOverlay:
+    """Posts, comments and topic links ingested since the base snapshot was built.
+
+    Only ever grows; readers go through OverlayIndex / OverlayAdjacency, which merge
+    it with the base. Cost of apply() is proportional to the batch.
+
+    A shard's overlay is scoped to its subreddit: only that subreddit's posts and topic
+    links are kept, with the comments on its posts. owns_post(uri) tells whether a post
+    of the base shard is one of them.
+    """
+
+    # Rough per-triple and per-vector cost of the tuples, lists and dict entries holding them.
+    TRIPLE_OVERHEAD = 250
+    VECTOR_OVERHEAD = 200
+
+    def __init__(self, subreddit=None, owns_post=None):
+        self.subreddit = subreddit
+        self.owns_post = owns_post
+        # Posts and comments are kept in insertion-ordered dicts used as sets, so a
+        # duplicate check costs the same however large the overlay gets.
+        self.posts_by_container_topic = {}
+        self.comments_by_post = {}
+        self.comment_titles = {}
+        self.post_ids = {}
+        self.triples_by_term = {}
+        self.triples = 0
+        self.vectors = {}                 # comment URI -> normalized embedding
+        self.nbytes = 0                   # estimated memory held by triples and vectors
+        self.position = None              # delta log position applied so far
+        self.batches = 0
+        self.lock = threading.Lock()
+
+    def apply(self, batch, encode=None):
+        if self.subreddit is not None:
+            batch = self._in_scope(batch)
+        for post in batch.get("posts", ()):
+            self._link(post["id"], post["subreddit"], post["topics"])
+            # A batch can be read twice when a compaction keeps it in the rewritten log.
+            if post["id"] in self.post_ids:
+                continue
+            self.post_ids[post["id"]] = None
+            self._triple(post["id"], RDF_TYPE, SIOC + "Post")
+            self._triple(post["id"], SIOC + "has_container", post["subreddit"])
+            if post.get("title"):
+                self._triple(post["id"], DC + "title", post["title"])
+        for link in batch.get("topic_links", ()):
+            self._link(link["post"], link["subreddit"], link["topics"])
+
+        new_comments = []
+        for comment in batch.get("comments", ()):
+            if comment["id"] in self.comment_titles:
+                continue
+            self.comments_by_post.setdefault(comment["post"], {})[comment["id"]] = None
+            self.comment_titles[comment["id"]] = comment["text"]
+            self._triple(comment["id"], RDF_TYPE, SIOC + "Comment")
+            self._triple(comment["id"], SIOC + "reply_of", comment["post"])
+            self._triple(comment["id"], DC + "title", comment["text"])
+            new_comments.append(comment)
+
+        if encode is not None and new_comments:
+            try:
+                vectors = encode([comment["text"] for comment in new_comments])
+                for comment, vector in zip(new_comments, vectors):
+                    vector = np.asarray(vector, dtype=np.float32)
+                    self.vectors[comment["id"]] = vector
+                    self.nbytes += vector.nbytes + self.VECTOR_OVERHEAD
+            except Exception as e:
+                print(f"❌ Could not embed ingested comments, they will be ranked last: {str(e)}")
+        self.batches += 1
+
+    def _in_scope(self, batch):
+        posts = [post for post in batch.get("posts", ()) if post["subreddit"] == self.subreddit]
+        links = [link for link in batch.get("topic_links", ()) if link["subreddit"] == self.subreddit]
+        owned = {post["id"] for post in posts} | {link["post"] for link in links}
+        comments = [comment for comment in batch.get("comments", ())
+                    if comment["post"] in owned or comment["post"] in self.post_ids
+                    or comment["post"] in self.comments_by_post
+                    or (self.owns_post is not None and self.owns_post(comment["post"]))]
+        return {"posts": posts, "topic_links": links, "comments": comments}
+
+    def _link(self, post, subreddit, topics):
+        for topic in topics:
+            posts = self.posts_by_container_topic.setdefault((subreddit, topic), {})
+            if post not in posts:
+                posts[post] = None
+                self._triple(post, SIOC + "topic", topic)
+
+    def _triple(self, s, p, o):
+        triple = (s, p, o)
+        self.triples_by_term.setdefault(s, []).append(triple)
+        self.triples_by_term.setdefault(o, []).append(triple)
+        self.triples += 1
+        self.nbytes += len(s) + len(p) + len(o) + self.TRIPLE_OVERHEAD
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "posts": len(self.post_ids),
+            "comments": len(self.comment_titles),
+            "embedded_comments": len(self.vectors),
+            "bytes": self.nbytes,
+        }
+
+
+# ✅ Base + Overlay Views (drop-in for KGIndex / MappedKG, CSRAdjacency, CommentEmbeddings)
+class OverlayIndex:
+    def __init__(self, base, overlay):
+        self.base = base
+        self.overlay = overlay
+
+    def posts_for(self, subreddit_uri, topic_uri):
+        base = self.base.posts_for(subreddit_uri, topic_uri)
+        extra = self.overlay.posts_by_container_topic.get((subreddit_uri, topic_uri))
+        return list(dict.fromkeys([*base, *extra])) if extra else base
+
+    def comments_for(self, post_uri):
+        base = self.base.comments_for(post_uri)
+        extra = self.overlay.comments_by_post.get(post_uri)
+        return list(dict.fromkeys([*base, *extra])) if extra else base
+
+    def title(self, comment_uri):
+        return self.base.title(comment_uri) or self.overlay.comment_titles.get(comment_uri, "")
+
+    def iter_titles(self):
+        yield from self.base.iter_titles()
+        for comment, title in list(self.overlay.comment_titles.items()):
+            if not self.base.title(comment):
+                yield comment, title
+
+
+class OverlayAdjacency:
+    def __init__(self, base, overlay):
+        self.base = base
+        self.overlay = overlay
+
+    def __len__(self):
+        return len(self.base) + self.overlay.triples
+
+    def __contains__(self, term):
+        return term in self.overlay.triples_by_term or self.base.get(term) is not None
+
+    def get(self, term, default=None):
+        triples = (self.base.get(term) or []) + self.overlay.triples_by_term.get(term, [])
+        return triples or default
+
+    def __getattr__(self, name):
+        # CSR-specific calls (lookup, out_edges, nbytes, ...) go to the base.
+        return getattr(self.base, name)
+
+
+class OverlayEmbeddings:
+    def __init__(self, base, overlay):
+        self.base = base
+        self.overlay = overlay
+
+    def __len__(self):
+        return len(self.base) + len(self.overlay.vectors)
+
+    def vector(self, comment):
+        vector = self.base.vector(comment)
+        return vector if vector is not None else self.overlay.vectors.get(comment)
+
+    def rank(self, query_embedding, candidates):
+        if not self.overlay.vectors:
+            return self.base.rank(query_embedding, candidates)
+        vectors = [self.vector(c) for c in candidates]
+        scored = [c for c, v in zip(candidates, vectors) if v is not None]
+        if not scored:
+            return list(candidates)
+        unscored = [c for c, v in zip(candidates, vectors) if v is None]
+        scores = np.stack([v for v in vectors if v is not None]) @ np.asarray(query_embedding, dtype=np.float32)
+        order = np.argsort(-scores, kind="stable")
+        return [scored[i] for i in order] + unscored
+
+
+# ✅ KG Files (compaction merges the log into copies of KG.json and KG.ttl)
+def _ttl_term(term, literal=False):
+    if literal:
+        return '"' + term.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n").replace("\r", "\\r") + '"'
+    return f"<{term}>"
+
+
+def batches_to_kg(batches):
+    """Returns (KG.json entities, KG.ttl lines) for logged batches."""
+    entities, lines = [], []
+    for batch in batches:
+        for post in batch.get("posts", ()):
+            entity = {"@id": post["id"], "@type": "sioc:Post", "sioc:Container": post["subreddit"],
+                      "sioc:topic": post["topics"]}
+            if post.get("title"):
+                entity["dc:title"] = post["title"]
+            entities.append(entity)
+            lines.append(f"<{post['id']}> a <{SIOC}Post> ; <{SIOC}has_container> <{post['subreddit']}> .\n")
+            lines.extend(f"<{post['id']}> <{SIOC}topic> <{topic}> .\n" for topic in post["topics"])
+            if post.get("title"):
+                lines.append(f"<{post['id']}> <{DC}title> {_ttl_term(post['title'], literal=True)} .\n")
+        for link in batch.get("topic_links", ()):
+            # load_kg_json merges repeated entities, so this only adds the topics.
+            entities.append({"@id": link["post"], "sioc:Container": link["subreddit"], "sioc:topic": link["topics"]})
+            lines.extend(f"<{link['post']}> <{SIOC}topic> <{topic}> .\n" for topic in link["topics"])
+        for comment in batch.get("comments", ()):
+            entities.append({"@id": comment["id"], "@type": "sioc:Comment", "dc:title": comment["text"],
+                             "sioc:reply_of": comment["post"]})
+            lines.append(f"<{comment['id']}> a <{SIOC}Comment> ; <{SIOC}reply_of> <{comment['post']}> ; "
+                         f"<{DC}title> {_ttl_term(comment['text'], literal=True)} .\n")
+    return entities, lines
+
+
+def append_kg_json(path, entities):
+    """Appends entities to the JSON array in path by rewriting only its closing bracket."""
+    with open(path, "r+b") as f:
+        f.seek(0, os.SEEK_END)
+        end = f.tell()
+        f.seek(max(0, end - 4096))
+        tail = f.read()
+        close = tail.rfind(b"]")
+        if close < 0:
+            raise ValueError(f"{path} does not end with a JSON array")
+        before = tail[:close].rstrip()
+        empty = before.endswith(b"[")
+        f.seek(end - len(tail) + close)
+        body = ",\n".join(json.dumps(entity, ensure_ascii=False) for entity in entities)
+        f.write((("\n" if empty else ",\n") + body + "\n]\n").encode("utf-8"))
+        f.truncate()
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def append_kg_ttl(path, lines):
+    with open(path, "a", encoding="utf-8") as f:
+        f.write("".join(lines))
+        f.flush()
+        os.fsync(f.fileno())
+
+
+# ✅ Ingestion Entry Point
+class KGIngestor:
+    """Applies ingested batches to the live snapshot through an overlay, durably.
+
+    ingest() appends the batch to the delta log and then catches the snapshot's
+    overlay up with the log; other workers catch up on their next retrieval (sync()).
+    A rebuilt snapshot replays the log into a fresh overlay. Once the log grows past
+    compact_bytes it is merged into KG.json / KG.ttl in the background and emptied;
+    the KG store's file watcher then reloads the base with the merged data.
+    """
+
+    def __init__(self, log_path, json_path, ttl_path, compact_bytes=64 * 1024 * 1024, encode=None,
+                 recompile=None):
+        self.log = DeltaLog(log_path)
+        self.json_path = json_path
+        self.ttl_path = ttl_path
+        self.compact_bytes = compact_bytes
+        self.encode = encode
+        self.recompile = recompile
+        self._files_lock_path = f"{log_path}.files.lock"
+        self._compacting = threading.Lock()
+        self.compactions = 0
+
+    def files_lock(self):
+        """Shared lock to hold while checking and opening the KG files and what is compiled from them.
+
+        Compaction swaps them all while holding it exclusively, so a loader never sees
+        merged sources next to outdated compiled files.
+        """
+        return _FileLock(self._files_lock_path, threading.Lock(), shared=True)
+
+    def attach(self, snapshot, subreddit=None):
+        """Layers a fresh overlay over a newly built snapshot and replays the delta log into it.
+
+        For a shard, pass its subreddit so only that subreddit's ingested data is replayed.
+        """
+        owns_post = None
+        if subreddit is not None:
+            base_index, base_adjacency = snapshot.index, snapshot.adjacency_list
+
+            def owns_post(post):
+                return bool(base_index.comments_for(post)) or any(
+                    p == SIOC + "has_container" and o == subreddit for _, p, o in base_adjacency.get(post) or ())
+
+        overlay = KGOverlay(subreddit, owns_post)
+        snapshot.overlay = overlay
+        snapshot.index = OverlayIndex(snapshot.index, overlay)
+        snapshot.adjacency_list = OverlayAdjacency(snapshot.adjacency_list, overlay)
+        if snapshot.comment_embeddings is not None:
+            snapshot.comment_embeddings = OverlayEmbeddings(snapshot.comment_embeddings, overlay)
+        self.sync(snapshot)
+        return snapshot
+
+    def sync(self, snapshot):
+        """Applies log batches the snapshot hasn't seen yet (one stat() when there are none)."""
+        overlay = getattr(snapshot, "overlay", None)
+        if overlay is None or self.log.position() == overlay.position:
+            return 0
+        with overlay.lock:
+            batches, position = self.log.read(overlay.position)
+            encode = self.encode if snapshot.comment_embeddings is not None else None
+            for batch in batches:
+                overlay.apply(batch, encode)
+            overlay.position = position
+        return len(batches)
+
+    def ingest(self, snapshot, batch):
+        """Validates, logs and applies one batch. Returns the counts that were accepted."""
+        batch = normalize_batch(batch)
+        self.log.append(batch)
+        if snapshot is not None:
+            self.sync(snapshot)
+        if self.compact_bytes and self.log.size() >= self.compact_bytes:
+            self.compact_in_background()
+        return {name: len(items) for name, items in batch.items()}
+
+    def compact(self):
+        """Merges every logged batch into KG.json and KG.ttl, then drops them from the log.
+
+        The merged files are written as copies next to the originals, and
+        recompile(json_copy, ttl_copy) builds what is compiled from them (snapshot,
+        shards, comment embeddings) the same way, returning a function that swaps those
+        in. Everything is swapped at once under files_lock(), so workers keep mapping
+        compiled files instead of falling back to parsing the sources.
+        """
+        if not (os.path.exists(self.json_path) and os.path.exists(self.ttl_path)):
+            print("❌ KG.json / KG.ttl missing, keeping ingested data in the delta log.")
+            return 0
+
+        def write(batches):
+            suffix = f"{os.getpid()}.compact"
+            json_copy, ttl_copy = f"{self.json_path}.{suffix}", f"{self.ttl_path}.{suffix}"
+            try:
+                shutil.copyfile(self.json_path, json_copy)
+                shutil.copyfile(self.ttl_path, ttl_copy)
+                entities, lines = batches_to_kg(batches)
+                append_kg_json(json_copy, entities)
+                append_kg_ttl(ttl_copy, lines)
+                swap_compiled = self.recompile(json_copy, ttl_copy) if self.recompile else None
+            except BaseException:
+                for path in (json_copy, ttl_copy):
+                    if os.path.exists(path):
+                        os.remove(path)
+                raise
+
+            def publish():
+                if swap_compiled is not None:
+                    swap_compiled()
+                # Renaming keeps mtime and size, so the compiled files' fingerprints match.
+                os.replace(json_copy, self.json_path)
+                os.replace(ttl_copy, self.ttl_path)
+            return publish
+
+        started = time.time()
+        count = self.log.compact(write, _FileLock(self._files_lock_path, threading.Lock()))
+        if count:
+            self.compactions += 1
+            print(f"✅ Merged {count} ingested batches into the KG files in {time.time() - started:.2f}s.")
+        return count
+
+    def compact_in_background(self):
+        if not self._compacting.acquire(blocking=False):
+            return
+
+        def run():
+            try:
+                self.compact()
+            except Exception as e:
+                print(f"❌ Delta log compaction failed, will retry on the next ingest: {str(e)}")
+            finally:
+                self._compacting.release()
+
+        threading.Thread(target=run, name="kg-delta-compaction", daemon=True).start()
+
+    def recompile_in_background(self, needed):
+        """Rebuilds what is compiled from KG.json / KG.ttl after they changed outside compaction.
+
+        Runs under the compaction lock, so one worker does it, never during a compaction,
+        and only if needed() still says so once the lock is held.
+        """
+        if self.recompile is None or not self._compacting.acquire(blocking=False):
+            return
+
+        def run():
+            try:
+                with self.log.compaction_lock() as lock:
+                    if lock.acquired and needed():
+                        swap_compiled = self.recompile(self.json_path, self.ttl_path)
+                        with _FileLock(self._files_lock_path, threading.Lock()):
+                            swap_compiled()
+            except Exception as e:
+                print(f"❌ Recompiling the KG failed, serving the outdated files: {str(e)}")
+            finally:
+                self._compacting.release()
+
+        threading.Thread(target=run, name="kg-recompile", daemon=True).start()
+
+    def stats(self, snapshot=None):
+        overlay = getattr(snapshot, "overlay", None)
+        return {
+            "log_bytes": self.log.size(),
+            "compactions": self.compactions,
+            "overlay": overlay.stats() if overlay is not None else None,
+        }
@@ -0,0 +1,315 @@
+"""Per-subreddit KG shards, loaded on demand and kept in a memory-bounded LRU cache.
+
+Compile offline with `python kg_shards.py --json KG.json --ttl KG.ttl --out KG.shards`.
+
+Every chat request is scoped to one subreddit, so each subreddit's posts, their comments
+(and replies to them) and every triple touching those nodes go into their own snapshot file
+(kg_snapshot.py format). manifest.json maps subreddit URIs to shard files and records the
+sources they were compiled from. Triples that touch no subreddit's nodes (e.g. user
+profiles) are left out of the shards, so multi-hop retrieval stays inside the subreddit:
+walking sioc:has_creator or sioc:links_to reaches other subreddits' content only when the
+whole KG is served, which is why kg_chat doesn't follow them by default.
+"""
+import argparse
+import contextlib
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict, defaultdict, deque
+
+from kg_index import KGIndex, SIOC_REPLY_OF
+from kg_snapshot import parse_sources, source_fingerprint, write_snapshot
+from kg_store import file_signature
+import metrics
+
+MANIFEST = "manifest.json"
+MANIFEST_VERSION = 1
+SIOC_HAS_CONTAINER = "http://rdfs.org/sioc/ns#has_container"
+
+
+def shard_file(subreddit_uri):
+    """File name for a subreddit's shard: readable, and unique even when names collide after cleaning."""
+    name = re.sub(r"[^\w.-]", "_", subreddit_uri.rstrip("/").rsplit("/", 1)[-1])[:64]
+    digest = hashlib.sha1(subreddit_uri.encode("utf-8")).hexdigest()[:8]
+    return f"{name}-{digest}.snap"
+
+
+# ✅ Split the KG by Subreddit
+def partition(kg_json, triples):
+    """Returns {subreddit URI: (entities, triples)}.
+
+    Posts belong to their sioc:Container, comments and replies to the post they hang off.
+    A triple goes to the shard of every owned node it touches, so a link between two
+    subreddits' threads is kept on both sides.
+    """
+    adjacency_list = defaultdict(list)
+    for triple in triples:
+        adjacency_list[triple[0]].append(triple)
+        adjacency_list[triple[2]].append(triple)
+    index = KGIndex.build(kg_json, adjacency_list)
+    del adjacency_list
+
+    owner = {}
+    for entity_id, entity in kg_json.items():
+        container = entity.get("sioc:Container")
+        if isinstance(container, str):
+            owner[entity_id] = container
+    replies = defaultdict(list)
+    for s, p, o in triples:
+        if p == SIOC_HAS_CONTAINER:
+            owner.setdefault(s, o)
+        elif p == SIOC_REPLY_OF:
+            replies[o].append(s)
+    for (container, _), posts in index.posts_by_container_topic.items():
+        for post in posts:
+            owner.setdefault(post, container)
+    for post, comments in index.comments_by_post.items():
+        replies[post].extend(comments)
+    for subreddit in set(owner.values()):
+        owner[subreddit] = subreddit
+
+    # Replies inherit their parent's subreddit, however deep the thread goes.
+    queue = deque(owner)
+    while queue:
+        parent = queue.popleft()
+        for child in replies.get(parent, ()):
+            if child not in owner:
+                owner[child] = owner[parent]
+                queue.append(child)
+
+    shards = defaultdict(lambda: ({}, []))
+    for entity_id, entity in kg_json.items():
+        if entity_id in owner:
+            shards[owner[entity_id]][0][entity_id] = entity
+    for triple in triples:
+        s_owner, o_owner = owner.get(triple[0]), owner.get(triple[2])
+        for subreddit in {s_owner, o_owner} - {None}:
+            shards[subreddit][1].append(triple)
+    return dict(shards)
+
+
+# ✅ Compile KG.json + KG.ttl into Shard Files
+def compile_shards(json_path, ttl_path, out_dir):
+    """Parses the KG sources once and writes one snapshot per subreddit plus the manifest."""
+    started = time.time()
+    # Fingerprinted before parsing, so an edit made meanwhile leaves the shards stale rather than hidden.
+    source = source_fingerprint((json_path, ttl_path))
+    kg_json, triples = parse_sources(json_path, ttl_path)
+    manifest = write_shards(kg_json, triples, out_dir, source)
+    total = sum(info["bytes"] for info in manifest["shards"].values())
+    print(f"✅ Compiled {len(manifest['shards'])} KG shards ({total / 1e6:.1f} MB) in {time.time() - started:.2f}s -> {out_dir}")
+    return manifest
+
+
+def write_shards(kg_json, triples, out_dir, source):
+    """Partitions already parsed KG data into out_dir and writes the manifest. Returns the manifest."""
+    os.makedirs(out_dir, exist_ok=True)
+    shards = {}
+    for subreddit, (entities, shard_triples) in partition(kg_json, triples).items():
+        name = shard_file(subreddit)
+        path = os.path.join(out_dir, name)
+        counts = write_snapshot(entities, shard_triples, path, source)
+        shards[subreddit] = {"file": name, "bytes": os.path.getsize(path), **counts}
+
+    manifest = {"version": MANIFEST_VERSION, "source": source, "shards": shards}
+    tmp_path = os.path.join(out_dir, f"{MANIFEST}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, os.path.join(out_dir, MANIFEST))
+
+    remove_stale_shards(out_dir, manifest)
+    return manifest
+
+
+def remove_stale_shards(shard_dir, manifest):
+    """Deletes shards of subreddits that disappeared, with their comment embeddings.
+
+    Workers that still have one mapped keep reading it until they let go.
+    """
+    keep = tuple(info["file"] for info in manifest["shards"].values())
+    for name in os.listdir(shard_dir):
+        if (name.endswith(".snap") or ".snap." in name) and not name.startswith(keep):
+            os.remove(os.path.join(shard_dir, name))
+
+
+def read_manifest(shard_dir, json_path, ttl_path):
+    """The shard manifest, or None when there is no readable one of this version.
+
+    manifest["stale"] is True when it was compiled from older sources. Missing sources
+    count as fresh, like kg_snapshot.is_fresh.
+    """
+    try:
+        with open(os.path.join(shard_dir, MANIFEST), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get("version") != MANIFEST_VERSION:
+        return None
+    current = source_fingerprint((json_path, ttl_path))
+    manifest["stale"] = not all(now is None or now == then
+                                for now, then in zip(current, manifest.get("source") or []))
+    return manifest
+
+
+# ✅ On-Demand Shard Cache (least recently used shards are dropped over the memory cap)
+class KGShardStore:
+    """Loads subreddit shards on first use and keeps the hot ones within max_bytes.
+
+    `build` is called as build(path, subreddit_uri) (path is None for a subreddit without a
+    shard) and must return (KGSnapshot, bytes it keeps in memory). extra_bytes(snapshot),
+    if given, is added for memory a cached snapshot gains later (ingested data). An
+    evicted snapshot stays valid for the requests still using it; its memory is released
+    when the last one finishes.
+    The manifest and sources are re-checked every poll_interval seconds, and a change
+    drops every cached shard. `files_lock` (optional) returns a context manager held
+    while the manifest is read, so it is never read halfway through a recompile.
+
+    Shards compiled from older sources keep being served (see stale()) rather than
+    switching to the whole KG; on_stale() is called once when that is found, e.g. to
+    recompile them in the background. An unreadable manifest keeps the last good one.
+    """
+
+    def __init__(self, shard_dir, source_paths, build, max_bytes, poll_interval=5.0, files_lock=None,
+                 on_stale=None, extra_bytes=None):
+        self.shard_dir = shard_dir
+        self.source_paths = tuple(source_paths)
+        self.build = build
+        self.max_bytes = max_bytes
+        self.poll_interval = poll_interval
+        self.files_lock = files_lock
+        self.on_stale = on_stale
+        self.extra_bytes = extra_bytes
+        self.manifest = None
+        self._signature = None
+        self._checked_at = None
+        self._cache = OrderedDict()   # subreddit URI -> (snapshot, bytes)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._loading = {}            # subreddit URI -> lock, so each shard is built once
+        self.loads = 0
+        self.evictions = 0
+
+    def available(self):
+        """True when shards are compiled, even from older sources."""
+        self._refresh()
+        return self.manifest is not None
+
+    def stale(self):
+        """True when the shards being served were compiled from older sources."""
+        manifest = self.manifest
+        return manifest is not None and manifest["stale"]
+
+    def _refresh(self):
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < self.poll_interval:
+            return
+        self._checked_at = now
+        signature = file_signature((os.path.join(self.shard_dir, MANIFEST), *self.source_paths))
+        if signature == self._signature:
+            return
+        manifest_path = os.path.join(self.shard_dir, MANIFEST)
+        with self.files_lock() if self.files_lock else contextlib.nullcontext():
+            manifest = read_manifest(self.shard_dir, *self.source_paths)
+            removed = manifest is None and not os.path.exists(manifest_path)
+        if manifest is None and not removed and self.manifest is not None:
+            print(f"❌ Can't read {manifest_path}; keeping the KG shards loaded before.")
+            self._signature = signature
+            return
+        with self._lock:
+            self._signature = signature
+            self.manifest = manifest
+            self._cache.clear()
+            self._bytes = 0
+        if manifest is None:
+            return
+        print(f"✅ Found {len(manifest['shards'])} KG shards in {self.shard_dir}.")
+        if manifest["stale"]:
+            print("❌ KG shards are older than KG.json / KG.ttl; serving them until they are recompiled.")
+            if self.on_stale is not None:
+                self.on_stale()
+
+    def snapshot(self, subreddit_uri):
+        """The subreddit's KGSnapshot, loading it if needed, or None without usable shards."""
+        self._refresh()
+        manifest = self.manifest
+        if manifest is None:
+            return None
+
+        with self._lock:
+            entry = self._cache.get(subreddit_uri)
+            if entry is not None:
+                self._cache.move_to_end(subreddit_uri)
+                if self.extra_bytes is not None:
+                    self._evict()  # cached shards grow as ingested data is applied
+                metrics.count_cache("kg_shard", "hit")
+                return entry[0]
+            load_lock = self._loading.setdefault(subreddit_uri, threading.Lock())
+
+        with load_lock:
+            with self._lock:
+                entry = self._cache.get(subreddit_uri)
+            if entry is not None:
+                metrics.count_cache("kg_shard", "hit")
+                return entry[0]
+
+            metrics.count_cache("kg_shard", "miss")
+            info = manifest["shards"].get(subreddit_uri)
+            path = os.path.join(self.shard_dir, info["file"]) if info else None
+            try:
+                snapshot, nbytes = self.build(path, subreddit_uri)
+                if snapshot is None:
+                    return None
+                with self._lock:
+                    # A manifest change while this shard was loading means it may already be outdated.
+                    if self.manifest is manifest:
+                        self._cache[subreddit_uri] = (snapshot, nbytes)
+                        self._bytes += nbytes
+                        self.loads += 1
+                        self._evict()
+                    metrics.kg_size.labels("cached_shards").set(len(self._cache))
+                    metrics.kg_size.labels("shard_cache_bytes").set(self._total_bytes())
+                return snapshot
+            finally:
+                with self._lock:
+                    self._loading.pop(subreddit_uri, None)
+
+    def _total_bytes(self):
+        if self.extra_bytes is None:
+            return self._bytes
+        return self._bytes + sum(self.extra_bytes(snapshot) for snapshot, _ in self._cache.values())
+
+    def _evict(self):
+        # The shard used last is never evicted, even if it alone is over the cap.
+        total = self._total_bytes()
+        while total > self.max_bytes and len(self._cache) > 1:
+            subreddit_uri, (snapshot, nbytes) = self._cache.popitem(last=False)
+            self._bytes -= nbytes
+            freed = nbytes + (self.extra_bytes(snapshot) if self.extra_bytes is not None else 0)
+            total -= freed
+            self.evictions += 1
+            print(f"🔄 Evicted KG shard {subreddit_uri} ({freed / 1e6:.1f} MB).")
+
+    def stats(self):
+        with self._lock:
+            return {
+                "shards": len(self.manifest["shards"]) if self.manifest else 0,
+                "stale": bool(self.manifest and self.manifest["stale"]),
+                "cached": list(self._cache),
+                "cached_bytes": self._total_bytes(),
+                "max_bytes": self.max_bytes,
+                "loads": self.loads,
+                "evictions": self.evictions,
+            }
+
+
+if __name__ == "__main__":
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description="Split KG.json + KG.ttl into per-subreddit snapshot shards.")
+    parser.add_argument("--json", default=os.path.join(base_dir, "KG.json"))
+    parser.add_argument("--ttl", default=os.path.join(base_dir, "KG.ttl"))
+    parser.add_argument("--out", default=os.path.join(base_dir, "KG.shards"))
+    args = parser.parse_args()
+    compile_shards(args.json, args.ttl, args.out)
@@ -0,0 +1,271 @@
+"""Precompiled, memory-mapped KG snapshots.
+
+Compile offline with `python kg_snapshot.py --json KG.json --ttl KG.ttl --out KG.snap`.
+
+Layout: b"KGSNAP01" | uint64 header length | JSON header | 8-byte aligned numpy sections
+(the kg_adjacency string table and CSR arrays, then the kg_index tables).
+The header records each section's offset/dtype/shape and the mtime/size of the sources.
+"""
+import argparse
+import json
+import mmap
+import os
+import struct
+import time
+from collections import defaultdict
+
+import numpy as np
+
+from kg_adjacency import CSRAdjacency, StringTable
+from kg_index import KGIndex, entities_by_id
+
+MAGIC = b"KGSNAP01"
+VERSION = 3  # 3: comments linked with sioc:reply_of are indexed
+
+
+# ✅ Source Fingerprint (used to detect stale snapshots)
+def source_fingerprint(paths):
+    """Returns [[mtime_ns, size], ...] for the given files, or None for missing ones."""
+    fingerprint = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            fingerprint.append([st.st_mtime_ns, st.st_size])
+        except OSError:
+            fingerprint.append(None)
+    return fingerprint
+
+
+# ✅ Compile KG.json + KG.ttl into a Snapshot File
+def compile_snapshot(json_path, ttl_path, out_path):
+    """Parses the KG sources once and writes a binary snapshot to out_path."""
+    started = time.time()
+    kg_json, triples = parse_sources(json_path, ttl_path)
+    counts = write_snapshot(kg_json, triples, out_path, source_fingerprint((json_path, ttl_path)))
+    print(f"✅ Compiled KG snapshot with {counts['triples']} triples in {time.time() - started:.2f}s -> {out_path}")
+    return out_path
+
+
+def parse_sources(json_path, ttl_path):
+    """Returns (KG.json entities by ID, KG.ttl triples as string tuples)."""
+    from rdflib import Graph
+
+    with open(json_path, "r", encoding="utf-8") as f:
+        kg_json = entities_by_id(json.load(f))
+    g = Graph()
+    g.parse(ttl_path, format="turtle")
+    triples = [(str(s), str(p), str(o)) for s, p, o in g]
+    return kg_json, triples
+
+
+def write_snapshot(kg_json, triples, out_path, source):
+    """Indexes already parsed KG data and writes it to out_path. Returns the counts.
+
+    `source` is the fingerprint of the files the data came from (see is_fresh).
+    """
+    adjacency_list = defaultdict(list)
+    for triple in triples:
+        adjacency_list[triple[0]].append(triple)
+        adjacency_list[triple[2]].append(triple)
+    index = KGIndex.build(kg_json, adjacency_list)
+    del adjacency_list, kg_json
+
+    # Index terms join the triple terms in one string table, sorted by UTF-8 bytes.
+    index_terms = set()
+    for (container, topic), posts in index.posts_by_container_topic.items():
+        index_terms.update((container, topic))
+        index_terms.update(posts)
+    for post, comments in index.comments_by_post.items():
+        index_terms.add(post)
+        index_terms.update(comments)
+    for comment, title in index.comment_titles.items():
+        index_terms.update((comment, title))
+
+    adjacency = CSRAdjacency.from_triples(triples, extra_terms=index_terms)
+    del triples, index_terms
+    strings = adjacency.strings
+    ids = {strings[i]: i for i in range(len(strings))}
+
+    pair_keys, pair_values = _csr(
+        ((ids[c] << 32) | ids[t], [ids[post] for post in posts])
+        for (c, t), posts in index.posts_by_container_topic.items()
+    )
+    post_keys, post_values = _csr(
+        (ids[post], [ids[comment] for comment in comments])
+        for post, comments in index.comments_by_post.items()
+    )
+    title_items = sorted((ids[c], ids[t]) for c, t in index.comment_titles.items())
+    title_keys = np.array([c for c, _ in title_items], dtype=np.int32)
+    title_values = np.array([t for _, t in title_items], dtype=np.int32)
+
+    sections = {
+        "string_offsets": strings.offsets,
+        "string_blob": strings.blob,
+        "out_offsets": adjacency.out_offsets,
+        "out_neighbors": adjacency.out_neighbors,
+        "out_predicates": adjacency.out_predicates,
+        "in_offsets": adjacency.in_offsets,
+        "in_neighbors": adjacency.in_neighbors,
+        "in_predicates": adjacency.in_predicates,
+        "pair_keys": pair_keys[0].astype(np.int64),
+        "pair_offsets": pair_keys[1],
+        "pair_posts": pair_values,
+        "post_keys": post_keys[0].astype(np.int32),
+        "post_offsets": post_keys[1],
+        "post_comments": post_values,
+        "title_keys": title_keys,
+        "title_values": title_values,
+    }
+    counts = {"strings": len(strings), "triples": len(adjacency), "comments": len(title_items)}
+    _write_sections(out_path, sections, {"version": VERSION, "source": source, "counts": counts})
+    return counts
+
+
+def _csr(groups):
+    """Turns (key, [values]) pairs into sorted keys, offsets and a flat value array."""
+    groups = sorted(groups, key=lambda item: item[0])
+    keys = np.array([key for key, _ in groups], dtype=np.int64)
+    offsets = np.zeros(len(groups) + 1, dtype=np.int64)
+    np.cumsum([len(values) for _, values in groups], out=offsets[1:])
+    values = np.array([v for _, vs in groups for v in vs], dtype=np.int32)
+    return (keys, offsets), values
+
+
+def _write_sections(out_path, sections, header):
+    header["sections"] = {}
+    offset = 0
+    for name, array in sections.items():
+        array = np.ascontiguousarray(array)
+        sections[name] = array
+        header["sections"][name] = {"offset": offset, "dtype": array.dtype.str, "shape": list(array.shape)}
+        offset += _aligned(array.nbytes)
+
+    header_bytes = json.dumps(header).encode("utf-8")
+    data_start = _aligned(len(MAGIC) + 8 + len(header_bytes))
+
+    # Write next to the target and rename, so readers never mmap a half-written file.
+    tmp_path = f"{out_path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<Q", len(header_bytes)))
+        f.write(header_bytes)
+        f.write(b"\0" * (data_start - f.tell()))
+        for name, array in sections.items():
+            f.write(array.tobytes())
+            f.write(b"\0" * (_aligned(array.nbytes) - array.nbytes))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, out_path)
+
+
+def _aligned(n):
+    return (n + 7) & ~7
+
+
+# ✅ Read the Snapshot Header Without Mapping the Data
+def read_header(path):
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a KG snapshot")
+        (length,) = struct.unpack("<Q", f.read(8))
+        return json.loads(f.read(length).decode("utf-8"))
+
+
+def is_fresh(path, json_path, ttl_path):
+    """True when the snapshot exists and was compiled from the current source files.
+
+    Missing sources count as fresh, so a deployment can ship only the snapshot.
+    """
+    try:
+        header = read_header(path)
+    except (OSError, ValueError):
+        return False
+    if header.get("version") != VERSION:
+        return False
+    recorded = header.get("source")
+    current = source_fingerprint((json_path, ttl_path))
+    return all(now is None or now == then for now, then in zip(current, recorded))
+
+
+# ✅ Memory-Mapped KG (same lookups as KGIndex + adjacency_list)
+class MappedKG:
+    """Read-only view over a snapshot file. Arrays are backed directly by the mmap."""
+
+    def __init__(self, path):
+        self.path = path
+        self.header = read_header(path)
+        if self.header.get("version") != VERSION:
+            raise ValueError(f"Unsupported KG snapshot version {self.header.get('version')}")
+
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        header_len = struct.unpack_from("<Q", self._mmap, len(MAGIC))[0]
+        data_start = _aligned(len(MAGIC) + 8 + header_len)
+
+        for name, info in self.header["sections"].items():
+            dtype = np.dtype(info["dtype"])
+            count = int(np.prod(info["shape"], dtype=np.int64))
+            array = np.frombuffer(self._mmap, dtype=dtype, count=count, offset=data_start + info["offset"])
+            setattr(self, f"_{name}", array.reshape(info["shape"]))
+
+        self.strings = StringTable(self._string_offsets, self._string_blob)
+        self.adjacency = CSRAdjacency(
+            self.strings,
+            self._out_offsets, self._out_neighbors, self._out_predicates,
+            self._in_offsets, self._in_neighbors, self._in_predicates,
+        )
+
+    def __len__(self):
+        return len(self.adjacency)
+
+    def lookup(self, text):
+        return self.strings.lookup(text)
+
+    def string(self, term_id):
+        return self.strings[term_id]
+
+    # --- retrieval indexes (KGIndex API) ---
+    def posts_for(self, subreddit_uri, topic_uri):
+        container, topic = self.lookup(subreddit_uri), self.lookup(topic_uri)
+        if container < 0 or topic < 0:
+            return []
+        return [self.string(i) for i in self._group(self._pair_keys, self._pair_offsets, self._pair_posts,
+                                                     (container << 32) | topic)]
+
+    def comments_for(self, post_uri):
+        post = self.lookup(post_uri)
+        if post < 0:
+            return []
+        return [self.string(i) for i in self._group(self._post_keys, self._post_offsets, self._post_comments, post)]
+
+    def title(self, comment_uri):
+        comment = self.lookup(comment_uri)
+        pos = np.searchsorted(self._title_keys, comment)
+        if comment < 0 or pos >= len(self._title_keys) or self._title_keys[pos] != comment:
+            return ""
+        return self.string(self._title_values[pos])
+
+    def iter_titles(self):
+        for comment, title in zip(self._title_keys, self._title_values):
+            yield self.string(comment), self.string(title)
+
+    @staticmethod
+    def _group(keys, offsets, values, key):
+        pos = np.searchsorted(keys, key)
+        if pos >= len(keys) or keys[pos] != key:
+            return values[:0]
+        return values[offsets[pos]:offsets[pos + 1]]
+
+    # --- adjacency_list API ---
+    def get(self, term, default=None):
+        return self.adjacency.get(term, default)
+
+
+if __name__ == "__main__":
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description="Compile KG.json + KG.ttl into a memory-mapped snapshot.")
+    parser.add_argument("--json", default=os.path.join(base_dir, "KG.json"))
+    parser.add_argument("--ttl", default=os.path.join(base_dir, "KG.ttl"))
+    parser.add_argument("--out", default=os.path.join(base_dir, "KG.snap"))
+    args = parser.parse_args()
+    compile_snapshot(args.json, args.ttl, args.out)
@@ -0,0 +1,120 @@
+import os
+import threading
+import time
+
+
+# ✅ Immutable view of the knowledge graph shared by all requests
+class KGSnapshot:
+    """Holds one fully built copy of the KG. Never mutated once published, except that
+    ingested data (see kg_ingest.py) grows its overlay."""
+
+    def __init__(self, kg_json, adjacency_list, index=None, signature=None, comment_embeddings=None):
+        self.kg_json = kg_json
+        self.adjacency_list = adjacency_list
+        self.index = index
+        self.comment_embeddings = comment_embeddings
+        self.overlay = None
+        self.signature = signature
+        self.loaded_at = time.time()
+
+
+def file_signature(paths):
+    """Returns (path, mtime_ns, size) for every file, or None for missing files."""
+    signature = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            signature.append((path, st.st_mtime_ns, st.st_size))
+        except OSError:
+            signature.append((path, None, None))
+    return tuple(signature)
+
+
+# ✅ Process-wide KG store with background hot reload
+class KGStore:
+    """Loads the KG once and swaps in a rebuilt snapshot whenever the source files change.
+
+    `build` is called as build(*paths) and must return a KGSnapshot (or None on failure).
+    Readers call snapshot() once per request and keep using that object, so a reload
+    never blocks or mutates an in-flight request.
+    """
+
+    def __init__(self, paths, build, poll_interval=5.0):
+        self.paths = tuple(paths)
+        self.build = build
+        self.poll_interval = poll_interval
+        self._snapshot = None
+        self._load_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watcher = None
+        self._failed_signature = None
+        self.reloads = 0
+
+    def snapshot(self):
+        """Returns the current snapshot, loading it synchronously only on first use."""
+        snapshot = self._snapshot
+        if snapshot is None:
+            with self._load_lock:
+                # Don't retry a load that already failed until the files change.
+                if self._snapshot is None and file_signature(self.paths) != self._failed_signature:
+                    self._rebuild()
+                snapshot = self._snapshot
+        return snapshot
+
+    def is_loaded(self):
+        return self._snapshot is not None
+
+    def start(self, load=True):
+        """Starts the file watcher thread, loading the KG first unless load=False."""
+        if load:
+            self.snapshot()
+        if self._watcher is None or not self._watcher.is_alive():
+            self._stop.clear()
+            self._watcher = threading.Thread(target=self._watch, name="kg-store-watcher", daemon=True)
+            self._watcher.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join(timeout=self.poll_interval + 1)
+            self._watcher = None
+
+    def _rebuild(self):
+        signature = file_signature(self.paths)
+        started = time.time()
+        snapshot = self.build(*self.paths)
+        if snapshot is None:
+            print("❌ KG rebuild failed, keeping previous snapshot.")
+            self._failed_signature = signature
+            return False
+
+        snapshot.signature = signature
+        # Single reference assignment: readers see either the old or the new snapshot.
+        self._snapshot = snapshot
+        self.reloads += 1
+        print(f"✅ KG snapshot ready in {time.time() - started:.2f}s.")
+        return True
+
+    def _watch(self):
+        pending = None
+        while not self._stop.wait(self.poll_interval):
+            # The first load belongs to snapshot(); the watcher only swaps in reloads.
+            if self._snapshot is None:
+                continue
+            current = self._snapshot.signature
+            signature = file_signature(self.paths)
+            if signature == current or signature == self._failed_signature:
+                pending = None
+                continue
+
+            # Wait for the files to stay unchanged for one poll interval so we
+            # don't parse a KG that is still being written.
+            if signature != pending:
+                pending = signature
+                continue
+
+            print("\n🔄 KG files changed, rebuilding snapshot in background...")
+            with self._load_lock:
+                self._rebuild()
+            pending = None
@@ -0,0 +1,161 @@
+import itertools
+import threading
+
+import numpy as np
+
+_scratch = threading.local()
+
+
+def _unwrap(adjacency):
+    """(CSRAdjacency, overlay or None) behind an adjacency_list, a MappedKG or an overlay view."""
+    overlay = getattr(adjacency, "overlay", None)
+    base = adjacency.base if overlay is not None else adjacency
+    return getattr(base, "adjacency", base), overlay
+
+
+def _visited_bitmap(n_terms):
+    """Per-thread bitmap with one bit per interned term, reused across traversals.
+
+    Only the bytes a traversal touched are cleared afterwards, so a query costs what
+    it visits rather than the size of the graph.
+    """
+    size = (n_terms + 7) // 8
+    if getattr(_scratch, "busy", False):
+        # Another traversal in this thread is still being iterated; don't share its bits.
+        return np.zeros(size, dtype=np.uint8)
+    bitmap = getattr(_scratch, "bitmap", None)
+    if bitmap is None or len(bitmap) < size:
+        bitmap = _scratch.bitmap = np.zeros(size, dtype=np.uint8)
+    _scratch.busy = True
+    return bitmap
+
+
+# ✅ Bounded k-Hop Traversal over Interned IDs
+def khop(adjacency, seeds, hops=2, predicates=None, direction="both",
+         frontier_cap=256, node_budget=4096, edge_cap=512):
+    """Yields (term, depth) for nodes reachable from the seeds within `hops`, breadth first.
+
+    - predicates: only follow edges whose predicate URI is in this collection (None = all)
+    - direction: "out" (seed is subject), "in" (seed is object) or "both"
+    - frontier_cap: at most this many new nodes are discovered per hop
+    - node_budget: the traversal stops after visiting this many nodes in total
+    - edge_cap: at most this many matching edges per direction are followed from any
+      one node, which keeps hubs (popular subreddits, prolific users) from dominating the cost
+
+    Together they bound the nodes discovered to node_budget x edge_cap whatever the graph
+    looks like. Edges are filtered by predicate before the cap, so a matching edge is never
+    crowded out by others on the same node, and neighbours are taken in term order (string
+    tables are sorted), so the same subgraph gives the same walk whether it comes from the
+    whole KG or a shard. Seeds themselves are not yielded. Stop iterating to end early.
+    """
+    csr, overlay = _unwrap(adjacency)
+    if overlay is not None and not overlay.triples_by_term:
+        overlay = None
+    strings = csr.strings
+    follow_out = direction in ("out", "both")
+    follow_in = direction in ("in", "both")
+    if predicates is not None:
+        predicates = set(predicates)
+        predicate_ids = np.array([i for i in (csr.lookup(p) for p in predicates) if i >= 0], dtype=np.int32)
+
+    bitmap = _visited_bitmap(len(strings))
+    touched = []           # arrays of visited base IDs, cleared from the bitmap at the end
+    visited_extra = set()  # overlay-only terms (no interned ID)
+
+    def unseen(ids):
+        ids = ids[(bitmap[ids >> 3] & (1 << (ids & 7)).astype(np.uint8)) == 0]
+        if len(ids) > 1:
+            _, first = np.unique(ids, return_index=True)
+            ids = ids[np.sort(first)]
+        return ids
+
+    def mark(ids):
+        np.bitwise_or.at(bitmap, ids >> 3, (1 << (ids & 7)).astype(np.uint8))
+        touched.append(ids)
+
+    def base_neighbors(term_id):
+        found = []
+        for enabled, edges in ((follow_out, csr.out_edges), (follow_in, csr.in_edges)):
+            if not enabled:
+                continue
+            neighbors, edge_predicates = edges(term_id)
+            if predicates is not None:
+                neighbors = neighbors[np.isin(edge_predicates, predicate_ids)]
+            found.append(np.sort(neighbors)[:edge_cap])
+        return np.concatenate(found).astype(np.int64) if found else np.zeros(0, dtype=np.int64)
+
+    def overlay_neighbors(term):
+        matching = (
+            o if s == term else s
+            for s, p, o in overlay.triples_by_term.get(term, ())
+            if (predicates is None or p in predicates) and (follow_out if s == term else follow_in)
+        )
+        return itertools.islice(matching, edge_cap)
+
+    try:
+        frontier = []
+        for seed in seeds:
+            term_id = csr.lookup(seed)
+            if term_id >= 0:
+                mark(np.array([term_id], dtype=np.int64))
+                frontier.append(term_id)
+            elif overlay is not None and seed in overlay.triples_by_term:
+                visited_extra.add(seed)
+                frontier.append(seed)
+
+        visited = 0
+        for depth in range(1, hops + 1):
+            next_frontier = []
+            for node in frontier:
+                room = min(frontier_cap - len(next_frontier), node_budget - visited)
+                if room <= 0:
+                    break
+                fresh = []
+                if isinstance(node, str):
+                    term = node
+                else:
+                    term = strings[node] if overlay is not None else None
+                    ids = unseen(base_neighbors(node))[:room]
+                    if len(ids):
+                        mark(ids)
+                        fresh.extend(int(i) for i in ids)
+                if overlay is not None:
+                    for neighbor in overlay_neighbors(term):
+                        if len(fresh) >= room:
+                            break
+                        term_id = csr.lookup(neighbor)
+                        if term_id >= 0:
+                            if bitmap[term_id >> 3] & (1 << (term_id & 7)):
+                                continue
+                            mark(np.array([term_id], dtype=np.int64))
+                            fresh.append(term_id)
+                        elif neighbor not in visited_extra:
+                            visited_extra.add(neighbor)
+                            fresh.append(neighbor)
+
+                for neighbor in fresh:
+                    visited += 1
+                    yield (neighbor if isinstance(neighbor, str) else strings[neighbor]), depth
+                next_frontier.extend(fresh)
+            frontier = next_frontier
+            if not frontier or visited >= node_budget:
+                return
+    finally:
+        for ids in touched:
+            bitmap[ids >> 3] = 0
+        if bitmap is getattr(_scratch, "bitmap", None):
+            _scratch.busy = False
+
+
+def objects_of(adjacency, term, predicate):
+    """Objects of (term, predicate, ?) triples, e.g. a node's dc:title literals."""
+    csr, overlay = _unwrap(adjacency)
+    found = []
+    term_id = csr.lookup(term)
+    predicate_id = csr.lookup(predicate)
+    if term_id >= 0 and predicate_id >= 0:
+        neighbors, predicates = csr.out_edges(term_id)
+        found.extend(csr.strings[int(i)] for i in neighbors[predicates == predicate_id])
+    if overlay is not None:
+        found.extend(o for s, p, o in overlay.triples_by_term.get(term, ()) if s == term and p == predicate)
+    return found
@@ -0,0 +1,220 @@
+import asyncio
+import concurrent.futures
+import json
+import os
+import queue
+import random
+import threading
+import time
+
+import httpx
+
+# ✅ LLM Endpoint Settings (any OpenAI-compatible chat completions API)
+LLM_BASE_URL = os.environ.get("LLM_BASE_URL", "https://api.groq.com/openai/v1")
+LLM_API_KEY = os.environ.get("LLM_API_KEY", os.environ.get("GROQ_API_KEY", "YourLLM"))
+LLM_TIMEOUT = float(os.environ.get("LLM_TIMEOUT", "30"))
+LLM_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", "3"))
+LLM_MAX_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY", "8"))
+LLM_POOL_SIZE = int(os.environ.get("LLM_POOL_SIZE", "20"))
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class LLMError(Exception):
+    """Raised when the LLM call fails for good (non-retryable status, retries exhausted or deadline hit)."""
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+# ✅ Pooled Async Client Running on Its Own Event Loop
+class LLMClient:
+    """Chat completions over one pooled httpx.AsyncClient.
+
+    The client lives on a background event loop, so Flask's request threads call
+    chat()/stream_chat() synchronously while every upstream call shares the
+    connection pool and the concurrency limit. Each call has a deadline, and
+    429/5xx/transport errors are retried with jittered exponential backoff.
+    """
+
+    def __init__(self, base_url=LLM_BASE_URL, api_key=LLM_API_KEY, timeout=LLM_TIMEOUT,
+                 max_retries=LLM_MAX_RETRIES, max_concurrency=LLM_MAX_CONCURRENCY,
+                 pool_size=LLM_POOL_SIZE, backoff_base=0.5, backoff_max=8.0):
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.max_concurrency = max_concurrency
+        self.pool_size = pool_size
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._lock = threading.Lock()
+        self._loop = None
+        self._pid = None
+
+    # --- event loop plumbing ---
+    def _ensure_loop(self):
+        # Recreated after a fork: the loop thread doesn't survive into the child.
+        with self._lock:
+            if self._loop is None or self._pid != os.getpid():
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="llm-client-loop", daemon=True).start()
+                self._loop, self._pid = loop, os.getpid()
+                self._http, self._semaphore = asyncio.run_coroutine_threadsafe(self._open(), loop).result()
+            return self._loop
+
+    async def _open(self):
+        limits = httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size)
+        http = httpx.AsyncClient(
+            base_url=self.base_url,
+            headers={"Authorization": f"Bearer {self.api_key}"},
+            limits=limits,
+            timeout=httpx.Timeout(self.timeout, connect=min(self.timeout, 5.0)),
+        )
+        return http, asyncio.Semaphore(self.max_concurrency)
+
+    def close(self):
+        with self._lock:
+            loop, self._loop = self._loop, None
+        if loop is not None and self._pid == os.getpid():
+            asyncio.run_coroutine_threadsafe(self._http.aclose(), loop).result(timeout=5)
+            loop.call_soon_threadsafe(loop.stop)
+
+    # --- public API ---
+    def chat(self, messages, model, timeout=None, **params):
+        """Returns the assistant message text, waiting at most `timeout` seconds overall."""
+        timeout = self.timeout if timeout is None else timeout
+        loop = self._ensure_loop()
+        payload = {"model": model, "messages": messages, **params}
+        future = asyncio.run_coroutine_threadsafe(self._chat(payload, time.monotonic() + timeout), loop)
+        try:
+            return future.result(timeout=timeout + 1)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise LLMError(f"LLM call exceeded its {timeout:.0f}s deadline")
+
+    def stream_chat(self, messages, model, timeout=None, **params):
+        """Yields text deltas. The deadline covers getting the stream started; after that
+        each chunk must arrive within `timeout` seconds of the previous one."""
+        timeout = self.timeout if timeout is None else timeout
+        loop = self._ensure_loop()
+        payload = {"model": model, "messages": messages, "stream": True, **params}
+        chunks = queue.Queue()
+        future = asyncio.run_coroutine_threadsafe(
+            self._stream(payload, time.monotonic() + timeout, chunks), loop)
+        try:
+            while True:
+                try:
+                    kind, value = chunks.get(timeout=timeout)
+                except queue.Empty:
+                    raise LLMError(f"LLM stream stalled for {timeout:.0f}s")
+                if kind == "delta":
+                    yield value
+                elif kind == "error":
+                    raise value
+                else:
+                    return
+        finally:
+            # Also runs when the caller stops early (client disconnected).
+            future.cancel()
+
+    # --- coroutines on the client loop ---
+    async def _chat(self, payload, deadline):
+        response = await self._send(payload, deadline)
+        try:
+            data = response.json()
+        finally:
+            await response.aclose()
+            self._semaphore.release()
+        return data["choices"][0]["message"]["content"]
+
+    async def _stream(self, payload, deadline, chunks):
+        try:
+            response = await self._send(payload, deadline, stream=True)
+            try:
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[5:].strip()
+                    if data == "[DONE]":
+                        break
+                    choices = json.loads(data).get("choices") or [{}]
+                    delta = choices[0].get("delta", {}).get("content")
+                    if delta:
+                        chunks.put(("delta", delta))
+            finally:
+                await response.aclose()
+                self._semaphore.release()
+            chunks.put(("done", None))
+        except asyncio.CancelledError:
+            raise
+        except LLMError as e:
+            chunks.put(("error", e))
+        except Exception as e:
+            chunks.put(("error", LLMError(f"LLM stream failed: {str(e)}")))
+
+    async def _send(self, payload, deadline, stream=False):
+        """Sends the request, retrying until it succeeds or the deadline passes.
+
+        Returns with a concurrency slot held for the whole response (including a
+        stream); the caller releases it after closing the response.
+        """
+        attempt = 0
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise LLMError("LLM call exceeded its deadline")
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), remaining)
+            except asyncio.TimeoutError:
+                raise LLMError(f"No free LLM slot within the deadline ({self.max_concurrency} calls in flight)")
+
+            try:
+                response, error, retry_after = await self._attempt(payload, deadline, stream)
+            except BaseException:
+                self._semaphore.release()
+                raise
+            if response is not None:
+                return response
+            self._semaphore.release()
+
+            if error.status is not None and error.status not in RETRY_STATUSES:
+                raise error
+            attempt += 1
+            if attempt > self.max_retries:
+                raise error
+            # Full jitter, but never sleep past the deadline
+            delay = retry_after if retry_after is not None else random.uniform(
+                0, min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1)))
+            if time.monotonic() + delay >= deadline:
+                raise error
+            print(f"🔄 Retrying LLM call in {delay:.2f}s ({error})")
+            await asyncio.sleep(delay)
+
+    async def _attempt(self, payload, deadline, stream):
+        """One request. Returns (response, None, None) on success, else (None, LLMError, retry_after)."""
+        remaining = max(deadline - time.monotonic(), 0.001)
+        # A stream may outlive the deadline, so its reads only need to beat the per-chunk timeout.
+        read_timeout = self.timeout if stream else remaining
+        request = self._http.build_request("POST", "/chat/completions", json=payload,
+                                           timeout=httpx.Timeout(read_timeout, connect=min(remaining, 5.0)))
+        try:
+            response = await asyncio.wait_for(self._http.send(request, stream=stream), remaining)
+        except (httpx.TransportError, asyncio.TimeoutError) as e:
+            return None, LLMError(f"LLM request failed: {type(e).__name__}: {str(e)}"), None
+
+        if response.status_code < 400:
+            return response, None, None
+        await response.aread()
+        await response.aclose()
+        error = LLMError(f"LLM returned HTTP {response.status_code}: {response.text[:200]}",
+                         status=response.status_code)
+        return None, error, _retry_after(response)
+
+
+def _retry_after(response):
+    try:
+        return max(0.0, float(response.headers.get("retry-after")))
+    except (TypeError, ValueError):
+        return None
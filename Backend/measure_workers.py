@@ -0,0 +1,100 @@
+"""Per-worker memory and requests/sec for a running gunicorn master.
+
+    python measure_workers.py --pid $(cat gunicorn.pid) --url http://127.0.0.1:5000/api/visualize \
+        --requests 500 --concurrency 16
+
+Memory comes from /proc/<pid>/smaps_rollup (Linux). RSS counts shared pages once per
+process; PSS divides them between the processes sharing them, so the sum of PSS is the
+real footprint of master + workers.
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+DEFAULT_BODY = {
+    "user_query": "How has the share of each platform changed over time?",
+    "response": "In 2021 Reddit had 40%, Twitter 35% and Facebook 25%. By 2023 Reddit grew to 48% while Twitter fell to 27%.",
+}
+
+
+def memory_kb(pid):
+    """Returns {"Rss": kB, "Pss": kB, ...} for one process."""
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1])
+    return fields
+
+
+def worker_pids(master_pid):
+    pids = []
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    # Field 4 is the parent PID (the name in field 2 may contain spaces, so split after it).
+                    if int(f.read().rsplit(")", 1)[1].split()[1]) == master_pid:
+                        pids.append(int(entry))
+            except (OSError, ValueError, IndexError):
+                pass
+    return sorted(pids)
+
+
+def print_memory(master_pid):
+    print(f"{'process':>14} {'RSS MB':>9} {'PSS MB':>9} {'shared MB':>10} {'private MB':>11}")
+    total_pss = 0
+    for label, pid in [("master", master_pid)] + [(f"worker {pid}", pid) for pid in worker_pids(master_pid)]:
+        m = memory_kb(pid)
+        shared = m.get("Shared_Clean", 0) + m.get("Shared_Dirty", 0)
+        private = m.get("Private_Clean", 0) + m.get("Private_Dirty", 0)
+        total_pss += m.get("Pss", 0)
+        print(f"{label:>14} {m.get('Rss', 0) / 1024:9.1f} {m.get('Pss', 0) / 1024:9.1f} "
+              f"{shared / 1024:10.1f} {private / 1024:11.1f}")
+    print(f"{'total PSS':>14} {total_pss / 1024:9.1f} MB")
+
+
+def load_test(url, body, requests, concurrency, timeout):
+    latencies = []
+    errors = 0
+    with httpx.Client(timeout=timeout, limits=httpx.Limits(max_connections=concurrency)) as client:
+        def call(_):
+            started = time.perf_counter()
+            response = client.post(url, json=body)
+            return time.perf_counter() - started, response.status_code
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            for latency, status in pool.map(call, range(requests)):
+                latencies.append(latency)
+                errors += status >= 400
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    pct = lambda p: latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000
+    print(f"{requests} requests, concurrency {concurrency}: {requests / elapsed:.1f} req/s, "
+          f"p50 {pct(0.50):.1f} ms, p95 {pct(0.95):.1f} ms, p99 {pct(0.99):.1f} ms, errors {errors}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report per-worker memory and requests/sec for gunicorn.")
+    parser.add_argument("--pid", type=int, help="gunicorn master PID (e.g. $(cat gunicorn.pid))")
+    parser.add_argument("--url", default="http://127.0.0.1:5000/api/visualize")
+    parser.add_argument("--body", help="JSON request body (defaults to a visualization request)")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--timeout", type=float, default=60)
+    args = parser.parse_args()
+
+    if args.pid:
+        print_memory(args.pid)
+    if args.requests > 0:
+        body = json.loads(args.body) if args.body else DEFAULT_BODY
+        load_test(args.url, body, args.requests, args.concurrency, args.timeout)
+        if args.pid:
+            print_memory(args.pid)
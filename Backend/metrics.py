@@ -0,0 +1,70 @@
+import os
+import time
+from contextlib import contextmanager
+
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram,
+                               generate_latest, multiprocess)
+
+# ✅ Prometheus Metrics
+# Under gunicorn set PROMETHEUS_MULTIPROC_DIR (see gunicorn.conf.py) so /metrics adds up all workers.
+MULTIPROCESS = bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+
+# Stages take from ~1 ms (cache lookups, fast-mode features) to tens of seconds (KG load, slow LLM calls).
+STAGE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+# Stages: kg_load (building or mapping a KG snapshot), retrieval (topic lookups, ranking, fusion),
+# context_build (packing comments into the prompt budget), llm (the full call, or the whole stream),
+# llm_first_token, spacy_parse, embedding (SentenceTransformer encode), scoring
+# (features, chart scoring and diversification) and pool (waiting on the viz process pool).
+stage_seconds = Histogram("fyp_stage_duration_seconds", "Time spent in one pipeline stage.",
+                          ["pipeline", "stage"], buckets=STAGE_BUCKETS)
+request_seconds = Histogram("fyp_request_duration_seconds", "HTTP request latency, including streamed bodies.",
+                            ["endpoint"], buckets=STAGE_BUCKETS)
+requests_total = Counter("fyp_requests_total", "HTTP requests by endpoint and status code.",
+                         ["endpoint", "status"])
+requests_in_flight = Gauge("fyp_requests_in_flight", "HTTP requests currently being served.",
+                           ["endpoint"], multiprocess_mode="livesum")
+cache_lookups = Counter("fyp_cache_lookups_total", "Cache lookups (answer, viz, embedding) by result (hit, miss).",
+                        ["cache", "result"])
+kg_size = Gauge("fyp_kg_size", "Size of the loaded knowledge graph (triples, embedded comments).",
+                ["kind"], multiprocess_mode="livemax")
+kg_loads = Counter("fyp_kg_loads_total", "Knowledge graph snapshots built or mapped, by outcome.", ["outcome"])
+viz_pool_pending = Gauge("fyp_viz_pool_pending", "Visualization requests queued or running in the process pool.",
+                         multiprocess_mode="livesum")
+viz_pool_rejections = Counter("fyp_viz_pool_rejections_total",
+                              "Visualization requests the process pool turned away, by reason (queue_full, send_timeout, timeout).",
+                              ["reason"])
+
+
+@contextmanager
+def timed(pipeline, stage):
+    """Observes the duration of the with-block as one sample of fyp_stage_duration_seconds."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        stage_seconds.labels(pipeline, stage).observe(time.perf_counter() - started)
+
+
+def observe(pipeline, stage, seconds):
+    stage_seconds.labels(pipeline, stage).observe(seconds)
+
+
+def count_cache(cache, result, n=1):
+    if n:
+        cache_lookups.labels(cache, result).inc(n)
+
+
+def render():
+    """Returns (body, content type) for the /metrics route."""
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead(pid):
+    """Drops the live gauges of an exited gunicorn worker."""
+    if MULTIPROCESS:
+        multiprocess.mark_process_dead(pid)
@@ -0,0 +1,18 @@
+import os
+import sqlite3
+
+
+def thread_connection(local, path, **kwargs):
+    """Returns this thread's SQLite connection to path in WAL mode, kept on `local` (a threading.local).
+
+    SQLite connections can't be shared across threads, nor carried into a forked worker,
+    so each thread opens its own and a forked child opens new ones.
+    """
+    db = getattr(local, "db", None)
+    if db is None or local.pid != os.getpid():
+        db = sqlite3.connect(path, timeout=5, **kwargs)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        local.db = db
+        local.pid = os.getpid()
+    return db
@@ -0,0 +1,60 @@
+import json
+
+import pytest
+
+from kg_ingest import KGIngestor, KGOverlay, normalize_batch
+from kg_snapshot import parse_sources
+
+
+@pytest.mark.parametrize("bad_id", ["evil post>", "a b", 'x"y', "a\\b", "{id}", "a|b", "a^b", "a`b", "<id"])
+def test_ids_that_would_break_the_ttl_are_rejected(bad_id):
+    with pytest.raises(ValueError):
+        normalize_batch({"posts": [{"id": bad_id, "subreddit": "Sub0", "topics": ["t0"]}]})
+    with pytest.raises(ValueError):
+        normalize_batch({"comments": [{"id": "c1", "post": bad_id, "text": "hi"}]})
+    with pytest.raises(ValueError):
+        normalize_batch({"topic_links": [{"post": "p1", "subreddit": "Sub0", "topics": [bad_id]}]})
+
+
+def test_compacted_ttl_still_parses(tmp_path):
+    json_path, ttl_path = tmp_path / "KG.json", tmp_path / "KG.ttl"
+    json_path.write_text(json.dumps([{"@id": "http://reddit.com/post/0", "@type": "sioc:Post",
+                                      "sioc:Container": "http://reddit.com/subreddit/Sub0"}]), encoding="utf-8")
+    ttl_path.write_text("<http://reddit.com/post/0> <http://rdfs.org/sioc/ns#has_container> "
+                        "<http://reddit.com/subreddit/Sub0> .\n", encoding="utf-8")
+    ingestor = KGIngestor(str(tmp_path / "KG.delta.jsonl"), str(json_path), str(ttl_path))
+    ingestor.ingest(None, {
+        "posts": [{"id": "p1", "subreddit": "Sub0", "topics": ["t0"], "title": 'A "quoted" title\nwith <tags>'}],
+        "comments": [{"id": "c1", "post": "p1", "text": "back\\slash and > brackets"}],
+    })
+    with pytest.raises(ValueError):
+        ingestor.ingest(None, {"posts": [{"id": "evil post>", "subreddit": "Sub0", "topics": ["t0"]}]})
+
+    assert ingestor.compact() == 1
+    kg_json, triples = parse_sources(str(json_path), str(ttl_path))
+    assert kg_json["http://reddit.com/comment/c1"]["dc:title"] == "back\\slash and > brackets"
+    assert ("http://reddit.com/comment/c1", "http://purl.org/dc/elements/1.1/title",
+            "back\\slash and > brackets") in triples
+    assert ingestor.log.size() == 0
+
+
+def test_shard_overlay_keeps_only_its_subreddit():
+    sub0, sub1 = "http://reddit.com/subreddit/Sub0", "http://reddit.com/subreddit/Sub1"
+    base_post = "http://reddit.com/post/base0"
+    overlay = KGOverlay(sub0, owns_post=lambda post: post == base_post)
+    encoded = []
+    overlay.apply(normalize_batch({
+        "posts": [{"id": "p0", "subreddit": "Sub0", "topics": ["t0"]},
+                  {"id": "p1", "subreddit": "Sub1", "topics": ["t0"]}],
+        "comments": [{"id": "c0", "post": "p0", "text": "mine"},
+                     {"id": "c1", "post": "p1", "text": "not mine"},
+                     {"id": "c2", "post": base_post, "text": "on a base post"}],
+    }), encode=lambda texts: (encoded.extend(texts), [[1.0, 0.0]] * len(texts))[1])
+    overlay.apply(normalize_batch({"comments": [{"id": "c3", "post": "p0", "text": "later"},
+                                                {"id": "c4", "post": "p1", "text": "later, not mine"}]}))
+
+    assert list(overlay.post_ids) == ["http://reddit.com/post/p0"]
+    assert set(overlay.comment_titles) == {f"http://reddit.com/comment/c{i}" for i in (0, 2, 3)}
+    assert encoded == ["mine", "on a base post"]
+    assert (sub1, "http://reddit.com/topic/t0") not in overlay.posts_by_container_topic
+    assert overlay.nbytes > 0
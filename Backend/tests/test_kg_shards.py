@@ -0,0 +1,67 @@
+import json
+import random
+
+from kg_index import KGIndex
+from kg_shards import read_manifest, write_shards
+from kg_snapshot import MappedKG, source_fingerprint, write_snapshot
+
+SIOC = "http://rdfs.org/sioc/ns#"
+
+
+def _kg(subreddits=3, posts=4, comments=12):
+    kg_json, triples = {}, []
+    for s in range(subreddits):
+        subreddit = f"http://reddit.com/subreddit/Sub{s}"
+        for p in range(posts):
+            post = f"http://reddit.com/post/{s}_{p}"
+            kg_json[post] = {"@id": post, "sioc:Container": subreddit, "sioc:topic": [f"http://reddit.com/topic/t{p % 2}"]}
+            triples.append((post, SIOC + "has_container", subreddit))
+            for c in range(comments):
+                comment = f"http://reddit.com/comment/{s}_{p}_{c}"
+                kg_json[comment] = {"@id": comment, "dc:title": f"comment {c} on {post}"}
+                triples.append((comment, SIOC + "reply_of", post))
+    return kg_json, triples
+
+
+def _adjacency(triples):
+    adjacency_list = {}
+    for triple in triples:
+        adjacency_list.setdefault(triple[0], []).append(triple)
+        adjacency_list.setdefault(triple[2], []).append(triple)
+    return adjacency_list
+
+
+def test_full_snapshot_and_shard_return_the_same_comments(tmp_path):
+    kg_json, triples = _kg()
+    source = [["KG.json", 1, 1], ["KG.ttl", 1, 1]]
+    # The TTL parser yields triples in a different order on every parse.
+    shuffled = list(triples)
+    random.Random(1).shuffle(shuffled)
+    write_snapshot(kg_json, triples, str(tmp_path / "KG.snap"), source)
+    manifest = write_shards(kg_json, shuffled, str(tmp_path / "shards"), source)
+    random.Random(2).shuffle(shuffled)
+    index = KGIndex.build(kg_json, _adjacency(shuffled))
+
+    full = MappedKG(str(tmp_path / "KG.snap"))
+    for subreddit, info in manifest["shards"].items():
+        shard = MappedKG(str(tmp_path / "shards" / info["file"]))
+        for topic in ("http://reddit.com/topic/t0", "http://reddit.com/topic/t1"):
+            posts = full.posts_for(subreddit, topic)
+            assert posts and shard.posts_for(subreddit, topic) == posts
+            for post in posts:
+                comments = full.comments_for(post)
+                assert len(comments) == 12
+                assert shard.comments_for(post) == comments == index.comments_for(post)
+
+
+def test_stale_manifest_is_returned_with_a_flag(tmp_path):
+    kg_json, triples = _kg(subreddits=1)
+    json_path, ttl_path = tmp_path / "KG.json", tmp_path / "KG.ttl"
+    json_path.write_text(json.dumps(list(kg_json.values())), encoding="utf-8")
+    ttl_path.write_text("", encoding="utf-8")
+    write_shards(kg_json, triples, str(tmp_path / "shards"), source_fingerprint((str(json_path), str(ttl_path))))
+    assert read_manifest(str(tmp_path / "shards"), str(json_path), str(ttl_path))["stale"] is False
+
+    json_path.write_text(json.dumps(list(kg_json.values())) + " ", encoding="utf-8")
+    manifest = read_manifest(str(tmp_path / "shards"), str(json_path), str(ttl_path))
+    assert manifest is not None and manifest["stale"] is True
@@ -0,0 +1,125 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from sqlite_wal import thread_connection
+
+
+# ✅ Content-Hash LRU Cache for Visualization Recommendations
+class VizCache:
+    """Bounded LRU + TTL cache keyed by a hash of the normalized (user_query, response) pair.
+
+    With a path, entries are also written to a SQLite file (WAL mode) so results
+    survive restarts and are shared by every worker on the machine.
+    """
+
+    def __init__(self, max_entries=1024, ttl=24 * 3600, path=None, max_disk_entries=100000):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self.max_disk_entries = max_disk_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._disk_writes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        if path:
+            self._db().execute(
+                "CREATE TABLE IF NOT EXISTS viz_cache (key TEXT PRIMARY KEY, value TEXT, created REAL)")
+            self._db().execute("CREATE INDEX IF NOT EXISTS viz_cache_created ON viz_cache (created)")
+
+    @staticmethod
+    def key(user_query, response, mode="full"):
+        """Hash of the pair with whitespace collapsed, so re-sent answers map to one entry."""
+        normalized = " ".join(user_query.split()) + "\x00" + " ".join(response.split())
+        if mode != "full":
+            # Fast-mode results are approximate, so they never answer a full-mode lookup
+            normalized += "\x00" + mode
+        return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, created = entry
+                if now - created <= self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return list(value)
+                del self._entries[key]
+                self.expirations += 1
+
+        if self.path:
+            try:
+                row = self._db().execute("SELECT value, created FROM viz_cache WHERE key = ?", (key,)).fetchone()
+            except sqlite3.Error as e:
+                print(f"❌ Visualization cache read failed: {str(e)}")
+                row = None
+            if row is not None and now - row[1] <= self.ttl:
+                value = [tuple(item) for item in json.loads(row[0])]
+                self._remember(key, value, row[1])
+                with self._lock:
+                    self.disk_hits += 1
+                return list(value)
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, value):
+        value = [(chart, float(score)) for chart, score in value]
+        created = time.time()
+        self._remember(key, value, created)
+        if self.path:
+            try:
+                db = self._db()
+                db.execute("INSERT OR REPLACE INTO viz_cache (key, value, created) VALUES (?, ?, ?)",
+                           (key, json.dumps(value), created))
+                self._disk_writes += 1
+                if self._disk_writes % 1000 == 0:
+                    self._prune_disk(db)
+            except sqlite3.Error as e:
+                print(f"❌ Visualization cache write failed: {str(e)}")
+
+    def _remember(self, key, value, created):
+        with self._lock:
+            self._entries[key] = (value, created)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def _prune_disk(self, db):
+        db.execute("DELETE FROM viz_cache WHERE created < ?", (time.time() - self.ttl,))
+        db.execute(
+            "DELETE FROM viz_cache WHERE key IN (SELECT key FROM viz_cache ORDER BY created DESC LIMIT -1 OFFSET ?)",
+            (self.max_disk_entries,))
+
+    def _db(self):
+        return thread_connection(self._local, self.path, isolation_level=None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self.path:
+            self._db().execute("DELETE FROM viz_cache")
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
@@ -0,0 +1,382 @@
+"""Process pool for visualization scoring (VIZ_EXECUTOR=process in vrs.py).
+
+getViz is pure CPU work (spaCy, MiniLM and rule scoring), so in request threads it holds
+the GIL and concurrent /api/visualize calls queue up behind each other and slow /api/chat
+down with them. In process mode vrs sends cache misses here instead: a few worker
+processes each load the models once, and request threads only wait on a future.
+
+Each worker takes queued requests until it has VIZ_POOL_BATCH pairs (waiting at most
+VIZ_POOL_BATCH_WAIT_MS for more to arrive) and scores them in one batched pass, like
+getVizBatch. At most VIZ_POOL_QUEUE tasks (one pair, or one chunk of a batch request) are
+queued or running; more are rejected right away, and a request that isn't scored within
+VIZ_POOL_TIMEOUT seconds fails.
+
+Every worker has its own pipe, fed by its own sender thread, so a worker that crashes or
+stops reading only takes its own tasks with it; a task its worker can't take before the
+deadline fails with 503.
+"""
+import atexit
+import itertools
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from multiprocessing.connection import wait
+
+import metrics
+
+VIZ_POOL_WORKERS = int(os.environ.get("VIZ_POOL_WORKERS", str(max(1, min(4, (os.cpu_count() or 2) - 1)))))
+VIZ_POOL_QUEUE = int(os.environ.get("VIZ_POOL_QUEUE", "64"))
+VIZ_POOL_TIMEOUT = float(os.environ.get("VIZ_POOL_TIMEOUT", "10"))
+VIZ_POOL_BATCH = int(os.environ.get("VIZ_POOL_BATCH", "16"))
+VIZ_POOL_BATCH_WAIT_MS = float(os.environ.get("VIZ_POOL_BATCH_WAIT_MS", "5"))
+# spawn: workers start from a clean interpreter, safe to use from a threaded web worker.
+VIZ_POOL_START_METHOD = os.environ.get("VIZ_POOL_START_METHOD", "spawn")
+
+# A task the worker never answers is failed this long after its deadline.
+EXPIRY_GRACE = 1.0
+
+
+class VizPoolError(Exception):
+    """Raised when the pool can't score a request: 503 when it is full or a worker died, 504 on timeout."""
+
+    def __init__(self, message, status):
+        super().__init__(message)
+        self.status = status
+
+
+# ✅ Worker Process: load the models once, then score micro-batches
+def _worker_main(conn, batch_size, batch_wait):
+    # The worker's vrs scores in-process instead of dispatching back to a pool (with fork,
+    # vrs may already be imported from the parent).
+    os.environ["VIZ_EXECUTOR"] = "inline"
+    import vrs
+    vrs.VIZ_EXECUTOR = "inline"
+
+    try:
+        vrs.warm_up()
+    except Exception as e:
+        conn.send(("failed", os.getpid(), str(e)))
+        return
+    conn.send(("ready", os.getpid(), None))
+
+    parent = os.getppid()
+    stopping = False
+    while not stopping:
+        try:
+            if not conn.poll(1.0):
+                # The web worker was killed without stopping its pool.
+                if os.getppid() != parent:
+                    return
+                continue
+            task = conn.recv()
+            if task is None:
+                return
+            batch = [task]
+            size = len(task[1])
+            until = time.monotonic() + batch_wait
+            while size < batch_size and conn.poll(max(0.0, until - time.monotonic())):
+                task = conn.recv()
+                if task is None:
+                    stopping = True
+                    break
+                batch.append(task)
+                size += len(task[1])
+        except (EOFError, OSError):
+            return
+
+        # Tasks whose caller already gave up aren't worth scoring.
+        now = time.time()
+        expired = [task_id for task_id, _, _, deadline in batch if deadline <= now]
+        if expired:
+            conn.send(("expired", expired, None))
+
+        by_mode = {}
+        for task_id, pairs, mode, deadline in batch:
+            if deadline > now:
+                by_mode.setdefault(mode, []).append((task_id, pairs))
+        for mode, items in by_mode.items():
+            try:
+                scored = vrs._score_batch([pair for _, pairs in items for pair in pairs], batch_size, 1, mode)
+            except Exception as e:
+                conn.send(("error", [task_id for task_id, _ in items], str(e)))
+                continue
+            done, start = [], 0
+            for task_id, pairs in items:
+                done.append((task_id, scored[start:start + len(pairs)]))
+                start += len(pairs)
+            conn.send(("done", done, None))
+
+
+class _Worker:
+    def __init__(self, context, batch_size, batch_wait):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, name="viz-worker", daemon=True,
+                                       args=(child_conn, batch_size, batch_wait))
+        self.process.start()
+        child_conn.close()
+        self.outbox = queue.Queue()   # tasks for the sender thread; None stops it
+        self.ready = False
+        self.load = 0                 # pairs queued or sent and not answered yet
+
+
+# ✅ Pool Handle Used by Request Threads
+class VizPool:
+    """Dispatches (user_query, response) pairs to the worker processes and hands back futures.
+
+    Tasks go to the least loaded worker. A collector thread resolves futures as results
+    arrive, fails tasks that outlive their deadline and replaces workers that died.
+    """
+
+    def __init__(self, workers=VIZ_POOL_WORKERS, max_pending=VIZ_POOL_QUEUE, timeout=VIZ_POOL_TIMEOUT,
+                 batch_size=VIZ_POOL_BATCH, batch_wait_ms=VIZ_POOL_BATCH_WAIT_MS,
+                 start_method=VIZ_POOL_START_METHOD):
+        self.size = max(1, workers)
+        self.max_pending = max(1, max_pending)
+        self.timeout = timeout
+        self.batch_size = max(1, batch_size)
+        self.batch_wait = batch_wait_ms / 1000.0
+        self._context = multiprocessing.get_context(start_method)
+        self._workers = []
+        self._pending = {}            # task id -> (future, deadline, worker, number of pairs)
+        self._unsent = set()          # pending task ids still in a worker's outbox
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._collector = None
+        self.pid = os.getpid()
+        self.rejected = 0
+        self.timeouts = 0
+        self.restarts = 0
+
+    def start(self):
+        with self._lock:
+            if self._collector is not None:
+                return self
+            self._workers = [self._spawn() for _ in range(self.size)]
+            self._collector = threading.Thread(target=self._collect, name="viz-pool-collector", daemon=True)
+            self._collector.start()
+        print(f"🔄 Starting {self.size} visualization worker processes...")
+        return self
+
+    def _spawn(self):
+        worker = _Worker(self._context, self.batch_size, self.batch_wait)
+        threading.Thread(target=self._send, args=(worker,), name="viz-pool-sender", daemon=True).start()
+        return worker
+
+    def _send(self, worker):
+        """Feeds a worker's pipe from its outbox, so a full pipe only holds up this thread."""
+        while True:
+            task = worker.outbox.get()
+            if task is None:
+                break
+            task_id = task[0]
+            with self._lock:
+                waiting = task_id in self._pending
+                self._unsent.discard(task_id)
+            if not waiting:
+                continue  # already failed by _expire or a dead worker
+            try:
+                worker.conn.send(task)
+            except (OSError, ValueError):
+                self._resolve(task_id, error=VizPoolError("Visualization worker is restarting, try again shortly", 503))
+        try:
+            worker.conn.send(None)
+        except (OSError, ValueError):
+            pass
+
+    def is_ready(self):
+        return any(worker.ready for worker in self._workers)
+
+    def wait_ready(self, timeout=None):
+        """Blocks until at least one worker has loaded its models (or the timeout passes)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self.is_ready() and not self._stop.is_set():
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.05)
+        return self.is_ready()
+
+    def submit(self, pairs, mode):
+        """Queues a list of pairs as one task and returns a Future for their recommendations.
+
+        Raises VizPoolError(503) when the queue is full. Never blocks on the worker's pipe:
+        the future fails with 503 if the task isn't sent to its worker before its deadline.
+        """
+        if self._stop.is_set():
+            raise VizPoolError("Visualization pool stopped", 503)
+        if not self._slots.acquire(blocking=False):
+            self.rejected += 1
+            metrics.viz_pool_rejections.labels("queue_full").inc()
+            raise VizPoolError(f"Visualization queue is full ({self.max_pending} pending), try again shortly", 503)
+
+        pairs = list(pairs)
+        task_id = next(self._ids)
+        future = Future()
+        deadline = time.time() + self.timeout
+        with self._lock:
+            # Workers still loading their models come last.
+            worker = min(self._workers, key=lambda w: (not w.ready, w.load))
+            worker.load += len(pairs)
+            self._pending[task_id] = (future, deadline, worker, len(pairs))
+            self._unsent.add(task_id)
+        worker.outbox.put((task_id, pairs, mode, deadline))
+        return future
+
+    def score(self, user_query, response, mode):
+        return self.score_many([(user_query, response)], mode)[0]
+
+    def score_many(self, pairs, mode):
+        """Scores the pairs in the pool and returns their recommendations in order.
+
+        Pairs are queued in chunks of batch_size before waiting, so several workers score
+        a large batch in parallel.
+        """
+        futures = [self.submit(pairs[i:i + self.batch_size], mode) for i in range(0, len(pairs), self.batch_size)]
+        deadline = time.monotonic() + self.timeout
+        try:
+            return [charts for future in futures
+                    for charts in future.result(timeout=max(0.0, deadline - time.monotonic()))]
+        except FutureTimeout:
+            self.timeouts += 1
+            metrics.viz_pool_rejections.labels("timeout").inc()
+            raise VizPoolError(f"Visualization scoring timed out after {self.timeout:g}s", 504)
+
+    def _resolve(self, task_id, result=None, error=None):
+        with self._lock:
+            entry = self._pending.pop(task_id, None)
+            if entry is None:
+                return  # already failed by _expire or a dead worker
+            self._unsent.discard(task_id)
+            future, _, worker, size = entry
+            worker.load -= size
+        self._slots.release()
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def _collect(self):
+        while not self._stop.is_set():
+            workers = {worker.conn: worker for worker in self._workers}
+            for conn in wait(list(workers), timeout=0.5):
+                try:
+                    kind, payload, error = conn.recv()
+                except (EOFError, OSError):
+                    continue  # the worker died; _replace_dead_workers cleans up
+                self._handle(workers[conn], kind, payload, error)
+            self._expire()
+            self._replace_dead_workers()
+
+    def _handle(self, worker, kind, payload, error):
+        if kind == "ready":
+            worker.ready = True
+            print(f"✅ Visualization worker {payload} ready.")
+        elif kind == "failed":
+            print(f"❌ Visualization worker {payload} could not load its models: {error}")
+        elif kind == "done":
+            for task_id, recommended_charts in payload:
+                self._resolve(task_id, result=recommended_charts)
+        elif kind == "error":
+            for task_id in payload:
+                self._resolve(task_id, error=RuntimeError(error))
+        elif kind == "expired":
+            for task_id in payload:
+                self._resolve(task_id, error=VizPoolError("Visualization request expired in the queue", 504))
+
+    def _expire(self):
+        now = time.time()
+        with self._lock:
+            # Still waiting for a worker that isn't reading its pipe: never reached it.
+            unsent = [task_id for task_id in self._unsent if self._pending[task_id][1] < now]
+            expired = [task_id for task_id, (_, deadline, _, _) in self._pending.items()
+                       if deadline + EXPIRY_GRACE < now and task_id not in self._unsent]
+        for task_id in unsent:
+            self.rejected += 1
+            metrics.viz_pool_rejections.labels("send_timeout").inc()
+            self._resolve(task_id, error=VizPoolError("Visualization worker is busy, try again shortly", 503))
+        for task_id in expired:
+            self._resolve(task_id, error=VizPoolError("Visualization worker did not answer", 504))
+        metrics.viz_pool_pending.set(len(self._pending))
+
+    def _replace_dead_workers(self):
+        for worker in list(self._workers):
+            if worker.process.is_alive() or self._stop.is_set():
+                continue
+            print(f"❌ Visualization worker {worker.process.pid} exited ({worker.process.exitcode}), "
+                  f"starting a new one.")
+            replacement = self._spawn()
+            with self._lock:
+                self._workers = [replacement if w is worker else w for w in self._workers]
+                lost = [task_id for task_id, entry in self._pending.items() if entry[2] is worker]
+            for task_id in lost:
+                self._resolve(task_id, error=VizPoolError("Visualization worker crashed, try again", 503))
+            worker.outbox.put(None)
+            worker.conn.close()
+            metrics.mark_process_dead(worker.process.pid)
+            self.restarts += 1
+
+    def stop(self, timeout=5.0):
+        """Stops the workers; requests still pending fail with 503."""
+        self._stop.set()
+        if self._collector is not None:
+            self._collector.join(1)
+        for worker in self._workers:
+            worker.outbox.put(None)
+        deadline = time.monotonic() + timeout
+        for worker in self._workers:
+            worker.process.join(max(0.0, deadline - time.monotonic()))
+            if worker.process.is_alive():
+                worker.process.terminate()
+                worker.process.join(1)
+            worker.conn.close()
+            metrics.mark_process_dead(worker.process.pid)
+        for task_id in list(self._pending):
+            self._resolve(task_id, error=VizPoolError("Visualization pool stopped", 503))
+        self._workers = []
+
+    def stats(self):
+        return {
+            "workers": len(self._workers),
+            "ready": sum(worker.ready for worker in self._workers),
+            "pending": len(self._pending),
+            "max_pending": self.max_pending,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+            "restarts": self.restarts,
+        }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_viz_pool():
+    """Returns this process's pool, starting it on first use.
+
+    A pool inherited through fork belongs to the parent, so a forked process starts its own.
+    """
+    global _pool
+    if _pool is None or _pool.pid != os.getpid():
+        with _pool_lock:
+            if _pool is None or _pool.pid != os.getpid():
+                _pool = VizPool().start()
+    return _pool
+
+
+def stop_viz_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None and _pool.pid == os.getpid():
+            _pool.stop()
+        _pool = None
+
+
+def is_running():
+    return _pool is not None and _pool.pid == os.getpid()
+
+
+atexit.register(stop_viz_pool)
@@ -1,11 +1,112 @@
-import spacy
+import os
 import re
-from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
+import threading
+import numpy as np
+from viz_cache import VizCache
+from embedding_cache import CachedEncoder
+import metrics
 
-# Load NLP models
-nlp = spacy.load("en_core_web_sm")
-model = SentenceTransformer('all-MiniLM-L6-v2')
+# Load NLP models lazily: importing vrs stays cheap and the first request (or warm_up) pays the cost
+EMBEDDING_MODEL_NAME = 'all-MiniLM-L6-v2'
+_nlp = None
+_model = None
+_chart_matrix = None
+_load_lock = threading.RLock()
+
+
+# Features only need lemmas (tagger + attribute_ruler + lemmatizer), entities (ner) and
+# sentence boundaries, which senter provides far more cheaply than the dependency parser.
+SPACY_MODEL = os.environ.get("SPACY_MODEL", "en_core_web_sm")
+SPACY_EXCLUDE = ["parser"]
+
+# Where cache misses are scored: "inline" in the request thread, or "process" in a pool of
+# worker processes that each load spaCy and MiniLM once (see viz_pool.py).
+VIZ_EXECUTORS = ("inline", "process")
+VIZ_EXECUTOR = os.environ.get("VIZ_EXECUTOR", "inline")
+if VIZ_EXECUTOR not in VIZ_EXECUTORS:
+    raise ValueError(f"VIZ_EXECUTOR must be one of {VIZ_EXECUTORS}, got {VIZ_EXECUTOR!r}")
+# spaCy processes for inline batch scoring (nlp.pipe n_process), never more than the CPUs.
+VIZ_BATCH_PROCESSES = max(1, min(int(os.environ.get("VIZ_BATCH_PROCESSES", "1")), os.cpu_count() or 1))
+
+
+def get_nlp():
+    global _nlp
+    if _nlp is None:
+        with _load_lock:
+            if _nlp is None:
+                import spacy
+                nlp = spacy.load(SPACY_MODEL, exclude=SPACY_EXCLUDE)
+                if "senter" in nlp.disabled:
+                    nlp.enable_pipe("senter")
+                _nlp = nlp
+    return _nlp
+
+
+def get_model():
+    global _model
+    if _model is None:
+        with _load_lock:
+            if _model is None:
+                from sentence_transformers import SentenceTransformer
+                # Embeddings are cached by text hash (set EMBEDDING_CACHE_DIR to keep them on disk across restarts).
+                # MiniLM is uncased, so case-only variants share one entry.
+                _model = CachedEncoder(
+                    SentenceTransformer(EMBEDDING_MODEL_NAME),
+                    EMBEDDING_MODEL_NAME,
+                    cache_dir=os.environ.get("EMBEDDING_CACHE_DIR") or None,
+                    max_entries=int(os.environ.get("EMBEDDING_CACHE_SIZE", "10000")),
+                    max_disk_entries=int(os.environ.get("EMBEDDING_CACHE_DISK_ENTRIES", "100000")),
+                    lowercase=True,
+                )
+    return _model
+
+
+def get_chart_matrix():
+    """Chart description embeddings stacked into one normalized (charts x dims) matrix."""
+    global _chart_matrix
+    if _chart_matrix is None:
+        with _load_lock:
+            if _chart_matrix is None:
+                _chart_matrix = np.asarray(
+                    get_model().encode(list(chart_types.values()), normalize_embeddings=True), dtype=np.float32)
+    return _chart_matrix
+
+
+def warm_up(start_pool=True):
+    """Loads every model up front so the first request doesn't pay for it.
+
+    In process mode spaCy and the chart matrix live in the pool workers, which are started
+    here unless start_pool=False; this process only needs MiniLM, for chat query embeddings.
+    """
+    if VIZ_EXECUTOR == "process":
+        if start_pool:
+            from viz_pool import get_viz_pool
+            get_viz_pool()
+        get_model()
+        return
+    get_nlp()
+    get_chart_matrix()
+
+
+def loaded_resources():
+    if VIZ_EXECUTOR == "process":
+        import viz_pool
+        return {
+            "sentence_transformer": _model is not None,
+            "viz_pool": viz_pool.is_running() and viz_pool.get_viz_pool().is_ready(),
+        }
+    return {
+        "spacy": _nlp is not None,
+        "sentence_transformer": _model is not None,
+        "chart_embeddings": _chart_matrix is not None,
+    }
+
+# Result cache in front of getViz (set VIZ_CACHE_PATH to share it on disk across workers)
+viz_cache = VizCache(
+    max_entries=int(os.environ.get("VIZ_CACHE_SIZE", "1024")),
+    ttl=float(os.environ.get("VIZ_CACHE_TTL", str(24 * 3600))),
+    path=os.environ.get("VIZ_CACHE_PATH") or None,
+)
 
 # Define visualization categories with expanded descriptions
 chart_types = {
@@ -30,71 +131,232 @@ chart_types = {
     "word_cloud": "Visualizes common words and keyword frequency in text-heavy data. Great for displaying popular terms and themes."
 }
 
-# Precompute chart category embeddings
-category_embeddings = {
-    chart: model.encode(description, normalize_embeddings=True)
-    for chart, description in chart_types.items()
+# Chart order shared by the chart matrix and the rule weights
+chart_names = list(chart_types)
+chart_index = {chart: i for i, chart in enumerate(chart_names)}
+
+
+# Keyword lists used by feature extraction
+trend_keywords = {"increase", "decline", "growth", "rise", "drop", "trend", "fall", "reduce", "expansion", 
+                 "fluctuation", "progression", "evolution", "trajectory", "historical", "over time", 
+                 "increased", "decreased", "grew", "fell", "risen", "trending"}
+
+relationship_keywords = {"prefer", "dominate", "compared", "versus", "majority", "minority", "correlation", 
+                       "causation", "influence", "impact", "affect", "between", "connection", "network", 
+                       "interaction", "collaboration", "flow", "transfer", "connected", "linked", "relation",
+                       "mapping", "connect", "link", "association", "interact"}
+
+hierarchy_keywords = {"structure", "hierarchy", "nested", "parent", "child", "tree", "branch", "root", 
+                    "descendant", "ancestor", "organization", "breakdown", "composition", "contains",
+                    "hierarchical", "level", "tier", "layer", "subordinate", "superordinate", "category",
+                    "subcategory", "classification", "taxonomy", "class", "subclass"}
+
+part_to_whole_keywords = {"percentage", "proportion", "fraction", "share", "allocation", "distribution", 
+                        "segment", "portion", "division", "makeup", "composition", "constituent", "breakdown",
+                        "ratio", "percent", "split", "divided", "parts", "pieces", "sections", "components",
+                        "pie", "slice", "segment", "partition", "make up", "comprises", "consists of"}
+
+comparison_keywords = {"versus", "against", "compare", "contrast", "difference", "similarity", 
+                     "benchmark", "outperform", "underperform", "rank", "exceed", "more than", "less than",
+                     "higher", "lower", "better", "worse", "comparison", "relative", "compared to"}
+
+distribution_keywords = {"distribution", "frequency", "spread", "range", "variance", "outlier"}
+process_flow_keywords = {"process", "workflow", "sequence", "step", "procedure"}
+correlation_keywords = {"correlation", "relationship", "association", "connected"}
+
+# Lemma -> feature categories, so one pass over the tokens fills every keyword list
+keyword_categories = {}
+for _category, _keywords in (
+    ("trends", trend_keywords),
+    ("relationships", relationship_keywords),
+    ("hierarchies", hierarchy_keywords),
+    ("part_to_whole", part_to_whole_keywords),
+    ("comparisons", comparison_keywords),
+    ("distribution", distribution_keywords),
+    ("process_flow", process_flow_keywords),
+    ("correlation", correlation_keywords),
+):
+    for _keyword in _keywords:
+        keyword_categories[_keyword] = keyword_categories.get(_keyword, ()) + (_category,)
+
+
+# Feature extraction modes: "full" runs the spaCy pipeline, "fast" uses only the regexes
+# and lookup tables below (no spaCy), trading some accuracy for much lower latency.
+FEATURE_MODES = ("full", "fast")
+DEFAULT_FEATURE_MODE = os.environ.get("VIZ_FEATURE_MODE", "full")
+
+
+# Fast mode: inflected form -> keyword lemma, so "increases" still counts as "increase"
+def _inflections(word):
+    forms = {word + "s", word + "es", word + "ed", word + "ing"}
+    if word.endswith("e"):
+        forms |= {word + "d", word[:-1] + "ing"}
+    if word.endswith("y"):
+        forms |= {word[:-1] + "ies", word[:-1] + "ied"}
+    if len(word) > 2 and word[-1] not in "aeiouwxy" and word[-2] in "aeiou" and word[-3] not in "aeiou":
+        forms |= {word + word[-1] + "ed", word + word[-1] + "ing"}  # drop -> dropped
+    return forms
+
+
+fast_lemmas = {}
+for _keyword in keyword_categories:
+    for _form in _inflections(_keyword):
+        fast_lemmas.setdefault(_form, _keyword)
+fast_lemmas.update((_keyword, _keyword) for _keyword in keyword_categories)
+fast_lemmas["rose"] = "rise"
+
+fast_token_pattern = re.compile(r"[+-]?\d+(?:[.,/]\d+)*|\w+|%|[^\w\s]")
+fast_number_pattern = re.compile(r"[+-]?\d+(?:[.,/]\d+)*")
+fast_number_words = {
+    "zero", "one", "two", "three", "four", "five", "six", "seven", "eight", "nine", "ten", "eleven",
+    "twelve", "thirteen", "fourteen", "fifteen", "sixteen", "seventeen", "eighteen", "nineteen",
+    "twenty", "thirty", "forty", "fifty", "sixty", "seventy", "eighty", "ninety", "hundred",
+    "thousand", "million", "billion", "trillion", "first", "second", "third", "fourth", "fifth",
+    "sixth", "seventh", "eighth", "ninth", "tenth", "hundredth", "thousandth", "millionth",
 }
+fast_stop_words = {
+    "a", "about", "above", "after", "again", "against", "all", "also", "am", "an", "and", "any", "are",
+    "as", "at", "be", "because", "been", "before", "being", "below", "between", "both", "but", "by",
+    "can", "could", "did", "do", "does", "doing", "down", "during", "each", "either", "else", "even",
+    "ever", "every", "few", "for", "from", "further", "had", "has", "have", "having", "he", "her",
+    "here", "hers", "herself", "him", "himself", "his", "how", "however", "i", "if", "in", "into",
+    "is", "it", "its", "itself", "just", "least", "less", "many", "may", "me", "might", "more", "most",
+    "much", "must", "my", "myself", "neither", "no", "nor", "not", "now", "of", "off", "often", "on",
+    "once", "only", "or", "other", "our", "ours", "ourselves", "out", "over", "own", "per", "quite",
+    "rather", "really", "same", "see", "several", "she", "should", "show", "since", "so", "some",
+    "still", "such", "than", "that", "the", "their", "theirs", "them", "themselves", "then", "there",
+    "these", "they", "this", "those", "though", "through", "thus", "to", "too", "under", "until", "up",
+    "upon", "us", "used", "using", "very", "via", "was", "we", "well", "were", "what", "whatever",
+    "when", "where", "whether", "which", "while", "who", "whole", "whom", "whose", "why", "will",
+    "with", "within", "without", "would", "yet", "you", "your", "yours", "yourself", "yourselves",
+}
+
+_month_names = ("January|February|March|April|May|June|July|August|September|October|November|December"
+                "|Jan|Feb|Mar|Apr|Jun|Jul|Aug|Sept|Sep|Oct|Nov|Dec")
+fast_date_pattern = re.compile(
+    r"\b(?:(?:%s)\.?(?: \d{1,2}(?:st|nd|rd|th)?)?(?:,? \d{4})?"
+    r"|Q[1-4](?: \d{4})?|(?:19|20)\d{2}s?"
+    r"|(?:Monday|Tuesday|Wednesday|Thursday|Friday|Saturday|Sunday)"
+    r"|(?:last|next|this|past|previous) (?:years?|months?|weeks?|decades?|quarters?)"
+    r"|\d+ (?:years?|months?|weeks?|days?|decades?)(?: ago)?"
+    r"|yesterday|today|tomorrow)\b" % _month_names)
+fast_time_pattern = re.compile(
+    r"\b(?:\d{1,2}(?::\d{2})? ?(?:am|pm|AM|PM)|noon|midnight"
+    r"|(?:this|last|tomorrow) (?:morning|afternoon|evening|night))\b")
+fast_place_pattern = re.compile(r"\b(?:%s)\b" % "|".join(sorted((
+    "Africa", "Asia", "Europe", "North America", "South America", "Latin America", "Oceania", "Antarctica",
+    "Middle East", "United States", "USA", "US", "America", "Canada", "Mexico", "Brazil", "Argentina",
+    "Chile", "Colombia", "Peru", "United Kingdom", "UK", "Britain", "England", "Scotland", "Ireland",
+    "France", "Germany", "Spain", "Portugal", "Italy", "Netherlands", "Belgium", "Switzerland",
+    "Austria", "Sweden", "Norway", "Denmark", "Finland", "Poland", "Ukraine", "Russia", "Turkey",
+    "Greece", "Israel", "Iran", "Iraq", "Saudi Arabia", "UAE", "Dubai", "Egypt", "Nigeria", "Kenya",
+    "South Africa", "Ethiopia", "Morocco", "India", "Pakistan", "Bangladesh", "Sri Lanka", "Nepal",
+    "China", "Japan", "South Korea", "Korea", "Taiwan", "Hong Kong", "Singapore", "Malaysia",
+    "Indonesia", "Thailand", "Vietnam", "Philippines", "Australia", "New Zealand", "London", "Paris",
+    "Berlin", "Madrid", "Rome", "Amsterdam", "Moscow", "Istanbul", "Tokyo", "Beijing", "Shanghai",
+    "Seoul", "Delhi", "Mumbai", "Karachi", "Lahore", "Islamabad", "Sydney", "Toronto", "Vancouver",
+    "New York", "Los Angeles", "San Francisco", "Chicago", "Boston", "Seattle", "Texas", "California",
+    "Florida",
+), key=len, reverse=True)))
+# Acronyms and capitalized phrases that don't start a sentence stand in for ORG/PRODUCT entities
+fast_org_pattern = re.compile(r"\b[A-Z]{2,5}\b|(?<=[a-z0-9,;:] )[A-Z][a-z]+(?: [A-Z][a-z]+)*")
+fast_sentence_pattern = re.compile(r"(?<=[.!?])\s+|\n+")
+
+
+def fast_tokens(text):
+    """(text, lemma, like_num, is_content_word) per token, without spaCy."""
+    tokens = []
+    for match in fast_token_pattern.finditer(text):
+        word = match.group()
+        lower = word.lower()
+        tokens.append((word, fast_lemmas.get(lower, lower),
+                       bool(fast_number_pattern.fullmatch(word)) or lower in fast_number_words,
+                       word.isalpha() and lower not in fast_stop_words))
+    return tokens
+
+
+def fast_entities(text):
+    """(label, text, start) approximations of the spaCy entities the features use."""
+    entities = []
+    taken = set()
+    for label, pattern in (("DATE", fast_date_pattern), ("TIME", fast_time_pattern), ("GPE", fast_place_pattern)):
+        for match in pattern.finditer(text):
+            if match.start() not in taken:
+                entities.append((label, match.group(), match.start()))
+                taken.update(range(match.start(), match.end()))
+    for match in fast_org_pattern.finditer(text):
+        if match.start() not in taken:
+            entities.append(("ORG", match.group(), match.start()))
+    return entities
+
+
+# Locate the response inside a parsed query + response doc
+def response_span(doc, query, response):
+    """Returns the part of a parsed query + response doc that covers the response."""
+    start = len(query) + 1
+    span = doc.char_span(start, start + len(response), alignment_mode="expand")
+    return span if span is not None else doc[0:0]
 
 
 # Enhanced feature extraction with more specific pattern recognition
-def extract_features(query, response):
-    """Extracts key elements from the query-response pair with enhanced detection."""
+def extract_features(query, response, doc=None, mode="full"):
+    """Extracts key elements from the query-response pair with enhanced detection.
+
+    Pass an already parsed doc of query + " " + response to avoid parsing again.
+    mode="fast" skips spaCy and uses fast_tokens/fast_entities instead.
+    """
     combined_text = query + " " + response
-    doc = nlp(combined_text)
-    
-    # Basic numerical and location features
-    numbers = [token.text for token in doc if token.like_num]
-    locations = [ent.text for ent in doc.ents if ent.label_ in {"GPE", "LOC"}]
-    
-    # Enhanced keyword detection with more nuanced categories
-    trend_keywords = {"increase", "decline", "growth", "rise", "drop", "trend", "fall", "reduce", "expansion", 
-                     "fluctuation", "progression", "evolution", "trajectory", "historical", "over time", 
-                     "increased", "decreased", "grew", "fell", "risen", "trending"}
-    
-    relationship_keywords = {"prefer", "dominate", "compared", "versus", "majority", "minority", "correlation", 
-                           "causation", "influence", "impact", "affect", "between", "connection", "network", 
-                           "interaction", "collaboration", "flow", "transfer", "connected", "linked", "relation",
-                           "mapping", "connect", "link", "association", "interact"}
-    
-    hierarchy_keywords = {"structure", "hierarchy", "nested", "parent", "child", "tree", "branch", "root", 
-                        "descendant", "ancestor", "organization", "breakdown", "composition", "contains",
-                        "hierarchical", "level", "tier", "layer", "subordinate", "superordinate", "category",
-                        "subcategory", "classification", "taxonomy", "class", "subclass"}
-    
-    part_to_whole_keywords = {"percentage", "proportion", "fraction", "share", "allocation", "distribution", 
-                            "segment", "portion", "division", "makeup", "composition", "constituent", "breakdown",
-                            "ratio", "percent", "split", "divided", "parts", "pieces", "sections", "components",
-                            "pie", "slice", "segment", "partition", "make up", "comprises", "consists of"}
-    
-    comparison_keywords = {"versus", "against", "compare", "contrast", "difference", "similarity", 
-                         "benchmark", "outperform", "underperform", "rank", "exceed", "more than", "less than",
-                         "higher", "lower", "better", "worse", "comparison", "relative", "compared to"}
-    
-    # Extract lemmatized keywords for each category
-    trends = [token.lemma_ for token in doc if token.lemma_ in trend_keywords]
-    relationships = [token.lemma_ for token in doc if token.lemma_ in relationship_keywords]
-    hierarchies = [token.lemma_ for token in doc if token.lemma_ in hierarchy_keywords]
-    part_to_whole = [token.lemma_ for token in doc if token.lemma_ in part_to_whole_keywords]
-    comparisons = [token.lemma_ for token in doc if token.lemma_ in comparison_keywords]
-    
-    # Detect temporal elements (dates, time periods)
-    has_time_series = any(ent.label_ == "DATE" or ent.label_ == "TIME" for ent in doc.ents)
-    has_multiple_dates = len([ent for ent in doc.ents if ent.label_ == "DATE"]) > 1
-    
-    # Check for multi-dimensional data mentions
-    multi_dimensional = "by" in [token.text.lower() for token in doc] and len(numbers) > 5
-    
-    # Check for distribution patterns
-    distribution_keywords = {"distribution", "frequency", "spread", "range", "variance", "outlier"}
-    has_distribution = any(token.lemma_ in distribution_keywords for token in doc)
-    
-    # Detect categorical data
-    categories_count = len([ent for ent in doc.ents if ent.label_ == "ORG" or ent.label_ == "PRODUCT"])
-    has_categories = categories_count > 2
-    
+    if mode == "fast":
+        tokens = fast_tokens(combined_text)
+        entities = fast_entities(combined_text)
+    else:
+        if doc is None:
+            doc = get_nlp()(combined_text)
+        tokens = [(token.text, token.lemma_, token.like_num, token.is_alpha and not token.is_stop) for token in doc]
+        entities = [(ent.label_, ent.text, ent.start_char) for ent in doc.ents]
+
+    # Single pass over the tokens: numbers, keyword categories and token counts
+    numbers = []
+    keyword_hits = {category: [] for category in ("trends", "relationships", "hierarchies", "part_to_whole",
+                                                  "comparisons", "distribution", "process_flow", "correlation")}
+    has_by = False
+    content_words = 0
+    percentage_indicators = 0
+    percentage_values = []
+    for i, (text, lemma, like_num, is_content) in enumerate(tokens):
+        for category in keyword_categories.get(lemma, ()):
+            keyword_hits[category].append(lemma)
+        if like_num:
+            numbers.append(text)
+            next_text = tokens[i + 1][0] if i + 1 < len(tokens) else ""
+            if '%' in text + next_text:
+                try:
+                    percentage_values.append(float(text.replace('%', '').replace(',', '')))
+                except ValueError:
+                    pass
+        if text == "%":
+            percentage_indicators += 1
+        if text.lower() == "by":
+            has_by = True
+        if is_content:
+            content_words += 1
+
+    # Single pass over the entities: locations, dates and categorical data
+    locations = []
+    date_count = 0
+    has_time_series = False
+    categories_count = 0
+    for label, text, _ in entities:
+        if label in {"GPE", "LOC"}:
+            locations.append(text)
+        if label == "DATE":
+            date_count += 1
+        if label == "DATE" or label == "TIME":
+            has_time_series = True
+        if label == "ORG" or label == "PRODUCT":
+            categories_count += 1
+
     # Detect percentage patterns
-    percentage_indicators = len([token for token in doc if token.text == "%"])
     percentage_indicators += len(re.findall(r'\d+%', combined_text))
     
     # Detect phrases like "X accounts for Y%" or "X makes up Y%"
@@ -102,9 +364,6 @@ def extract_features(query, response):
     
     # Look for enumeration of items that together form 100%
     sum_to_whole = False
-    percentage_values = [float(token.text.replace('%', '')) for token in doc 
-                      if token.like_num and '%' in token.text + (doc[token.i + 1].text if token.i + 1 < len(doc) else "")]
-    
     if percentage_indicators > 2 and len(percentage_values) > 2:
         # Check if percentages approximately sum to 100
         percentage_sum = sum(num for num in percentage_values if num <= 100)
@@ -113,29 +372,47 @@ def extract_features(query, response):
     return {
         "numbers": numbers,
         "locations": locations,
-        "trends": trends,
-        "relationships": relationships,
-        "hierarchies": hierarchies,
-        "part_to_whole": part_to_whole,
-        "comparisons": comparisons,
+        "trends": keyword_hits["trends"],
+        "relationships": keyword_hits["relationships"],
+        "hierarchies": keyword_hits["hierarchies"],
+        "part_to_whole": keyword_hits["part_to_whole"],
+        "comparisons": keyword_hits["comparisons"],
         "has_time_series": has_time_series,
-        "has_multiple_dates": has_multiple_dates,
-        "multi_dimensional": multi_dimensional,
-        "has_distribution": has_distribution,
-        "has_categories": has_categories,
+        "has_multiple_dates": date_count > 1,
+        "multi_dimensional": has_by and len(numbers) > 5,
+        "has_distribution": bool(keyword_hits["distribution"]),
+        "has_categories": categories_count > 2,
         "location_count": len(locations),
-        "is_text_heavy": len([token for token in doc if token.is_alpha and not token.is_stop]) > 30,
+        "is_text_heavy": content_words > 30,
         "percentage_indicators": percentage_indicators,
         "proportion_phrases": proportion_phrases,
-        "sum_to_whole": sum_to_whole
+        "sum_to_whole": sum_to_whole,
+        "has_process_flow": bool(keyword_hits["process_flow"]),
+        "has_correlation": bool(keyword_hits["correlation"])
     }
 
 
 # Analyze data structure in the response
-def analyze_data_structure(response):
-    """Analyzes potential data structure in the response to improve recommendations."""
-    
-    doc = nlp(response)
+def analyze_data_structure(response, doc=None, mode="full"):
+    """Analyzes potential data structure in the response to improve recommendations.
+
+    doc may be a parsed doc or span of the response (see response_span); mode="fast" skips spaCy.
+    """
+
+    if mode == "fast":
+        entities = fast_entities(response)
+        sentences = []
+        start = 0
+        for boundary in fast_sentence_pattern.finditer(response):
+            sentences.append((start, boundary.start()))
+            start = boundary.end()
+        sentences.append((start, len(response)))
+        sentence_labels = [{label for label, _, at in entities if begin <= at < end} for begin, end in sentences]
+    else:
+        if doc is None:
+            doc = get_nlp()(response)
+        entities = [(ent.label_, ent.text, ent.start_char) for ent in doc.ents]
+        sentence_labels = [{ent.label_ for ent in sent.ents} for sent in doc.sents]
     
     # Check for tabular data
     has_table = False
@@ -152,11 +429,11 @@ def analyze_data_structure(response):
     has_hierarchy = len(set(indentation_pattern)) > 2 and max(indentation_pattern) > 4
     
     # Check for time series data
-    date_entities = [ent for ent in doc.ents if ent.label_ == "DATE"]
+    date_entities = [text for label, text, _ in entities if label == "DATE"]
     has_dated_sequence = len(date_entities) > 3
-    
+
     # Check for categorical groupings
-    category_sentences = [sent for sent in doc.sents if any(ent.label_ in ["ORG", "PRODUCT", "GPE"] for ent in sent.ents)]
+    category_sentences = [labels for labels in sentence_labels if labels & {"ORG", "PRODUCT", "GPE"}]
     has_categories = len(category_sentences) > 3
     
     return {
@@ -168,174 +445,147 @@ def analyze_data_structure(response):
     }
 
 
-# More sophisticated score boosting based on extracted features
-def boost_scores(scores, features):
-    """Enhances scores with more nuanced boosting for various chart types."""
-    
+# Precompiled query patterns for the contextual rules
+def _any_phrase(*phrases):
+    return re.compile("|".join(re.escape(phrase) for phrase in phrases))
+
+
+hierarchy_request = _any_phrase("show hierarchy", "hierarchical")
+network_request = _any_phrase("show network", "connections between")
+trend_request = _any_phrase("over time", "trend")
+map_request = _any_phrase("map", "geographic")
+comparison_request = _any_phrase("comparison", "compare")
+share_request = _any_phrase("market share", "budget allocation", "demographic", "voter")
+segment_request = _any_phrase("categories", "segments", "components")
+distribution_patterns = [re.compile(pattern) for pattern in (
+    "what is the breakdown of", "how is .* distributed", 
+    "what percentage", "what proportion", "what is the split",
+    "what are the percentages", "show .* distribution",
+    "pie chart", "donut chart", "composition of", "makeup of"
+)]
+
+
+# Score boosting rules: (name, activation(features, query_lower), boosts per chart).
+# Activations are stacked into a feature vector and multiplied by the weight matrix,
+# so every rule for every chart is applied with one matrix product.
+score_rules = [
     # Baseline boosts - applied more conservatively
-    if features["trends"] and features["has_time_series"]:
-        scores["line_chart"] += 0.4
-        scores["area_chart"] += 0.3
-    else:
-        # If there are trends but no clear time series, don't automatically favor line charts
-        if features["trends"]:
-            scores["line_chart"] += 0.2
-    
+    ("trends_over_time", lambda f, q: bool(f["trends"]) and f["has_time_series"],
+     {"line_chart": 0.4, "area_chart": 0.3}),
+    # If there are trends but no clear time series, don't automatically favor line charts
+    ("trends_only", lambda f, q: bool(f["trends"]) and not f["has_time_series"],
+     {"line_chart": 0.2}),
     # Network and relationship visualizations
-    if len(features["relationships"]) > 2:
-        scores["network_graph"] += 0.8
-        scores["chord_diagram"] += 0.7
-        scores["DAG"] += 0.6
-    elif len(features["relationships"]) > 0:
-        scores["network_graph"] += 0.4
-        scores["chord_diagram"] += 0.3
-        
+    ("many_relationships", lambda f, q: len(f["relationships"]) > 2,
+     {"network_graph": 0.8, "chord_diagram": 0.7, "DAG": 0.6}),
+    ("some_relationships", lambda f, q: 0 < len(f["relationships"]) <= 2,
+     {"network_graph": 0.4, "chord_diagram": 0.3}),
     # Hierarchical data visualizations
-    if len(features["hierarchies"]) > 2:
-        scores["treemap_chart"] += 0.8
-        scores["sunburst_chart"] += 0.7
-        scores["circle_packing"] += 0.6
-        scores["tree_diagram"] += 0.5
-    elif len(features["hierarchies"]) > 0:
-        scores["treemap_chart"] += 0.4
-        scores["sunburst_chart"] += 0.3
-        
+    ("many_hierarchies", lambda f, q: len(f["hierarchies"]) > 2,
+     {"treemap_chart": 0.8, "sunburst_chart": 0.7, "circle_packing": 0.6, "tree_diagram": 0.5}),
+    ("some_hierarchies", lambda f, q: 0 < len(f["hierarchies"]) <= 2,
+     {"treemap_chart": 0.4, "sunburst_chart": 0.3}),
     # Strong boost for clear part-to-whole data
-    if features["sum_to_whole"]:
-        scores["donut_chart"] += 0.9
-        scores["treemap_chart"] += 0.6
-    
+    ("sum_to_whole", lambda f, q: f["sum_to_whole"],
+     {"donut_chart": 0.9, "treemap_chart": 0.6}),
     # Moderate boost for percentage indicators
-    if features["percentage_indicators"] >= 3:
-        scores["donut_chart"] += 0.7
-    elif features["percentage_indicators"] > 0:
-        scores["donut_chart"] += 0.4
-    
+    ("many_percentages", lambda f, q: f["percentage_indicators"] >= 3,
+     {"donut_chart": 0.7}),
+    ("some_percentages", lambda f, q: 0 < f["percentage_indicators"] < 3,
+     {"donut_chart": 0.4}),
     # Boost based on proportion phrases
-    if features["proportion_phrases"] > 0:
-        scores["donut_chart"] += 0.5
-    
+    ("proportion_phrases", lambda f, q: f["proportion_phrases"] > 0,
+     {"donut_chart": 0.5}),
     # Boost based on part-to-whole keywords
-    if len(features["part_to_whole"]) >= 3:
-        scores["donut_chart"] += 0.8
-    elif len(features["part_to_whole"]) > 0:
-        scores["donut_chart"] += 0.4
-    
+    ("many_part_to_whole", lambda f, q: len(f["part_to_whole"]) >= 3,
+     {"donut_chart": 0.8}),
+    ("some_part_to_whole", lambda f, q: 0 < len(f["part_to_whole"]) < 3,
+     {"donut_chart": 0.4}),
     # Context-specific boost for category distribution questions
-    if any(word in features["part_to_whole"] for word in ["breakdown", "distribution", "composition"]) and features["has_categories"]:
-        scores["donut_chart"] += 0.6
-    
+    ("category_distribution",
+     lambda f, q: f["has_categories"] and any(word in f["part_to_whole"] for word in ["breakdown", "distribution", "composition"]),
+     {"donut_chart": 0.6}),
     # Give stronger boost when time-series elements are NOT present (since donut charts aren't good for time series)
-    if not features["has_time_series"] and len(features["part_to_whole"]) > 0:
-        scores["donut_chart"] += 0.3
-        
+    ("part_to_whole_without_time", lambda f, q: not f["has_time_series"] and len(f["part_to_whole"]) > 0,
+     {"donut_chart": 0.3}),
     # Geographic data
-    if features["location_count"] > 3:
-        scores["connection_map"] += 0.8
-        scores["voronoi_map"] += 0.6
-    elif features["location_count"] > 0:
-        scores["connection_map"] += 0.5
-        
+    ("many_locations", lambda f, q: f["location_count"] > 3,
+     {"connection_map": 0.8, "voronoi_map": 0.6}),
+    ("some_locations", lambda f, q: 0 < f["location_count"] <= 3,
+     {"connection_map": 0.5}),
     # Categorical comparisons
-    if len(features["comparisons"]) > 2 and features["has_categories"]:
-        scores["bar_chart"] += 0.5
-        scores["mosaic_plot"] += 0.6
-        scores["small_multiples"] += 0.7
-    
+    ("categorical_comparisons", lambda f, q: len(f["comparisons"]) > 2 and f["has_categories"],
+     {"bar_chart": 0.5, "mosaic_plot": 0.6, "small_multiples": 0.7}),
     # Multi-dimensional data
-    if features["multi_dimensional"]:
-        scores["heatmap_chart"] += 0.8
-        scores["small_multiples"] += 0.6
-        
+    ("multi_dimensional", lambda f, q: f["multi_dimensional"],
+     {"heatmap_chart": 0.8, "small_multiples": 0.6}),
     # Distributions
-    if features["has_distribution"]:
-        scores["heatmap_chart"] += 0.6
-        
+    ("distribution", lambda f, q: f["has_distribution"],
+     {"heatmap_chart": 0.6}),
     # Text-heavy responses
-    if features["is_text_heavy"]:
-        scores["word_cloud"] += 0.9
-        
-    # Apply penalties to overrecommended charts
-    frequently_recommended = ["bar_chart", "line_chart", "area_chart"]
-    for chart in frequently_recommended:
-        # Apply a small penalty to frequently recommended charts
-        # This helps diversify recommendations
-        scores[chart] -= 0.1
-        
-    return scores
+    ("text_heavy", lambda f, q: f["is_text_heavy"],
+     {"word_cloud": 0.9}),
+    # Small penalty on frequently recommended charts to diversify recommendations
+    ("frequent_chart_penalty", lambda f, q: True,
+     {"bar_chart": -0.1, "line_chart": -0.1, "area_chart": -0.1}),
 
+    # Direct visualization requests in the query
+    ("hierarchy_request", lambda f, q: bool(hierarchy_request.search(q)),
+     {"treemap_chart": 0.5, "sunburst_chart": 0.5, "tree_diagram": 0.4}),
+    ("network_request", lambda f, q: bool(network_request.search(q)),
+     {"network_graph": 0.6, "chord_diagram": 0.5}),
+    ("trend_request", lambda f, q: bool(trend_request.search(q)),
+     {"line_chart": 0.4, "area_chart": 0.3}),
+    ("map_request", lambda f, q: bool(map_request.search(q)),
+     {"connection_map": 0.7, "voronoi_map": 0.4}),
+    ("comparison_request", lambda f, q: bool(comparison_request.search(q)),
+     {"bar_chart": 0.4, "small_multiples": 0.5}),
+    # Direct indicators for distribution/proportion visualizations (each matching pattern counts)
+    ("distribution_request", lambda f, q: sum(1 for pattern in distribution_patterns if pattern.search(q)),
+     {"donut_chart": 0.7}),
+    # Questions about market share, budget allocation, or demographic breakdown (not trends over time)
+    ("share_request", lambda f, q: not f["has_time_series"] and bool(share_request.search(q)),
+     {"donut_chart": 0.6}),
+    # "top" categories that make up a whole
+    ("top_segments_request", lambda f, q: "top" in q and bool(segment_request.search(q)),
+     {"donut_chart": 0.5}),
 
-# Applies contextual awareness to chart recommendations
-def context_aware_recommendations(query, response, features, similarity_scores):
-    """Enhances recommendations based on query intent and context patterns."""
-    
-    query_lower = query.lower()
-    
-    # Direct visualization requests
-    if "show hierarchy" in query_lower or "hierarchical" in query_lower:
-        similarity_scores["treemap_chart"] += 0.5
-        similarity_scores["sunburst_chart"] += 0.5
-        similarity_scores["tree_diagram"] += 0.4
-        
-    if "show network" in query_lower or "connections between" in query_lower:
-        similarity_scores["network_graph"] += 0.6
-        similarity_scores["chord_diagram"] += 0.5
-        
-    if "over time" in query_lower or "trend" in query_lower:
-        similarity_scores["line_chart"] += 0.4
-        similarity_scores["area_chart"] += 0.3
-        
-    if "map" in query_lower or "geographic" in query_lower:
-        similarity_scores["connection_map"] += 0.7
-        similarity_scores["voronoi_map"] += 0.4
-        
-    if "comparison" in query_lower or "compare" in query_lower:
-        similarity_scores["bar_chart"] += 0.4
-        similarity_scores["small_multiples"] += 0.5
-
-    # Direct indicators for distribution/proportion visualizations
-    distribution_patterns = [
-        "what is the breakdown of", "how is .* distributed", 
-        "what percentage", "what proportion", "what is the split",
-        "what are the percentages", "show .* distribution",
-        "pie chart", "donut chart", "composition of", "makeup of"
-    ]
-    
-    for pattern in distribution_patterns:
-        if re.search(pattern, query_lower):
-            similarity_scores["donut_chart"] += 0.7
-    
-    # Detect questions about market share, budget allocation, or demographic breakdown
-    if any(term in query_lower for term in ["market share", "budget allocation", "demographic", "voter"]):
-        if not features["has_time_series"]:  # Not asking for trends over time
-            similarity_scores["donut_chart"] += 0.6
-    
-    # Detect "top" categories that make up a whole
-    if "top" in query_lower and any(term in query_lower for term in ["categories", "segments", "components"]):
-        similarity_scores["donut_chart"] += 0.5
-        
     # Data characteristic detection
-    if features["has_time_series"] and len(features["part_to_whole"]) > 0:
-        similarity_scores["stacked_area_chart"] += 0.7
-        
-    if features["has_categories"] and features["multi_dimensional"]:
-        similarity_scores["heatmap_chart"] += 0.6
-        similarity_scores["small_multiples"] += 0.5
-        
+    ("part_to_whole_over_time", lambda f, q: f["has_time_series"] and len(f["part_to_whole"]) > 0,
+     {"stacked_area_chart": 0.7}),
+    ("multi_dimensional_categories", lambda f, q: f["has_categories"] and f["multi_dimensional"],
+     {"heatmap_chart": 0.6, "small_multiples": 0.5}),
     # Process flow detection
-    process_flow_keywords = {"process", "workflow", "sequence", "step", "procedure"}
-    has_process_flow = any(token.lemma_ in process_flow_keywords for token in nlp(query + " " + response))
-    if has_process_flow:
-        similarity_scores["DAG"] += 0.7
-        
-    # Detect correlation analysis
-    correlation_keywords = {"correlation", "relationship", "association", "connected"}
-    has_correlation = any(token.lemma_ in correlation_keywords for token in nlp(query + " " + response))
-    if has_correlation:
-        similarity_scores["heatmap_chart"] += 0.5
-        similarity_scores["network_graph"] += 0.4
-        
-    return similarity_scores
+    ("process_flow", lambda f, q: f["has_process_flow"],
+     {"DAG": 0.7}),
+    # Correlation analysis
+    ("correlation", lambda f, q: f["has_correlation"],
+     {"heatmap_chart": 0.5, "network_graph": 0.4}),
+]
+
+rule_names = [name for name, _, _ in score_rules]
+rule_weights = np.zeros((len(score_rules), len(chart_names)), dtype=np.float32)
+for _i, (_, _, _boosts) in enumerate(score_rules):
+    for _chart, _weight in _boosts.items():
+        rule_weights[_i, chart_index[_chart]] = _weight
+
+
+def rule_activations(features, query):
+    """Turns extracted features and the query into the rule activation vector."""
+    query_lower = query.lower()
+    return np.array([activation(features, query_lower) for _, activation, _ in score_rules], dtype=np.float32)
+
+
+# Matrix scoring for one or many query-response pairs
+def score_charts(response_embeddings, features_list, queries):
+    """Returns a (pairs x charts) score matrix.
+
+    Embedding similarity (embeddings @ chart_matrix.T, both normalized) plus
+    rule boosts (activations @ rule_weights), each a single matrix product.
+    """
+    embeddings = np.asarray(response_embeddings, dtype=np.float32).reshape(len(queries), -1)
+    activations = np.stack([rule_activations(features, query) for features, query in zip(features_list, queries)])
+    return embeddings @ get_chart_matrix().T + activations @ rule_weights
 
 
 # Returns a contextual description of why a chart was recommended
@@ -387,22 +637,21 @@ def get_chart_description(chart_type, features):
 
 
 # Improved visualization recommendations with diversity
-def recommend_visualizations(query, response):
+def recommend_visualizations(query, response, features=None, response_embedding=None):
     """Recommends a diverse set of visualizations based on query and response content."""
-    features = extract_features(query, response)
-    response_embedding = model.encode(query + " " + response, normalize_embeddings=True)
+    if features is None:
+        features = extract_features(query, response)
+    if response_embedding is None:
+        response_embedding = get_model().encode(query + " " + response, normalize_embeddings=True)
 
-    # Base similarity scores
-    similarity_scores = {
-        chart: cosine_similarity([response_embedding], [embedding]).flatten()[0]
-        for chart, embedding in category_embeddings.items()
-    }
+    # Base similarity plus feature-based and contextual boosts
+    scores = score_charts([response_embedding], [features], [query])[0]
+    return diversify_recommendations(dict(zip(chart_names, scores.tolist())), features)
 
-    # Apply feature-based score boosts
-    similarity_scores = boost_scores(similarity_scores, features)
-    
-    # Apply contextual awareness
-    similarity_scores = context_aware_recommendations(query, response, features, similarity_scores)
+
+# Picks the final recommendations from the scored charts
+def diversify_recommendations(similarity_scores, features):
+    """Selects up to four charts from different categories and normalizes their scores."""
 
     # Define chart categories for diversity
     chart_categories = {
@@ -479,31 +728,123 @@ def recommend_visualizations(query, response):
     return [(chart, round(score, 2)) for chart, score in diverse_recommendations]
 
 
-# Main function to get visualization recommendations
-def getViz(user_query, response):
-    """Main function to recommend visualizations with enhanced features."""
-    
+# Recommendations for one already parsed (and optionally embedded) pair
+def recommend_for_doc(user_query, response, doc, response_embedding=None, verbose=True, mode="full"):
+    """Scores one query-response pair from its parsed doc of query + " " + response (None in fast mode)."""
+
     # Extract features from query and response
-    features = extract_features(user_query, response)
-    
-    # Analyze data structure
-    data_structure = analyze_data_structure(response)
-    
-    # Combine data structure insights with features
-    for key, value in data_structure.items():
-        features[key] = value
+    features = extract_features(user_query, response, doc=doc, mode=mode)
     
     # Get recommendations with improved algorithm
-    recommended_charts = recommend_visualizations(user_query, response)
+    recommended_charts = recommend_visualizations(user_query, response, features=features,
+                                                  response_embedding=response_embedding)
     
-    # Add explanations for why each chart was recommended
-    recommendations_with_explanations = []
-    for chart, score in recommended_charts:
-        explanation = get_chart_description(chart, features)
-        recommendations_with_explanations.append((chart, score, explanation))
+    if verbose:
+        # Analyze data structure
+        span = response_span(doc, user_query, response) if doc is not None else None
+        data_structure = analyze_data_structure(response, doc=span, mode=mode)
+        
+        # Combine data structure insights with features for the explanations
+        explained_features = {**features, **data_structure}
         
-    # Print recommendations with explanations
-    for chart, score, explanation in recommendations_with_explanations:
-        print(f"{chart}: {score} - {explanation}")
+        # Print recommendations with explanations for why each chart was recommended
+        for chart, score in recommended_charts:
+            explanation = get_chart_description(chart, explained_features)
+            print(f"{chart}: {score} - {explanation}")
+
+    return recommended_charts
+
+
+# Main function to get visualization recommendations
+def getViz(user_query, response, use_cache=True, mode=None):
+    """Main function to recommend visualizations with enhanced features."""
+    mode = _feature_mode(mode)
+    key = viz_cache.key(user_query, response, mode)
+    if use_cache:
+        cached = viz_cache.get(key)
+        metrics.count_cache("viz", "miss" if cached is None else "hit")
+        if cached is not None:
+            return cached
+
+    if VIZ_EXECUTOR == "process":
+        from viz_pool import get_viz_pool
+        with metrics.timed("viz", "pool"):
+            recommended_charts = get_viz_pool().score(user_query, response, mode)
+        viz_cache.put(key, recommended_charts)
+        return recommended_charts
+
+    text = user_query + " " + response
+    doc = None
+    if mode == "full":
+        with metrics.timed("viz", "spacy_parse"):
+            doc = get_nlp()(text)
+    with metrics.timed("viz", "embedding"):
+        response_embedding = get_model().encode(text, normalize_embeddings=True)
+    with metrics.timed("viz", "scoring"):
+        recommended_charts = recommend_for_doc(user_query, response, doc, response_embedding, mode=mode)
+    viz_cache.put(key, recommended_charts)
+    return recommended_charts
+
+
+# Batch version of getViz for scoring many pairs at once
+def getVizBatch(pairs, batch_size=64, n_process=None, use_cache=True, mode=None):
+    """Recommends visualizations for a list of (user_query, response) pairs.
+
+    All texts go through spaCy with nlp.pipe (skipped in fast mode) and through one
+    batched SentenceTransformer.encode call, so cost grows with the batch, not per request.
+    Pairs already in the result cache are not scored again. n_process defaults to
+    VIZ_BATCH_PROCESSES; in process mode the pool workers score the batch in chunks and
+    it is ignored.
+    """
+    mode = _feature_mode(mode)
+    n_process = VIZ_BATCH_PROCESSES if n_process is None else n_process
+    keys = [viz_cache.key(user_query, response, mode) for user_query, response in pairs]
+    results = [viz_cache.get(key) if use_cache else None for key in keys]
+    missing = [i for i, result in enumerate(results) if result is None]
+    if use_cache:
+        metrics.count_cache("viz", "hit", len(keys) - len(missing))
+        metrics.count_cache("viz", "miss", len(missing))
+    if VIZ_EXECUTOR == "process" and missing:
+        from viz_pool import get_viz_pool
+        with metrics.timed("viz_batch", "pool"):
+            scored = get_viz_pool().score_many([pairs[i] for i in missing], mode)
+    else:
+        scored = _score_batch([pairs[i] for i in missing], batch_size, n_process, mode)
+    for i, recommended_charts in zip(missing, scored):
+        viz_cache.put(keys[i], recommended_charts)
+        results[i] = recommended_charts
+    return results
+
+
+def _feature_mode(mode):
+    mode = mode or DEFAULT_FEATURE_MODE
+    if mode not in FEATURE_MODES:
+        raise ValueError(f"Unknown feature mode {mode!r}, expected one of {FEATURE_MODES}")
+    return mode
+
+
+def _score_batch(pairs, batch_size, n_process, mode="full"):
+    texts = [user_query + " " + response for user_query, response in pairs]
+    if not texts:
+        return []
+
+    with metrics.timed("viz_batch", "embedding"):
+        embeddings = get_model().encode(texts, normalize_embeddings=True, batch_size=batch_size)
+    if mode == "fast":
+        docs = [None] * len(texts)
+    else:
+        with metrics.timed("viz_batch", "spacy_parse"):
+            docs = list(get_nlp().pipe(texts, batch_size=batch_size, n_process=n_process))
+
+    with metrics.timed("viz_batch", "scoring"):
+        features_list = [
+            extract_features(user_query, response, doc=doc, mode=mode)
+            for (user_query, response), doc in zip(pairs, docs)
+        ]
 
-    return recommended_charts
\ No newline at end of file
+        # One scoring pass for the whole batch
+        scores = score_charts(embeddings, features_list, [user_query for user_query, _ in pairs])
+        return [
+            diversify_recommendations(dict(zip(chart_names, row.tolist())), features)
+            for row, features in zip(scores, features_list)
+        ]
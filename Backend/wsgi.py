@@ -0,0 +1,37 @@
+"""Production WSGI entry point.
+
+Run from the Backend directory with:  gunicorn -c gunicorn.conf.py wsgi:app
+(see gunicorn.conf.py for settings and for measuring per-worker memory and throughput).
+"""
+import gc
+import os
+
+# Preloading replaces the per-process warm-up thread (see gunicorn.conf.py).
+os.environ.setdefault("WARMUP", "0")
+
+import kg_chat
+import viz_pool
+import vrs
+from app import app, warm_up
+
+
+def preload():
+    """Loads spaCy, MiniLM, the chart matrix and the KG in the master before it forks.
+
+    Workers then share those pages copy-on-write instead of each loading a copy.
+    """
+    # The master must not own threads or child processes when it forks; each worker starts
+    # its own KG watcher and, with VIZ_EXECUTOR=process, its own visualization pool.
+    warm_up(start_viz_pool=False)
+    kg_chat.get_kg_store().stop()
+    # Move everything loaded so far out of the GC's reach, so collections in the
+    # workers don't write to (and un-share) the preloaded objects' pages.
+    gc.collect()
+    gc.freeze()
+
+
+def after_fork():
+    """Restarts the per-process background threads in a freshly forked worker."""
+    kg_chat.get_kg_store().start(load=False)
+    if vrs.VIZ_EXECUTOR == "process":
+        viz_pool.get_viz_pool()